@@ -0,0 +1,81 @@
+'''
+Benchmark the binary block format against the ASCII "E"-delimited format:
+bytes sent per point and host decode time, using the reference encoder in
+teensy_lockin.binary so no hardware is needed.
+
+    python benchmarks/bench_binary.py [num_points]
+'''
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+
+from teensy_lockin.binary import BlockDecoder, encode_blocks
+from teensy_lockin.decode import decode_records
+from teensy_lockin.serial_reader import FrameReader
+from bench_serial_reader import ReplaySerial
+
+
+def make_columns(num_points, seed=0):
+    rng = np.random.default_rng(seed)
+    n = np.arange(num_points)
+    signal = (4096 + 2000 * np.sin(2 * np.pi * 0.1 * n)).astype(np.int16)
+    i = 1000 + rng.normal(0, 3, num_points)
+    q = 300 + rng.normal(0, 3, num_points)
+    return signal, i, q, np.hypot(i, q), np.arctan2(q, i)
+
+
+def ascii_stream(signal, i, q, r, phi):
+    '''Text as printed by mixAndFilter (Serial.print uses 2 decimals)'''
+    return ''.join('%d, %.2f, %.2f, %.2f, %.2fE' % row
+                   for row in zip(signal, i, q, r, phi)).encode()
+
+
+def read_ascii(stream):
+    reader = FrameReader(ReplaySerial(stream))
+    values, valid = decode_records(list(reader.records(stream.count(b'E'))))
+    return values
+
+
+def read_binary(stream):
+    reader = FrameReader(ReplaySerial(stream))
+    decoder = BlockDecoder()
+    for chunk in reader.chunks():
+        decoder.feed(chunk)
+        if decoder.done:
+            break
+    return decoder.result()
+
+
+def best_time(func, arg, repeats=5):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        out = func(arg)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, out
+
+
+def main():
+    num_points = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    signal, i, q, r, phi = make_columns(num_points)
+    streams = [('ASCII', ascii_stream(signal, i, q, r, phi), read_ascii),
+               ('binary', encode_blocks(signal, i, q, r, phi), read_binary),
+               ('binary I/Q', encode_blocks(signal, i, q), read_binary)]
+    print('%d points' % num_points)
+    for name, stream, reader in streams:
+        elapsed, out = best_time(reader, stream)
+        assert len(out) == num_points
+        print('%-11s %6.1f bytes/point %8.1f ms %10.0f points/s'
+              % (name, len(stream) / num_points, elapsed * 1e3,
+                 num_points / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+'''
+Stopping Continuous Mode runs once their averages are precise enough,
+against a run of fixed length, through the simulated Teensy.
+
+A fixed run has to be long enough for the noisiest signal it will meet;
+with settings.precision the run stops (sending DRX) as soon as the
+relative standard error of the amplitude, allowing for the correlation of
+the filtered points, reaches it. For each noise level, print the points
+and time each run took and how far its average amplitude is from the
+true one. The simulator runs at time_scale; much below 0.05, this
+process cannot keep up with the stream, and blocks are lost.
+
+Then show the bias the filter's settling leaves in the averages of short
+Normal Mode runs: averaging the last 75% of the points against averaging
+from where the filter has settled (settings.settle).
+
+    python benchmarks/bench_convergence.py [precision] [time_scale]
+'''
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from teensy_lockin.client import LockInClient, RunSettings, EXTERNAL
+from teensy_lockin.convergence import plan
+from teensy_lockin.instruction import NORMAL, CONTINUOUS, BINARY
+
+AMPLITUDE = 0.5
+RATE = 10000
+NOISE_LEVELS = [0.05, 0.1, 0.2]
+FIXED_POINTS = 500000 # enough for precision 1e-3 at the highest noise
+
+
+def run(settings, noise, time_scale):
+    url = ('teensysim://?ref_freq=1000&amplitude=%g&noise=%g&time_scale=%g&seed=1'
+           % (AMPLITUDE, noise, time_scale))
+    client = LockInClient(url, log=lambda *args: None)
+    start = time.perf_counter()
+    result = client.run(settings)
+    elapsed = time.perf_counter() - start
+    client.close()
+    return result, elapsed
+
+
+def main():
+    precision = float(sys.argv[1]) if len(sys.argv) > 1 else 1e-3
+    time_scale = float(sys.argv[2]) if len(sys.argv) > 2 else 0.1
+    settings = RunSettings(ref_select=EXTERNAL, freq_dur=100, sampling_rate=RATE,
+                           cutoff=5, stages=2, mode=CONTINUOUS, settle=True)
+    p = plan(settings)
+    print('filter settles after %d points (%.3f s), correlation length %.0f points'
+          % (p.settle_samples, p.settle_time, p.correlation))
+    print('%6s %12s %10s %10s %10s %8s %10s' % ('noise', 'run', 'points', 'time',
+                                                'error', 'lost', 'speedup'))
+    for noise in NOISE_LEVELS:
+        settings.num_points, settings.precision = FIXED_POINTS, 0
+        fixed, fixed_time = run(settings, noise, time_scale)
+        settings.num_points, settings.precision = 0, precision
+        stopped, stopped_time = run(settings, noise, time_scale)
+        for name, result, elapsed in (('fixed', fixed, fixed_time),
+                                      ('precision', stopped, stopped_time)):
+            amplitude, phase = result.averages()
+            print('%6.2f %12s %10d %8.2f s %10.2e %8d %10s'
+                  % (noise, name, result.points, elapsed,
+                     abs(amplitude / AMPLITUDE - 1), result.missing_blocks,
+                     '%.1fx' % (fixed_time / elapsed) if result is stopped else ''))
+
+    print()
+    print('relative error of the average amplitude of Normal Mode runs (noise 0.05)')
+    print('%8s %10s %10s %10s' % ('points', 'last 75%', 'settled', 'from'))
+    for num_points in (4000, 6000, 10000, 15000):
+        settings = RunSettings(ref_select=EXTERNAL, freq_dur=100, sampling_rate=RATE,
+                               num_points=num_points, cutoff=5, stages=2,
+                               mode=NORMAL, wire_format=BINARY, settle=True)
+        result, elapsed = run(settings, 0.05, 0)
+        percent = result.averages(75)[0]
+        settled = result.averages()[0]
+        print('%8d %10.2e %10.2e %10d' % (num_points, abs(percent / AMPLITUDE - 1),
+                                          abs(settled / AMPLITUDE - 1),
+                                          result.statistics().start))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+'''
+Decimating the lock-in output to the rate its bandwidth needs.
+
+First, Normal Mode binary runs through the simulated Teensy, sending every
+point against sending one in decimation_factor() (auto_factor: the filter
+down by 40 dB at the reduced Nyquist frequency), for 1, 2 and 4 stages:
+the points and bytes sent, the run time, the memory the result takes and
+the average amplitude. The simulator runs at time_scale (1 keeps the
+board's time).
+
+Then what each way of decimating lets through, on the host, when the
+filter is too wide for the factor: keeping every factor-th point
+(naive), averaging groups of points as the sketch does (boxcar) and the
+polyphase FIR Decimator used in Raw and Continuous Mode. The ripple at
+twice the reference frequency folds back onto the average when it is not
+filtered out first; the time is per sample of full rate output.
+
+    python benchmarks/bench_decimation.py [time_scale]
+'''
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+
+from teensy_lockin.client import LockInClient, RunSettings, EXTERNAL
+from teensy_lockin.convergence import settling_samples
+from teensy_lockin.decimate import Decimator, boxcar_decimate
+from teensy_lockin.engine import mix_and_filter
+from teensy_lockin.instruction import NORMAL, BINARY
+from teensy_lockin.simulator import synthesize_signal
+
+AMPLITUDE = 0.5
+REF_FREQ = 1000
+RATE = 10000
+CUTOFF = 5
+NUM_POINTS = 15000
+
+
+def run(settings, time_scale):
+    url = ('teensysim://?ref_freq=%g&amplitude=%g&noise=0.1&time_scale=%g&seed=1'
+           % (REF_FREQ, AMPLITUDE, time_scale))
+    client = LockInClient(url, log=lambda *args: None)
+    start = time.perf_counter()
+    result = client.run(settings)
+    elapsed = time.perf_counter() - start
+    client.close()
+    return result, elapsed
+
+
+def device(time_scale):
+    print('Normal Mode, %d points at %d Hz, cutoff %g Hz, binary transfer'
+          % (NUM_POINTS, RATE, CUTOFF))
+    print('%7s %7s %8s %10s %8s %10s %10s' % ('stages', 'factor', 'points', 'bytes',
+                                             'time', 'memory', 'amplitude'))
+    for stages in (1, 2, 4):
+        for decimation in (1, 0):
+            settings = RunSettings(ref_select=EXTERNAL, freq_dur=100,
+                                   sampling_rate=RATE, num_points=NUM_POINTS,
+                                   cutoff=CUTOFF, stages=stages, mode=NORMAL,
+                                   wire_format=BINARY, decimation=decimation,
+                                   settle=True)
+            result, elapsed = run(settings, time_scale)
+            print('%7d %7d %8d %10d %6.2f s %8d B %10.5f'
+                  % (stages, settings.decimation_factor(), result.points,
+                     result.bytes_read, elapsed, result.data.nbytes,
+                     result.averages()[0]))
+
+
+def host():
+    signal = synthesize_signal(100000, REF_FREQ, RATE, AMPLITUDE, 30, 0.0,
+                               model='T35', rng=np.random.default_rng(0))
+    cutoff = 50 # wide enough to leave a ripple at twice the reference
+    values = mix_and_filter(signal, REF_FREQ, RATE, cutoff, 1)
+    settled = settling_samples(cutoff, RATE, 1)
+    full = values[settled:, 3]
+    print()
+    print('1 kHz reference, cutoff %d Hz, 1 stage: full rate R %.2f +- %.2f counts'
+          % (cutoff, full.mean(), full.std()))
+    print('error of the average R (counts, standard deviation in brackets) when')
+    print('decimating to rates at which the %d Hz ripple folds onto DC'
+          % (2 * REF_FREQ))
+    print('%7s %18s %18s %18s %10s' % ('factor', 'naive', 'boxcar', 'FIR',
+                                       'FIR time'))
+    for factor in (5, 10, 20):
+        decimator = Decimator(factor)
+        start = time.perf_counter()
+        fir = decimator.process(values)
+        per_sample = (time.perf_counter() - start) / len(values)
+        # from the first decimated point whose window has settled
+        skip = -(-(settled + decimator.group_delay) // factor)
+        row = []
+        for decimated in (values[factor - 1::factor], boxcar_decimate(values, factor),
+                          fir):
+            r = decimated[skip:, 3]
+            row.append('%8.3f (%6.3f)' % (r.mean() - full.mean(), r.std()))
+        print('%7d %s %7.3f us' % (factor, ' '.join(row), per_sample * 1e6))
+
+
+def main():
+    time_scale = float(sys.argv[1]) if len(sys.argv) > 1 else 1.0
+    device(time_scale)
+    host()
+
+
+if __name__ == '__main__':
+    main()
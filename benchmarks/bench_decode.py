@@ -0,0 +1,66 @@
+'''
+Benchmark converting Normal Mode records to numbers: decode_records
+against the original split/float() loop from processData.
+
+    python benchmarks/bench_decode.py [num_points]
+'''
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+
+from teensy_lockin.decode import decode_records
+from bench_serial_reader import synthetic_stream
+
+
+def legacy_decode(data):
+    '''The original conversion loop from processData'''
+    data2D = []
+    for i in range(len(data)):
+        try:
+            temp = data[i].decode()
+            temp = temp.split(', ')
+            for j in range(len(temp)):
+                temp[j] = float(temp[j])
+            data2D.append(temp)
+        except:
+            pass
+    return data2D
+
+
+def best_time(func, *args, repeats=5):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        out = func(*args)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, out
+
+
+def main():
+    num_points = int(sys.argv[1]) if len(sys.argv) > 1 else 50000 # maxPts
+    stream = synthetic_stream(num_points)
+    records = stream.split(b'\n', 1)[1].split(b'E')[:-1]
+
+    old_time, old = best_time(legacy_decode, records)
+    new_time, (values, valid) = best_time(decode_records, records)
+    assert np.array_equal(np.array(old), values[valid])
+    print('%d records' % len(records))
+    print('loop:           %8.1f ms' % (old_time * 1e3))
+    print('decode_records: %8.1f ms' % (new_time * 1e3))
+
+    # One garbled number sends only its chunk down the per-record path
+    records[len(records) // 2] = b'1, 2, ovf, 4, 5'
+    bad_time, (values, valid) = best_time(decode_records, records)
+    print('with a malformed record: %8.1f ms (%d masked)'
+          % (bad_time * 1e3, len(valid) - np.count_nonzero(valid)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+'''
+End-to-end benchmark of a run, from opening the port to saving the data,
+against the simulated Teensy (or a real one with --port).
+
+Each run goes through the same steps as Run and Save Data in the GUI:
+LockInClient opens the port, writes the instruction, waits for the first
+byte, reads and parses the data, and then the averages are computed, the
+plot drawn (off screen) and the CSV written. The
+time spent in each phase is printed as one JSON object per run, followed
+by a summary of the medians over the repeats of each configuration.
+
+    python benchmarks/bench_end_to_end.py --points 1000 10000 \
+        --rates 10000 --stages 1 4 --formats ascii binary --repeat 5 \
+        --json runs.jsonl
+
+--time-scale 0 leaves out the time the board itself takes (reference
+count, digitization, ASCII delays and USB rate), measuring the host only.
+'''
+
+import argparse
+import itertools
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+
+from teensy_lockin.client import LockInClient, RunSettings, EXTERNAL
+from teensy_lockin.cli import MODES, FORMATS
+from teensy_lockin.plotting import minmax_decimate
+
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+PHASES = ["open", "write", "first_byte", "transfer", "parse", "mix_filter",
+          "averaging", "plot", "save"]
+CSV_PATH = os.path.join(tempfile.gettempdir(), 'bench_end_to_end.csv')
+
+
+def peak_rss_mb():
+    '''Peak resident set size of this process in MB, or None if unknown'''
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kB on Linux, bytes on macOS
+    return peak / (1024.0 ** 2 if sys.platform == 'darwin' else 1024.0)
+
+
+class OffscreenPlot(object):
+    '''The GUI's plot drawn on an Agg canvas, as LivePlot.finish does'''
+
+    def __init__(self):
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        self.figure = Figure(figsize=(6, 6))
+        self.canvas = FigureCanvasAgg(self.figure)
+        self.axes = self.figure.subplots(3, 1)
+        self.lines = [axis.plot([], [])[0] for axis in self.axes]
+
+    def draw(self, data):
+        width = self.axes[1].bbox.width
+        signal = data.signal[:200] * data.volts_per_count
+        self.lines[0].set_data(np.arange(len(signal)), signal)
+        self.lines[1].set_data(*minmax_decimate(data.amplitude_volts, width))
+        self.lines[2].set_data(*minmax_decimate(data.phi, width))
+        for axis in self.axes:
+            axis.relim()
+            axis.autoscale_view()
+        self.canvas.draw()
+
+
+def run_once(port, settings, plot, percent=75):
+    '''Runs one acquisition and the GUI's post processing, returns a dict'''
+    client = LockInClient(port, log=lambda *a: None)
+    start = time.perf_counter()
+    result = client.run(settings)
+    timings = result.timings
+    if result.data is not None:
+        with timings.phase("averaging"):
+            result.averages(percent)
+        if plot is not None:
+            with timings.phase("plot"):
+                plot.draw(result.data)
+        with timings.phase("save"):
+            result.save_csv(CSV_PATH)
+    wall = time.perf_counter() - start
+    records = result.points
+    transfer = timings.phases.get("transfer", 0.0)
+    return {"points": settings.num_points,
+            "rate": settings.sampling_rate,
+            "stages": settings.stages,
+            "mode": settings.mode,
+            "format": settings.wire_format,
+            "wall_s": wall,
+            "phases_s": timings.as_dict(),
+            "bytes": result.bytes_read,
+            "records": records,
+            "bytes_per_s": result.bytes_read / transfer if transfer else None,
+            "records_per_s": records / transfer if transfer else None,
+            "timed_out": result.timed_out,
+            "peak_rss_mb": peak_rss_mb()}
+
+
+def summarize(runs):
+    '''Prints the median of each phase for each configuration'''
+    key = lambda run: (run["mode"], run["format"], run["points"], run["rate"],
+                       run["stages"])
+    names = dict((v, k) for k, v in FORMATS.items())
+    modes = dict((v, k) for k, v in MODES.items())
+    print('%-10s %-9s %6s %6s %2s %8s  %s' % ('mode', 'format', 'points', 'rate',
+                                             'st', 'wall(s)', 'median phases (ms)'))
+    for config, group in itertools.groupby(sorted(runs, key=key), key):
+        group = list(group)
+        phases = ', '.join('%s %.1f' % (phase, 1e3 * statistics.median(
+                              run["phases_s"].get(phase, 0.0) for run in group))
+                           for phase in PHASES
+                           if any(phase in run["phases_s"] for run in group))
+        print('%-10s %-9s %6d %6d %2d %8.3f  %s'
+              % (modes[config[0]], names[config[1]], config[2], config[3],
+                 config[4], statistics.median(run["wall_s"] for run in group),
+                 phases))
+    rates = [run["records_per_s"] for run in runs if run["records_per_s"]]
+    if rates:
+        print('records/s during transfer: median %.0f' % statistics.median(rates))
+    print('peak RSS: %s MB' % (runs[-1]["peak_rss_mb"] and '%.1f' % runs[-1]["peak_rss_mb"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--port', default=None,
+                        help='serial port (default: the simulated Teensy)')
+    parser.add_argument('--time-scale', type=float, default=1.0,
+                        help='time scale of the simulated Teensy (default 1)')
+    parser.add_argument('--points', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--rates', type=int, nargs='+', default=[10000])
+    parser.add_argument('--stages', type=int, nargs='+', default=[1, 4])
+    parser.add_argument('--modes', choices=list(MODES), nargs='+',
+                        default=['normal'])
+    parser.add_argument('--formats', choices=list(FORMATS), nargs='+',
+                        default=['ascii', 'binary'])
+    parser.add_argument('--count-ms', type=int, default=100,
+                        help='external reference count duration (default 100)')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--json', help='also write the runs to this file')
+    parser.add_argument('--no-plot', action='store_true')
+    args = parser.parse_args()
+
+    port = args.port or 'teensysim://?seed=0&time_scale=%g' % args.time_scale
+    plot = None if args.no_plot else OffscreenPlot()
+    out = open(args.json, 'w') if args.json else None
+    runs = []
+    for mode, wire_format, points, rate, stages in itertools.product(
+            args.modes, args.formats, args.points, args.rates, args.stages):
+        if mode != 'normal' and wire_format != args.formats[0]:
+            continue # the transfer format only matters in Normal Mode
+        settings = RunSettings(ref_select=EXTERNAL, freq_dur=args.count_ms,
+                               sampling_rate=rate, num_points=points,
+                               cutoff=5, stages=stages, mode=MODES[mode],
+                               wire_format=FORMATS[wire_format])
+        for _ in range(args.repeat):
+            run = run_once(port, settings, plot)
+            runs.append(run)
+            line = json.dumps(run)
+            print(line)
+            if out is not None:
+                out.write(line + '\n')
+    if out is not None:
+        out.close()
+    print()
+    summarize(runs)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+'''
+Check the vectorized host lock-in engine against the Python port of the
+firmware's mixAndFilter on synthetic signals, and time both.
+
+With several stages and a corner frequency far below the sampling rate,
+the firmware's direct-form recursion is badly conditioned and its own
+rounding error is of order 1e-6 relative, so agreement is reported
+relative to the output amplitude. (Normal Mode prints values with 2
+decimals, far coarser than that.)
+
+    python benchmarks/bench_engine.py [num_points]
+'''
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+
+from teensy_lockin import engine
+
+
+def synthetic_signal(num_points, ref_freq, sampling_rate, seed=0):
+    '''13-bit style signal: offset sinusoid plus noise, as int16'''
+    rng = np.random.default_rng(seed)
+    n = np.arange(num_points)
+    signal = (4096 + 1500 * np.sin(2 * np.pi * ref_freq * n / sampling_rate + 0.7)
+              + rng.normal(0, 50, num_points))
+    return signal.astype(np.int16)
+
+
+def main():
+    num_points = int(sys.argv[1]) if len(sys.argv) > 1 else 15000
+    sampling_rate = 10000
+    ref_freq = 1000.0
+    signal = synthetic_signal(num_points, ref_freq, sampling_rate)
+    print('filter: %s' % ('scipy lfilter' if engine.get_lfilter() is not None
+                          else 'NumPy single-pole cascade'))
+    print('stages cutoff  reference(s)  vectorized(ms)  max rel. diff')
+    for stages in (1, 2, 3, 4):
+        for cutoff in (5, 100):
+            start = time.perf_counter()
+            ref = engine.mix_and_filter_reference(signal, ref_freq,
+                                                  sampling_rate, cutoff, stages)
+            ref_time = time.perf_counter() - start
+            start = time.perf_counter()
+            out = engine.mix_and_filter(signal, ref_freq, sampling_rate,
+                                        cutoff, stages)
+            vec_time = time.perf_counter() - start
+            scale = np.max(np.abs(ref[:, 3]))
+            diff = np.max(np.abs(out[:, 1:4] - ref[:, 1:4])) / scale
+            print('%6d %6d %13.2f %15.2f %14.1e'
+                  % (stages, cutoff, ref_time, vec_time * 1e3, diff))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+'''
+Compare saving a run the way Save Data used to (copy the DataFrame and
+write it with to_csv) with the binary export formats: time to save, file
+size and time to load again.
+
+    python benchmarks/bench_export.py [num_points]
+'''
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+import pandas as pd
+
+from teensy_lockin import export
+from teensy_lockin.client import RunResult, RunSettings
+from teensy_lockin.decode import COLUMNS
+
+from bench_binary import make_columns
+
+
+def legacy_save(path, dataDf):
+    '''saveData before the export module'''
+    out_df = dataDf.copy()
+    out_df['R'] = 2*out_df['R']
+    with open(path, 'w') as f:
+        f.write(out_df.to_csv())
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    num_points = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    result = RunResult(RunSettings(num_points=num_points))
+    result.data = np.column_stack(make_columns(num_points)).astype(np.float64)
+    result.ref_freq = 1000.0
+    directory = tempfile.mkdtemp()
+
+    print('%d points' % num_points)
+    print('format            save(ms)  size(kB)  load(ms)')
+    path = os.path.join(directory, 'legacy.csv')
+    save_time = timed(legacy_save, path, pd.DataFrame(result.data.values(), columns=COLUMNS))
+    load_time = timed(pd.read_csv, path)
+    print('%-16s %9.1f %9.0f %9.1f' % ('csv (to_csv)', save_time * 1e3,
+                                       os.path.getsize(path) / 1e3, load_time * 1e3))
+    for ext in ('.csv', '.npz', '.parquet', '.h5'):
+        path = os.path.join(directory, 'run' + ext)
+        try:
+            save_time = timed(export.save, path, result)
+        except ImportError as e:
+            print('%-16s skipped (%s)' % (ext, e))
+            continue
+        load = pd.read_csv if ext == '.csv' else export.load
+        load_time = timed(load, path)
+        print('%-16s %9.1f %9.0f %9.1f' % (ext[1:], save_time * 1e3,
+                                           os.path.getsize(path) / 1e3, load_time * 1e3))
+
+    path = os.path.join(directory, 'stream.npy')
+    start = time.perf_counter()
+    with export.StreamWriter(path, export.run_metadata(result)) as writer:
+        for first in range(0, num_points, 1000):
+            writer.append(result.data.records[first:first + 1000])
+    save_time = time.perf_counter() - start
+    load_time = timed(export.load, path)
+    print('%-16s %9.1f %9.0f %9.1f' % ('npy (streamed)', save_time * 1e3,
+                                       os.path.getsize(path) / 1e3, load_time * 1e3))
+
+
+if __name__ == '__main__':
+    main()
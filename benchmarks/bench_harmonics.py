@@ -0,0 +1,46 @@
+'''
+Time lock-in detection of one capture at several harmonics of the
+reference: one mix_and_filter per frequency against engine.demodulate for
+all of them at once, and check that they agree.
+
+    python benchmarks/bench_harmonics.py [num_points]
+'''
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+
+from teensy_lockin import engine
+from teensy_lockin.simulator import synthesize_signal
+
+
+def main():
+    num_points = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    sampling_rate = 10000
+    ref_freq = 250.0
+    signal = synthesize_signal(num_points, ref_freq, sampling_rate, 0.5, 0.3,
+                               0.05, rng=np.random.default_rng(0))
+    print('filter: %s' % ('scipy lfilter' if engine.get_lfilter() is not None
+                          else 'NumPy single-pole cascade'))
+    print('%d points' % num_points)
+    print('freqs  per frequency(ms)  demodulate(ms)  max diff')
+    for count in (1, 3, 10, 19):
+        freqs = engine.harmonic_freqs(ref_freq, range(1, count + 1))
+        start = time.perf_counter()
+        each = [engine.mix_and_filter(signal, freq, sampling_rate, 5, 4)
+                for freq in freqs]
+        loop = time.perf_counter() - start
+        start = time.perf_counter()
+        bank = engine.demodulate(signal, freqs, sampling_rate, 5, 4)
+        batched = time.perf_counter() - start
+        diff = max(np.max(np.abs(bank[k, :, :3] - out[:, 1:4]))
+                   for k, out in enumerate(each))
+        print('%5d %18.1f %15.1f %9.1e' % (count, loop * 1e3, batched * 1e3, diff))
+
+
+if __name__ == '__main__':
+    main()
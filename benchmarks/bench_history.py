@@ -0,0 +1,88 @@
+'''
+Time recording runs in the run history: how long record() holds up the
+acquisition thread, against inserting and committing each run as it
+finishes, and how long the batches take to be written. Then time a query
+("runs at 1 kHz with 2 stages in the last week") over the whole history.
+
+    python benchmarks/bench_history.py [num_runs]
+'''
+
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+
+from teensy_lockin.client import RunResult, RunSettings
+from teensy_lockin.history import COLUMNS, RunHistory, run_row
+
+DAY = 24 * 3600.0
+
+
+def make_results(num_runs, rng):
+    '''Finished runs with their statistics, at a few frequencies and filters'''
+    results = []
+    for k in range(num_runs):
+        settings = RunSettings(freq_dur=1000, num_points=2000,
+                               cutoff=int(rng.choice([1, 2, 5, 10])),
+                               stages=int(rng.integers(1, 5)))
+        result = RunResult(settings)
+        result.ref_freq = float(rng.choice([100.0, 500.0, 1000.0, 5000.0]))
+        result.stats.update(rng.normal(100, 1, 2000), rng.normal(0, 0.01, 2000))
+        result.points = 2000
+        results.append(result)
+    return results
+
+
+def main():
+    num_runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    rng = np.random.default_rng(0)
+    results = make_results(num_runs, rng)
+    directory = tempfile.mkdtemp()
+    print('%d runs' % num_runs)
+
+    # one INSERT and COMMIT per run, in the acquisition thread
+    path = os.path.join(directory, 'direct.db')
+    RunHistory(path).close()
+    db = sqlite3.connect(path)
+    sql = "INSERT INTO runs (%s) VALUES (%s)" % (", ".join(COLUMNS[1:]),
+                                                ", ".join("?" * len(COLUMNS[1:])))
+    start = time.perf_counter()
+    for result in results:
+        row = run_row(result.settings, result)
+        with db:
+            db.execute(sql, [row[name] for name in COLUMNS[1:]])
+    direct = time.perf_counter() - start
+    db.close()
+    print('insert and commit each   %8.1f us per run' % (direct * 1e6 / num_runs))
+
+    history = RunHistory(os.path.join(directory, 'history.db'), flush_interval=0.1)
+    start = time.perf_counter()
+    for result in results:
+        history.record(result, port='/dev/ttyACM0')
+    queued = time.perf_counter() - start
+    history.flush()
+    written = time.perf_counter() - start
+    print('record (queued)          %8.1f us per run' % (queued * 1e6 / num_runs))
+    print('written in batches       %8.1f us per run' % (written * 1e6 / num_runs))
+
+    # spread the runs over the last month to query them
+    db = sqlite3.connect(history.path)
+    now = time.time()
+    with db:
+        db.execute("UPDATE runs SET finished_at = ? - (id * ?)",
+                   (now, 30 * DAY / num_runs))
+    db.close()
+    start = time.perf_counter()
+    rows = history.find(since=now - 7 * DAY, freq=1000, stages=2)
+    query = time.perf_counter() - start
+    print('1 kHz, 2 stages, 7 days  %8.2f ms (%d runs)' % (query * 1e3, len(rows)))
+    history.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+'''
+Time one run on 1, 2, 4 and 8 simulated Teensies at once with Session,
+against the same runs on one board after another, to show how close the
+concurrent session comes to the time of a single board.
+
+    python benchmarks/bench_multi_board.py [num_points] [mode]
+
+mode is normal (ASCII, default), binary or raw.
+'''
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from teensy_lockin.client import LockInClient, RunSettings, EXTERNAL
+from teensy_lockin.instruction import NORMAL, RAW, ASCII, BINARY
+from teensy_lockin.session import Session
+
+MODES = {"normal": (NORMAL, ASCII), "binary": (NORMAL, BINARY), "raw": (RAW, ASCII)}
+
+
+def main():
+    num_points = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    mode, wire_format = MODES[sys.argv[2] if len(sys.argv) > 2 else "normal"]
+    settings = RunSettings(ref_select=EXTERNAL, freq_dur=500, num_points=num_points,
+                           mode=mode, wire_format=wire_format)
+    quiet = lambda *args: None
+    print('%d points' % num_points)
+    print('boards  one after another(s)  session(s)  speedup  failed')
+    for boards in (1, 2, 4, 8):
+        ports = ['teensysim://?seed=%d&amplitude=%g' % (k, 0.1 * (k + 1))
+                 for k in range(boards)]
+        start = time.perf_counter()
+        for port in ports:
+            LockInClient(port, log=quiet).run(settings)
+        serial_time = time.perf_counter() - start
+        result = Session(ports, log=quiet).run(settings)
+        failed = sum(result.status(port) != "ok" for port in ports)
+        print('%6d %21.2f %11.2f %8.2f %7d' % (boards, serial_time, result.elapsed,
+                                               serial_time / result.elapsed, failed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+'''
+How close the internal reference gets to requested frequencies with the
+single 300 entry sine table and with all the tables in SineLUT.h, and how
+long building the FrequencyPlanner index and answering queries take.
+
+    python benchmarks/bench_reference.py [num_freqs]
+'''
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+
+from teensy_lockin.reference import (FrequencyPlanner, LUT_SIZES,
+                                     SINE_LUT_LENGTH, achieved_freq)
+
+
+def main():
+    num_freqs = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    start = time.perf_counter()
+    planner = FrequencyPlanner()
+    build = time.perf_counter() - start
+    print('index of %d frequencies from %d tables built in %.0f ms'
+          % (len(planner), len(LUT_SIZES), build * 1e3))
+
+    targets = np.geomspace(10, 100000, num_freqs)
+    start = time.perf_counter()
+    plans = planner.nearest_many(targets)
+    query = time.perf_counter() - start
+    print('%d queries in %.1f ms (%.1f us each)'
+          % (num_freqs, query * 1e3, query * 1e6 / num_freqs))
+
+    single = np.array([achieved_freq(f, SINE_LUT_LENGTH) for f in np.rint(targets)])
+    planned = np.array([plan.freq for plan in plans])
+    print('decade          max rel. error: 300 table  all tables  mean table size')
+    for low in (10, 100, 1000, 10000):
+        band = (targets >= low) & (targets < 10 * low)
+        print('%6d-%-7d %28.1e %11.1e %16.0f'
+              % (low, 10 * low,
+                 np.max(np.abs(single[band] - targets[band]) / targets[band]),
+                 np.max(np.abs(planned[band] - targets[band]) / targets[band]),
+                 np.mean([plan.lut_size for plan, b in zip(plans, band) if b])))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+'''
+Time back-to-back external reference runs through the simulated Teensy,
+counting the reference for 5 s every run against reusing the frequency
+kept by a ReferenceCache (no count, or a checking count long enough to
+resolve instruction.REF_TOLERANCE), once a
+first, untimed run has filled the cache. The simulator keeps the board's time unless a time_scale is given (the count
+then takes time_scale * 5 s).
+
+Then compare how well each way measures a reference of 1234.567 Hz: the
+Teensy's 5 s and 200 ms counts, and the estimates from the digitized
+signal (estimate_freq, zero_crossing_freq) at several noise levels.
+
+    python benchmarks/bench_reference_cache.py [num_runs] [time_scale]
+'''
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+
+from teensy_lockin.client import LockInClient, RunSettings, EXTERNAL
+from teensy_lockin.frequency import estimate_freq, zero_crossing_freq
+from teensy_lockin.refcache import ReferenceCache, check_duration
+from teensy_lockin.simulator import synthesize_signal
+
+REF_FREQ = 1234.567
+RATE = 10000
+NOISE_LEVELS = [0.0, 0.1, 0.5, 2.0]
+
+
+def cycle_time(ref_cache, num_runs, time_scale, check_ms=0):
+    '''Mean time (s) a run takes, and the frequencies measured'''
+    url = 'teensysim://?ref_freq=%g&amplitude=0.5&noise=0.1&time_scale=%g' % (
+        REF_FREQ, time_scale)
+    if ref_cache is not None:
+        ref_cache.check_ms = check_ms
+    client = LockInClient(url, log=lambda *args: None, ref_cache=ref_cache)
+    settings = RunSettings(ref_select=EXTERNAL, freq_dur=5000,
+                           sampling_rate=RATE, num_points=5000)
+    if ref_cache is not None:
+        client.run(settings) # counts, and fills the cache
+    freqs = []
+    start = time.perf_counter()
+    for k in range(num_runs):
+        result = client.run(settings)
+        freqs.append(result.ref_freq)
+    elapsed = time.perf_counter() - start
+    client.close()
+    return elapsed / num_runs, freqs
+
+
+def count(freq, period_ms):
+    '''The frequency the Teensy's edge count finds'''
+    return int(freq * period_ms / 1000) / float(period_ms) * 1000
+
+
+def main():
+    num_runs = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    time_scale = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+    print('%d runs of 5000 points at %d Hz' % (num_runs, RATE))
+    every, freqs = cycle_time(None, num_runs, time_scale)
+    print('count every run (5 s)    %7.3f s per run   %.3f Hz' % (every, freqs[-1]))
+    for check_ms in (0, 200):
+        cached, freqs = cycle_time(ReferenceCache(), num_runs, time_scale, check_ms)
+        if check_ms:
+            check_ms = max(check_ms, check_duration(round(REF_FREQ, 3)))
+        print('cached, %4d ms count    %7.3f s per run   %.3f Hz  (%.1fx)'
+              % (check_ms, cached, freqs[-1], every / cached))
+
+    print()
+    print('error measuring %.3f Hz (mean absolute, Hz; rejected estimates)' % REF_FREQ)
+    print('%8s %10s %10s %12s %14s' % ('noise', '5 s count', '200 ms',
+                                      'estimate', 'zero crossing'))
+    rng = np.random.default_rng(0)
+    trials = 20
+    for noise in NOISE_LEVELS:
+        spectral, crossing = [], []
+        rejected = 0
+        start = time.perf_counter()
+        for k in range(trials):
+            signal = synthesize_signal(5000, REF_FREQ, RATE, 0.5, rng.uniform(0, 360),
+                                       noise, 1.65, 'T35', rng)
+            guess = count(REF_FREQ, 5000)
+            estimate = estimate_freq(signal, RATE, guess=guess)
+            if estimate is None:
+                rejected += 1
+            else:
+                spectral.append(abs(estimate - REF_FREQ))
+            crossing.append(abs(zero_crossing_freq(signal, RATE, guess) - REF_FREQ))
+        per_estimate = (time.perf_counter() - start) / trials
+        print('%8.1f %10.4f %10.4f %8.4f (%d) %14.4f   %.1f ms per signal'
+              % (noise, abs(count(REF_FREQ, 5000) - REF_FREQ),
+                 abs(count(REF_FREQ, 200) - REF_FREQ),
+                 np.mean(spectral) if spectral else np.nan, rejected,
+                 np.mean(crossing), per_estimate * 1e3))
+
+
+if __name__ == '__main__':
+    main()
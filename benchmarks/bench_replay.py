@@ -0,0 +1,86 @@
+'''
+Profiling the read and parse paths on recorded traffic, without a board.
+
+Records one run of each kind through the simulated Teensy with a
+SerialRecorder, then replays each recording as fast as possible
+(teensyreplay://...?speed=0) num_runs times. For each, print the size of
+the recording against the bytes read, the time of the recorded run, the
+mean time of a replay split into the phases of PhaseTimer (so transfer
+is the host reading and decoding, with no waiting on the board), whether
+the replays gave the same averages as the recorded run, and the cost of
+recording a replay as it goes.
+
+A recording from a board (python -m teensy_lockin --record FILE, or
+Record serial traffic in the GUI) replays the same way, given the
+settings of its runs.
+
+    python benchmarks/bench_replay.py [num_runs] [time_scale]
+'''
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from teensy_lockin.client import LockInClient, RunSettings, EXTERNAL
+from teensy_lockin.instruction import NORMAL, RAW, ASCII, BINARY, BINARY_IQ
+from teensy_lockin.recording import SerialRecorder
+from teensy_lockin.timing import PhaseTimer
+
+RUNS = [("Normal, ASCII", dict(mode=NORMAL, wire_format=ASCII)),
+        ("Normal, binary", dict(mode=NORMAL, wire_format=BINARY)),
+        ("Normal, binary I/Q", dict(mode=NORMAL, wire_format=BINARY_IQ)),
+        ("Raw", dict(mode=RAW))]
+PHASES = ["open", "transfer", "parse", "mix_filter"]
+
+
+def replay(path, settings, num_runs, recorder=None):
+    '''Mean PhaseTimer of num_runs replays of the first run recorded in path'''
+    total = PhaseTimer()
+    result = None
+    for k in range(num_runs):
+        # connection 0 every time, rather than the next one
+        client = LockInClient('teensyreplay://%s?speed=0&connection=0' % path,
+                              log=lambda *args: None, recorder=recorder)
+        result = client.run(settings)
+        for name, seconds in result.timings.as_dict().items():
+            total.add(name, seconds / num_runs)
+    return total, result
+
+
+def main():
+    num_runs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    time_scale = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+    url = 'teensysim://?ref_freq=1000&amplitude=0.5&noise=0.1&time_scale=%g&seed=1' % time_scale
+    directory = tempfile.mkdtemp()
+    print('10000 points at 10 kHz, replayed %d times' % num_runs)
+    print('%-20s %10s %10s %9s %9s %s %6s %12s' % (
+        'run', 'bytes read', 'file size', 'recorded', 'replayed',
+        ' '.join('%10s' % name for name in PHASES), 'same', 'record cost'))
+    for name, kwargs in RUNS:
+        settings = RunSettings(ref_select=EXTERNAL, freq_dur=100, num_points=10000,
+                               **kwargs)
+        path = os.path.join(directory, name.replace(' ', '').replace(',', '_')
+                            .replace('/', '') + '.tlrec')
+        with SerialRecorder(path) as recorder:
+            client = LockInClient(url, log=lambda *args: None, recorder=recorder)
+            start = time.perf_counter()
+            recorded = client.run(settings)
+            recorded_time = time.perf_counter() - start
+        timings, replayed = replay(path, settings, num_runs)
+        with SerialRecorder(os.path.join(directory, 'again.tlrec')) as recorder:
+            again, _ = replay(path, settings, num_runs, recorder)
+        same = (replayed.points == recorded.points
+                and replayed.averages() == recorded.averages())
+        print('%-20s %10d %10d %7.3f s %7.4f s %s %6s %9.2f ms' % (
+            name, recorded.bytes_read, os.path.getsize(path), recorded_time,
+            timings.total(),
+            ' '.join('%8.2f ms' % (timings.phases.get(phase, 0) * 1e3)
+                     for phase in PHASES),
+            'yes' if same else 'NO', (again.total() - timings.total()) * 1e3))
+
+
+if __name__ == '__main__':
+    main()
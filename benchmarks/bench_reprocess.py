@@ -0,0 +1,68 @@
+'''
+Time reprocessing a saved run for a grid of filter settings: one
+mix_and_filter per setting, mix_and_filter_many for all of them, and the
+Reprocessor cache when the settings are asked for again. Then time a
+directory of captures reprocessed in one process and in a pool.
+
+    python benchmarks/bench_reprocess.py [num_points] [num_files]
+'''
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+
+from teensy_lockin import export, reprocess
+from teensy_lockin.client import RunResult, RunSettings, RAW
+from teensy_lockin.engine import mix_and_filter, mix_and_filter_many
+from teensy_lockin.simulator import synthesize_signal
+
+PARAMS = [(cutoff, stages) for cutoff in (1, 2, 5, 10, 20) for stages in (1, 2, 3, 4)]
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    function(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def main():
+    num_points = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    num_files = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    signal = synthesize_signal(num_points, 1000.0, 10000, 0.5, 0.3, 0.1,
+                               rng=np.random.default_rng(0))
+    capture = reprocess.Capture(signal[4:], 1000.0, 10000)
+
+    print('%d points, %d filter settings' % (num_points, len(PARAMS)))
+    loop = timed(lambda: [mix_and_filter(signal, 1000.0, 10000, cutoff, stages)
+                          for cutoff, stages in PARAMS])
+    many = timed(mix_and_filter_many, signal, 1000.0, 10000, PARAMS)
+    reprocessor = reprocess.Reprocessor()
+    first = timed(reprocessor.process_many, capture, PARAMS)
+    again = timed(lambda: [reprocessor.process(capture, cutoff, stages)
+                           for cutoff, stages in PARAMS])
+    print('mix_and_filter per setting  %8.1f ms' % (loop * 1e3))
+    print('mix_and_filter_many         %8.1f ms' % (many * 1e3))
+    print('Reprocessor, first time     %8.1f ms' % (first * 1e3))
+    print('Reprocessor, cached         %8.3f ms (%.1f us per setting)'
+          % (again * 1e3, again * 1e6 / len(PARAMS)))
+
+    directory = tempfile.mkdtemp()
+    for k in range(num_files):
+        result = RunResult(RunSettings(num_points=num_points, mode=RAW))
+        result.ref_freq = 1000.0
+        result.data = mix_and_filter(synthesize_signal(
+            num_points, 1000.0, 10000, rng=np.random.default_rng(k)), 1000.0, 10000, 5, 1)
+        export.save(os.path.join(directory, 'run%03d.npz' % k), result)
+    serial = timed(reprocess.reprocess_directory, directory, PARAMS, processes=1)
+    pooled = timed(reprocess.reprocess_directory, directory, PARAMS)
+    print('%d files, one process        %8.1f ms' % (num_files, serial * 1e3))
+    print('%d files, %d processes        %8.1f ms' % (num_files, os.cpu_count(), pooled * 1e3))
+
+
+if __name__ == '__main__':
+    main()
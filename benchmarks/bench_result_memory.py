@@ -0,0 +1,98 @@
+'''
+Compare the memory a finished run takes the way the GUI used to keep it (a
+float64 array plus its DataFrame) with LockInData, and the memory
+allocated while it is plotted and saved as CSV, measured with tracemalloc.
+
+    python benchmarks/bench_result_memory.py [num_points]
+'''
+
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+import pandas as pd
+
+from teensy_lockin.client import RunResult, RunSettings
+from teensy_lockin.data import LockInData
+from teensy_lockin.decode import COLUMNS
+from teensy_lockin.plotting import minmax_decimate
+
+from bench_binary import make_columns
+
+SCALE = 3.3/4096
+WIDTH = 600 # pixels across the plot
+
+
+def measured(function, *args):
+    '''
+    Returns (result, peak MB allocated during the call, ms). The time is
+    taken on a second call without tracemalloc, which slows Python code.
+    '''
+    tracemalloc.start()
+    out = function(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    start = time.perf_counter()
+    function(*args)
+    return out, peak / 1e6, (time.perf_counter() - start) * 1e3
+
+
+def legacy_keep(values):
+    '''The float64 data and the DataFrame kept after each run'''
+    data = values.astype(np.float64)
+    return data, pd.DataFrame(data, columns=COLUMNS)
+
+
+def legacy_plot(data):
+    '''LivePlot.finish before LockInData: a copy into the ring buffer'''
+    rows = data[:, [0, 3, 4]]
+    minmax_decimate(2 * rows[:, 1] * SCALE, WIDTH)
+    minmax_decimate(rows[:, 2], WIDTH)
+
+
+def legacy_save(path, dataDf):
+    '''saveData before the export module'''
+    out_df = dataDf.copy()
+    out_df['R'] = 2*out_df['R']
+    with open(path, 'w') as f:
+        f.write(out_df.to_csv())
+
+
+def plot(data):
+    '''LivePlot.finish with LockInData'''
+    minmax_decimate(data.amplitude_volts, WIDTH)
+    minmax_decimate(data.phi, WIDTH)
+
+
+def main():
+    num_points = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    values = np.column_stack(make_columns(num_points))
+    path = os.path.join(tempfile.mkdtemp(), 'run.csv')
+    print('%d points' % num_points)
+    print('                        old MB   new MB   old ms   new ms')
+
+    (data, dataDf), old_keep, old_ms = measured(legacy_keep, values)
+    compact, new_keep, new_ms = measured(LockInData, values, SCALE)
+    print('kept after the run    %8.1f %8.1f %8.1f %8.1f   %.1fx less'
+          % (old_keep, new_keep, old_ms, new_ms, old_keep / new_keep))
+    _, old_plot, old_ms = measured(legacy_plot, data)
+    _, new_plot, new_ms = measured(plot, compact)
+    print('plotted (allocated)   %8.1f %8.1f %8.1f %8.1f'
+          % (old_plot, new_plot, old_ms, new_ms))
+    result = RunResult(RunSettings(num_points=num_points))
+    result.data = compact
+    _, old_save, old_ms = measured(legacy_save, path, dataDf)
+    _, new_save, new_ms = measured(result.save_csv, path)
+    print('saved as CSV (alloc.) %8.1f %8.1f %8.1f %8.1f'
+          % (old_save, new_save, old_ms, new_ms))
+    print('per point kept: %.1f bytes old, %.1f bytes new (with amplitude_volts cached)'
+          % (old_keep * 1e6 / num_points, compact.nbytes / num_points))
+
+
+if __name__ == '__main__':
+    main()
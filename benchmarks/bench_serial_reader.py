@@ -0,0 +1,121 @@
+'''
+Benchmark reading a Normal Mode stream with FrameReader against the
+original byte-at-a-time loop from processData.
+
+Both readers are fed by ReplaySerial, a stand-in for serial.Serial that
+replays a captured stream. Pass the path of a raw capture as the first
+argument, or a synthetic stream in the firmware's format is generated.
+
+    python benchmarks/bench_serial_reader.py [capture_file]
+'''
+
+import math
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from teensy_lockin.serial_reader import FrameReader
+
+
+class ReplaySerial(object):
+    '''
+    Minimal serial.Serial stand-in replaying a byte string.
+    At most usb_chunk bytes are reported as waiting at a time, roughly as a
+    USB serial port would deliver them.
+    '''
+
+    def __init__(self, data, usb_chunk=4096):
+        self.data = data
+        self.pos = 0
+        self.usb_chunk = usb_chunk
+
+    @property
+    def in_waiting(self):
+        return min(len(self.data) - self.pos, self.usb_chunk)
+
+    def read(self, size=1):
+        out = self.data[self.pos:self.pos + size]
+        self.pos += len(out)
+        return out
+
+    def readinto(self, b):
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def readline(self):
+        end = self.data.find(b'\n', self.pos) + 1
+        if end == 0:
+            end = len(self.data)
+        return self.read(end - self.pos)
+
+
+def synthetic_stream(num_points=15000, ref_freq=1000.0, sampling_rate=10000):
+    '''Builds a Normal Mode stream in the format printed by mixAndFilter'''
+    parts = ['%.2f\r\n' % ref_freq]
+    for n in range(num_points):
+        phase = 2 * math.pi * ref_freq * n / sampling_rate
+        signal = int(4096 + 2000 * math.sin(phase + 0.3))
+        i = 1000 * math.cos(0.3) + 3 * math.sin(n)
+        q = 1000 * math.sin(0.3) + 3 * math.cos(n)
+        parts.append('%d, %.2f, %.2f, %.2f, %.2fE'
+                     % (signal, i, q, math.hypot(i, q), math.atan2(q, i)))
+    return ''.join(parts).encode()
+
+
+def legacy_read(ser, cutoff):
+    '''The original per-byte loop from processData'''
+    data = []
+    externalRefFreq = str(ser.readline().strip()).strip("b'")
+    d = ''
+    count = 0
+    while count < cutoff:
+        temp = ser.read()
+        temp = str(temp)[2:-1]
+        if (temp != 'E'):
+            d = d + temp
+        else:
+            data.append(d)
+            d = ''
+            count += 1
+    return data
+
+
+def frame_read(ser, cutoff):
+    '''The same job done with FrameReader'''
+    reader = FrameReader(ser)
+    externalRefFreq = reader.readline().strip().decode()
+    return [record.decode() for record in reader.records(cutoff, timeout=30)]
+
+
+def run(name, func, stream, cutoff, repeats=3):
+    best = None
+    for _ in range(repeats):
+        ser = ReplaySerial(stream)
+        start = time.perf_counter()
+        records = func(ser, cutoff)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    print('%-12s %8.3f s %14.0f bytes/s %12.0f records/s'
+          % (name, best, ser.pos / best, len(records) / best))
+    return records
+
+
+def main():
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], 'rb') as f:
+            stream = f.read()
+    else:
+        stream = synthetic_stream()
+    cutoff = stream.count(b'E')
+    print('stream: %d bytes, %d records' % (len(stream), cutoff))
+    old = run('per-byte', legacy_read, stream, cutoff)
+    new = run('FrameReader', frame_read, stream, cutoff)
+    assert old == new, 'readers disagree'
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+'''
+Time startup: the import of teensy_lockin_gui and of the command line
+interface (from python -X importtime, in a fresh interpreter each time)
+with the slowest modules they import, and the time until the GUI window is
+shown, if there is a display.
+Exits with status 1 if the GUI import takes longer than --max-import-ms,
+so it can be used to catch a heavy import creeping back in.
+
+    python benchmarks/bench_startup.py [--max-import-ms MS] [--top N]
+'''
+
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+WINDOW_SCRIPT = '''
+import time
+start = time.perf_counter()
+import tkinter as tk
+import teensy_lockin_gui
+root = tk.Tk()
+frame = teensy_lockin_gui.LockInDetection(root)
+frame.grid()
+def shown(event):
+    if event.widget is root:
+        print("%.1f" % ((time.perf_counter() - start) * 1e3))
+        root.after(0, root.destroy)
+root.bind("<Map>", shown)
+root.mainloop()
+'''
+
+
+def import_times(module):
+    '''Returns (total ms, [(ms, module), ...]) for importing module'''
+    out = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+                         cwd=ROOT, capture_output=True, text=True, check=True).stderr
+    times = []
+    for line in out.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, name = line[len('import time:'):].split('|')
+        times.append((int(cumulative_us) / 1e3, name[1:].rstrip()))
+    # the module is reported last, after everything it imported; its
+    # direct imports are indented one level (two spaces) below it
+    total = times[-1][0]
+    top = []
+    for ms, name in reversed(times[:-1]):
+        if not name.startswith('  '):
+            break # imported before the module (interpreter startup)
+        if not name.startswith('   '):
+            top.append((ms, name.strip()))
+    top.sort()
+    return total, top[::-1]
+
+
+def window_time():
+    '''Milliseconds from start to the window being shown, or None'''
+    try:
+        out = subprocess.run([sys.executable, '-c', WINDOW_SCRIPT], cwd=ROOT,
+                             capture_output=True, text=True, timeout=60)
+    except subprocess.TimeoutExpired:
+        return None
+    if out.returncode != 0:
+        return None
+    return float(out.stdout.split()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--max-import-ms', type=float, default=None)
+    parser.add_argument('--top', type=int, default=8)
+    args = parser.parse_args()
+
+    for module in ('teensy_lockin.cli', 'teensy_lockin_gui'):
+        total, top = import_times(module)
+        print('import %-20s %8.1f ms' % (module, total))
+        for ms, name in top[:args.top]:
+            print('    %-30s %8.1f ms' % (name, ms))
+    shown = window_time()
+    if shown is None:
+        print('window shown            skipped (no display)')
+    else:
+        print('window shown            %8.1f ms' % shown)
+
+    if args.max_import_ms is not None and total > args.max_import_ms:
+        print('GUI import took %.1f ms, more than %.1f ms' % (total, args.max_import_ms))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
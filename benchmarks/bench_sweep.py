@@ -0,0 +1,54 @@
+'''
+Time a frequency sweep on the simulated Teensy (or a real one with a port
+argument) two ways: reopening the port after a fixed pause after each run,
+as a script without Sweep would, and with Sweep, which reopens the port as
+soon as the board is back and processes each run while the next one is
+measured. Prints the cycle time per point of each.
+
+    python benchmarks/bench_sweep.py [port] [num_points] [pause]
+'''
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from teensy_lockin.client import LockInClient
+from teensy_lockin.instruction import RAW
+from teensy_lockin.sweep import Sweep, internal_sweep
+
+FREQS = [100, 200, 500, 1000, 2000, 5000]
+
+
+def process(result):
+    '''Stand-in for the work done on each point, e.g. fitting and saving'''
+    time.sleep(0.2)
+    return result.summary()
+
+
+def main():
+    port = sys.argv[1] if len(sys.argv) > 1 else 'teensysim://?seed=0'
+    num_points = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    pause = float(sys.argv[3]) if len(sys.argv) > 3 else 1.0
+    points = internal_sweep(FREQS, num_points=num_points, mode=RAW, cutoff=20)
+    quiet = lambda *args: None
+
+    client = LockInClient(port, log=quiet)
+    start = time.perf_counter()
+    for settings in points:
+        process(client.run(settings))
+        time.sleep(pause) # wait for the board to reset
+    fixed = (time.perf_counter() - start) / len(points)
+
+    time.sleep(pause)
+    result = Sweep(port, log=quiet).run(points, process=process)
+    reopen = [r.timings.phases["open"] for r in result.results if r is not None]
+    print('%d points of %d samples' % (len(points), num_points))
+    print('fixed %.1f s pause, processing in line  %6.3f s per point' % (pause, fixed))
+    print('Sweep                                 %6.3f s per point' % result.mean_cycle_time())
+    print('  (reopening the port: %.3f s on average)' % (sum(reopen) / len(reopen)))
+
+
+if __name__ == '__main__':
+    main()
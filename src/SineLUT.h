@@ -1,6 +1,11 @@
-#define LUT_SIZE 300
+// Generated by src/calculate_sine_table.py; do not edit.
+// One period of a sine for the 12-bit DAC, in tables of
+// several sizes (see teensy_lockin/reference.py).
 
-static volatile uint16_t waveTable[LUT_SIZE] = {
+#define NUM_LUTS 39
+#define LUT_SIZE 300 // the table used unless the instruction names another
+
+static volatile uint16_t waveTable300[300] = {
 2048,2091,2134,2177,2219,2262,2305,2347,2389,2432,
 2474,2515,2557,2598,2640,2681,2721,2762,2802,2841,
 2881,2920,2958,2996,3034,3072,3108,3145,3181,3216,
@@ -30,5 +35,626 @@ static volatile uint16_t waveTable[LUT_SIZE] = {
 527,556,585,616,647,678,710,743,777,810,
 845,880,915,951,988,1024,1062,1100,1138,1176,
 1215,1255,1294,1334,1375,1415,1456,1498,1539,1581,
-1622,1664,1707,1749,1791,1834,1877,1919,1962,2005
+1622,1664,1707,1749,1791,1834,1877,1919,1962,2005,
+};
+
+static volatile uint16_t waveTable288[288] = {
+2048,2093,2137,2182,2226,2271,2315,2359,2403,2447,
+2491,2535,2578,2621,2664,2706,2748,2790,2831,2872,
+2913,2953,2993,3033,3072,3110,3148,3185,3222,3258,
+3294,3329,3364,3398,3431,3464,3495,3527,3557,3587,
+3616,3644,3672,3699,3725,3750,3774,3798,3821,3843,
+3864,3884,3903,3922,3939,3956,3972,3986,4000,4013,
+4025,4036,4046,4056,4064,4071,4077,4083,4087,4091,
+4093,4095,4095,4095,4093,4091,4087,4083,4077,4071,
+4064,4056,4046,4036,4025,4013,4000,3986,3972,3956,
+3939,3922,3903,3884,3864,3843,3821,3798,3774,3750,
+3725,3699,3672,3644,3616,3587,3557,3527,3495,3464,
+3431,3398,3364,3329,3294,3258,3222,3185,3148,3110,
+3072,3033,2993,2953,2913,2872,2831,2790,2748,2706,
+2664,2621,2578,2535,2491,2447,2403,2359,2315,2271,
+2226,2182,2137,2093,2048,2003,1959,1914,1870,1825,
+1781,1737,1693,1649,1605,1561,1518,1475,1432,1390,
+1348,1306,1265,1224,1183,1143,1103,1063,1024,986,
+948,911,874,838,802,767,732,698,665,632,
+601,569,539,509,480,452,424,397,371,346,
+322,298,275,253,232,212,193,174,157,140,
+124,110,96,83,71,60,50,40,32,25,
+19,13,9,5,3,1,1,1,3,5,
+9,13,19,25,32,40,50,60,71,83,
+96,110,124,140,157,174,193,212,232,253,
+275,298,322,346,371,397,424,452,480,509,
+539,569,601,632,665,698,732,767,802,838,
+874,911,948,986,1024,1063,1103,1143,1183,1224,
+1265,1306,1348,1390,1432,1475,1518,1561,1605,1649,
+1693,1737,1781,1825,1870,1914,1959,2003,
+};
+
+static volatile uint16_t waveTable275[275] = {
+2048,2095,2142,2188,2235,2281,2328,2374,2420,2466,
+2512,2557,2602,2647,2692,2736,2780,2823,2866,2909,
+2951,2993,3034,3075,3115,3155,3194,3232,3270,3307,
+3344,3380,3415,3449,3483,3516,3548,3580,3610,3640,
+3669,3697,3724,3751,3776,3801,3825,3847,3869,3890,
+3910,3929,3947,3964,3980,3995,4009,4022,4034,4044,
+4054,4063,4071,4077,4083,4087,4091,4093,4095,4095,
+4094,4092,4089,4085,4080,4074,4067,4059,4049,4039,
+4028,4015,4002,3987,3972,3956,3938,3920,3900,3880,
+3858,3836,3813,3789,3764,3738,3711,3683,3655,3625,
+3595,3564,3532,3500,3466,3432,3397,3362,3326,3289,
+3251,3213,3174,3135,3095,3055,3014,2972,2930,2888,
+2845,2802,2758,2714,2669,2625,2580,2534,2489,2443,
+2397,2351,2305,2258,2212,2165,2118,2071,2025,1978,
+1931,1884,1838,1791,1745,1699,1653,1607,1562,1516,
+1471,1427,1382,1338,1294,1251,1208,1166,1124,1082,
+1041,1001,961,922,883,845,807,770,734,699,
+664,630,596,564,532,501,471,441,413,385,
+358,332,307,283,260,238,216,196,176,158,
+140,124,109,94,81,68,57,47,37,29,
+22,16,11,7,4,2,1,1,3,5,
+9,13,19,25,33,42,52,62,74,87,
+101,116,132,149,167,186,206,227,249,271,
+295,320,345,372,399,427,456,486,516,548,
+580,613,647,681,716,752,789,826,864,902,
+941,981,1021,1062,1103,1145,1187,1230,1273,1316,
+1360,1404,1449,1494,1539,1584,1630,1676,1722,1768,
+1815,1861,1908,1954,2001,
+};
+
+static volatile uint16_t waveTable256[256] = {
+2048,2098,2148,2199,2249,2299,2348,2398,2447,2497,
+2545,2594,2642,2690,2738,2785,2831,2878,2923,2968,
+3013,3057,3100,3143,3185,3227,3267,3307,3347,3385,
+3423,3459,3495,3531,3565,3598,3630,3662,3692,3722,
+3750,3777,3804,3829,3853,3876,3898,3919,3939,3958,
+3975,3992,4007,4021,4034,4045,4056,4065,4073,4080,
+4085,4089,4093,4094,4095,4094,4093,4089,4085,4080,
+4073,4065,4056,4045,4034,4021,4007,3992,3975,3958,
+3939,3919,3898,3876,3853,3829,3804,3777,3750,3722,
+3692,3662,3630,3598,3565,3531,3495,3459,3423,3385,
+3347,3307,3267,3227,3185,3143,3100,3057,3013,2968,
+2923,2878,2831,2785,2738,2690,2642,2594,2545,2497,
+2447,2398,2348,2299,2249,2199,2148,2098,2048,1998,
+1948,1897,1847,1797,1748,1698,1649,1599,1551,1502,
+1454,1406,1358,1311,1265,1218,1173,1128,1083,1039,
+996,953,911,869,829,789,749,711,673,637,
+601,565,531,498,466,434,404,374,346,319,
+292,267,243,220,198,177,157,138,121,104,
+89,75,62,51,40,31,23,16,11,7,
+3,2,1,2,3,7,11,16,23,31,
+40,51,62,75,89,104,121,138,157,177,
+198,220,243,267,292,319,346,374,404,434,
+466,498,531,565,601,637,673,711,749,789,
+829,869,911,953,996,1039,1083,1128,1173,1218,
+1265,1311,1358,1406,1454,1502,1551,1599,1649,1698,
+1748,1797,1847,1897,1948,1998,
+};
+
+static volatile uint16_t waveTable250[250] = {
+2048,2099,2151,2202,2253,2305,2356,2406,2457,2507,
+2557,2607,2656,2705,2753,2802,2849,2896,2943,2989,
+3034,3079,3123,3166,3209,3251,3292,3333,3373,3411,
+3449,3486,3522,3558,3592,3625,3658,3689,3719,3748,
+3776,3803,3829,3854,3878,3900,3921,3942,3961,3978,
+3995,4010,4024,4037,4048,4059,4068,4075,4082,4087,
+4091,4094,4095,4095,4094,4091,4087,4082,4075,4068,
+4059,4048,4037,4024,4010,3995,3978,3961,3942,3921,
+3900,3878,3854,3829,3803,3776,3748,3719,3689,3658,
+3625,3592,3558,3522,3486,3449,3411,3373,3333,3292,
+3251,3209,3166,3123,3079,3034,2989,2943,2896,2849,
+2802,2753,2705,2656,2607,2557,2507,2457,2406,2356,
+2305,2253,2202,2151,2099,2048,1997,1945,1894,1843,
+1791,1740,1690,1639,1589,1539,1489,1440,1391,1343,
+1294,1247,1200,1153,1107,1062,1017,973,930,887,
+845,804,763,723,685,647,610,574,538,504,
+471,438,407,377,348,320,293,267,242,218,
+196,175,154,135,118,101,86,72,59,48,
+37,28,21,14,9,5,2,1,1,2,
+5,9,14,21,28,37,48,59,72,86,
+101,118,135,154,175,196,218,242,267,293,
+320,348,377,407,438,471,504,538,574,610,
+647,685,723,763,804,845,887,930,973,1017,
+1062,1107,1153,1200,1247,1294,1343,1391,1440,1489,
+1539,1589,1639,1690,1740,1791,1843,1894,1945,1997,
+};
+
+static volatile uint16_t waveTable240[240] = {
+2048,2102,2155,2209,2262,2315,2368,2421,2474,2526,
+2578,2629,2681,2731,2782,2831,2881,2929,2977,3025,
+3072,3118,3163,3207,3251,3294,3336,3377,3418,3457,
+3495,3533,3569,3605,3639,3672,3704,3735,3765,3793,
+3821,3847,3872,3896,3918,3939,3959,3978,3995,4011,
+4025,4038,4050,4061,4070,4077,4084,4089,4092,4094,
+4095,4094,4092,4089,4084,4077,4070,4061,4050,4038,
+4025,4011,3995,3978,3959,3939,3918,3896,3872,3847,
+3821,3793,3765,3735,3704,3672,3639,3605,3569,3533,
+3495,3457,3418,3377,3336,3294,3251,3207,3163,3118,
+3072,3025,2977,2929,2881,2831,2782,2731,2681,2629,
+2578,2526,2474,2421,2368,2315,2262,2209,2155,2102,
+2048,1994,1941,1887,1834,1781,1728,1675,1622,1570,
+1518,1467,1415,1365,1314,1265,1215,1167,1119,1071,
+1024,978,933,889,845,802,760,719,678,639,
+601,563,527,491,457,424,392,361,331,303,
+275,249,224,200,178,157,137,118,101,85,
+71,58,46,35,26,19,12,7,4,2,
+1,2,4,7,12,19,26,35,46,58,
+71,85,101,118,137,157,178,200,224,249,
+275,303,331,361,392,424,457,491,527,563,
+601,639,678,719,760,802,845,889,933,978,
+1024,1071,1119,1167,1215,1265,1314,1365,1415,1467,
+1518,1570,1622,1675,1728,1781,1834,1887,1941,1994,
+};
+
+static volatile uint16_t waveTable225[225] = {
+2048,2105,2162,2219,2276,2333,2389,2446,2502,2557,
+2612,2667,2721,2775,2828,2881,2932,2984,3034,3084,
+3133,3181,3228,3274,3319,3364,3407,3449,3490,3530,
+3569,3607,3643,3678,3712,3745,3776,3806,3835,3862,
+3888,3912,3935,3956,3976,3995,4012,4027,4041,4053,
+4064,4073,4081,4087,4091,4094,4095,4095,4093,4089,
+4084,4077,4069,4059,4047,4034,4020,4003,3986,3967,
+3946,3924,3900,3875,3849,3821,3791,3761,3729,3696,
+3661,3625,3588,3550,3511,3470,3428,3386,3342,3297,
+3251,3204,3157,3108,3059,3009,2958,2907,2854,2802,
+2748,2694,2640,2585,2529,2474,2418,2361,2305,2248,
+2191,2134,2077,2019,1962,1905,1848,1791,1735,1678,
+1622,1567,1511,1456,1402,1348,1294,1242,1189,1138,
+1087,1037,988,939,892,845,799,754,710,668,
+626,585,546,508,471,435,400,367,335,305,
+275,247,221,196,172,150,129,110,93,76,
+62,49,37,27,19,12,7,3,1,1,
+2,5,9,15,23,32,43,55,69,84,
+101,120,140,161,184,208,234,261,290,320,
+351,384,418,453,489,527,566,606,647,689,
+732,777,822,868,915,963,1012,1062,1112,1164,
+1215,1268,1321,1375,1429,1484,1539,1594,1650,1707,
+1763,1820,1877,1934,1991,
+};
+
+static volatile uint16_t waveTable216[216] = {
+2048,2108,2167,2226,2286,2345,2403,2462,2520,2578,
+2635,2692,2748,2804,2859,2913,2967,3020,3072,3123,
+3173,3222,3270,3318,3364,3409,3453,3495,3537,3577,
+3616,3654,3690,3725,3758,3790,3821,3850,3877,3903,
+3928,3950,3972,3991,4009,4025,4040,4053,4064,4073,
+4081,4087,4092,4094,4095,4094,4092,4087,4081,4073,
+4064,4053,4040,4025,4009,3991,3972,3950,3928,3903,
+3877,3850,3821,3790,3758,3725,3690,3654,3616,3577,
+3537,3495,3453,3409,3364,3318,3270,3222,3173,3123,
+3072,3020,2967,2913,2859,2804,2748,2692,2635,2578,
+2520,2462,2403,2345,2286,2226,2167,2108,2048,1988,
+1929,1870,1810,1751,1693,1634,1576,1518,1461,1404,
+1348,1292,1237,1183,1129,1076,1024,973,923,874,
+826,778,732,687,643,601,559,519,480,442,
+406,371,338,306,275,246,219,193,168,146,
+124,105,87,71,56,43,32,23,15,9,
+4,2,1,2,4,9,15,23,32,43,
+56,71,87,105,124,146,168,193,219,246,
+275,306,338,371,406,442,480,519,559,601,
+643,687,732,778,826,874,923,973,1024,1076,
+1129,1183,1237,1292,1348,1404,1461,1518,1576,1634,
+1693,1751,1810,1870,1929,1988,
+};
+
+static volatile uint16_t waveTable200[200] = {
+2048,2112,2177,2241,2305,2368,2432,2495,2557,2619,
+2681,2741,2802,2861,2920,2977,3034,3090,3145,3199,
+3251,3303,3353,3402,3449,3495,3540,3583,3625,3665,
+3704,3741,3776,3810,3842,3872,3900,3927,3951,3974,
+3995,4014,4031,4046,4059,4070,4079,4086,4091,4094,
+4095,4094,4091,4086,4079,4070,4059,4046,4031,4014,
+3995,3974,3951,3927,3900,3872,3842,3810,3776,3741,
+3704,3665,3625,3583,3540,3495,3449,3402,3353,3303,
+3251,3199,3145,3090,3034,2977,2920,2861,2802,2741,
+2681,2619,2557,2495,2432,2368,2305,2241,2177,2112,
+2048,1984,1919,1855,1791,1728,1664,1601,1539,1477,
+1415,1355,1294,1235,1176,1119,1062,1006,951,897,
+845,793,743,694,647,601,556,513,471,431,
+392,355,320,286,254,224,196,169,145,122,
+101,82,65,50,37,26,17,10,5,2,
+1,2,5,10,17,26,37,50,65,82,
+101,122,145,169,196,224,254,286,320,355,
+392,431,471,513,556,601,647,694,743,793,
+845,897,951,1006,1062,1119,1176,1235,1294,1355,
+1415,1477,1539,1601,1664,1728,1791,1855,1919,1984,
+};
+
+static volatile uint16_t waveTable192[192] = {
+2048,2115,2182,2249,2315,2381,2447,2513,2578,2642,
+2706,2769,2831,2893,2953,3013,3072,3129,3185,3240,
+3294,3347,3398,3447,3495,3542,3587,3630,3672,3712,
+3750,3786,3821,3853,3884,3913,3939,3964,3986,4007,
+4025,4042,4056,4068,4077,4085,4091,4094,4095,4094,
+4091,4085,4077,4068,4056,4042,4025,4007,3986,3964,
+3939,3913,3884,3853,3821,3786,3750,3712,3672,3630,
+3587,3542,3495,3447,3398,3347,3294,3240,3185,3129,
+3072,3013,2953,2893,2831,2769,2706,2642,2578,2513,
+2447,2381,2315,2249,2182,2115,2048,1981,1914,1847,
+1781,1715,1649,1583,1518,1454,1390,1327,1265,1203,
+1143,1083,1024,967,911,856,802,749,698,649,
+601,554,509,466,424,384,346,310,275,243,
+212,183,157,132,110,89,71,54,40,28,
+19,11,5,2,1,2,5,11,19,28,
+40,54,71,89,110,132,157,183,212,243,
+275,310,346,384,424,466,509,554,601,649,
+698,749,802,856,911,967,1024,1083,1143,1203,
+1265,1327,1390,1454,1518,1583,1649,1715,1781,1847,
+1914,1981,
+};
+
+static volatile uint16_t waveTable180[180] = {
+2048,2119,2191,2262,2333,2403,2474,2543,2612,2681,
+2748,2815,2881,2945,3009,3072,3133,3193,3251,3308,
+3364,3418,3470,3520,3569,3616,3661,3704,3745,3784,
+3821,3855,3888,3918,3946,3972,3995,4016,4034,4050,
+4064,4075,4084,4090,4094,4095,4094,4090,4084,4075,
+4064,4050,4034,4016,3995,3972,3946,3918,3888,3855,
+3821,3784,3745,3704,3661,3616,3569,3520,3470,3418,
+3364,3308,3251,3193,3133,3072,3009,2945,2881,2815,
+2748,2681,2612,2543,2474,2403,2333,2262,2191,2119,
+2048,1977,1905,1834,1763,1693,1622,1553,1484,1415,
+1348,1281,1215,1151,1087,1024,963,903,845,788,
+732,678,626,576,527,480,435,392,351,312,
+275,241,208,178,150,124,101,80,62,46,
+32,21,12,6,2,1,2,6,12,21,
+32,46,62,80,101,124,150,178,208,241,
+275,312,351,392,435,480,527,576,626,678,
+732,788,845,903,963,1024,1087,1151,1215,1281,
+1348,1415,1484,1553,1622,1693,1763,1834,1905,1977,
+};
+
+static volatile uint16_t waveTable175[175] = {
+2048,2121,2195,2268,2341,2414,2486,2557,2628,2698,
+2767,2836,2903,2969,3034,3098,3160,3221,3281,3339,
+3395,3449,3502,3553,3602,3648,3693,3736,3776,3815,
+3851,3884,3916,3944,3971,3995,4016,4035,4052,4065,
+4076,4085,4091,4094,4095,4093,4088,4081,4071,4059,
+4044,4026,4006,3983,3958,3930,3900,3868,3833,3796,
+3756,3715,3671,3625,3577,3528,3476,3422,3367,3310,
+3251,3191,3129,3066,3002,2936,2869,2802,2733,2663,
+2593,2521,2450,2377,2305,2231,2158,2085,2011,1938,
+1865,1791,1719,1646,1575,1503,1433,1363,1294,1227,
+1160,1094,1030,967,905,845,786,729,674,620,
+568,519,471,425,381,340,300,263,228,196,
+166,138,113,90,70,52,37,25,15,8,
+3,1,2,5,11,20,31,44,61,80,
+101,125,152,180,212,245,281,320,360,403,
+448,494,543,594,647,701,757,815,875,936,
+998,1062,1127,1193,1260,1329,1398,1468,1539,1610,
+1682,1755,1828,1901,1975,
+};
+
+static volatile uint16_t waveTable162[162] = {
+2048,2127,2207,2286,2364,2442,2520,2597,2673,2748,
+2822,2895,2967,3037,3106,3173,3238,3302,3364,3424,
+3481,3537,3590,3641,3690,3736,3780,3821,3859,3895,
+3928,3958,3985,4009,4030,4049,4064,4076,4085,4092,
+4095,4095,4092,4085,4076,4064,4049,4030,4009,3985,
+3958,3928,3895,3859,3821,3780,3736,3690,3641,3590,
+3537,3481,3424,3364,3302,3238,3173,3106,3037,2967,
+2895,2822,2748,2673,2597,2520,2442,2364,2286,2207,
+2127,2048,1969,1889,1810,1732,1654,1576,1499,1423,
+1348,1274,1201,1129,1059,990,923,858,794,732,
+672,615,559,506,455,406,360,316,275,237,
+201,168,138,111,87,66,47,32,20,11,
+4,1,1,4,11,20,32,47,66,87,
+111,138,168,201,237,275,316,360,406,455,
+506,559,615,672,732,794,858,923,990,1059,
+1129,1201,1274,1348,1423,1499,1576,1654,1732,1810,
+1889,1969,
+};
+
+static volatile uint16_t waveTable160[160] = {
+2048,2128,2209,2289,2368,2447,2526,2604,2681,2757,
+2831,2905,2977,3048,3118,3185,3251,3315,3377,3438,
+3495,3551,3605,3656,3704,3750,3793,3834,3872,3907,
+3939,3968,3995,4018,4038,4056,4070,4081,4089,4093,
+4095,4093,4089,4081,4070,4056,4038,4018,3995,3968,
+3939,3907,3872,3834,3793,3750,3704,3656,3605,3551,
+3495,3438,3377,3315,3251,3185,3118,3048,2977,2905,
+2831,2757,2681,2604,2526,2447,2368,2289,2209,2128,
+2048,1968,1887,1807,1728,1649,1570,1492,1415,1339,
+1265,1191,1119,1048,978,911,845,781,719,658,
+601,545,491,440,392,346,303,262,224,189,
+157,128,101,78,58,40,26,15,7,3,
+1,3,7,15,26,40,58,78,101,128,
+157,189,224,262,303,346,392,440,491,545,
+601,658,719,781,845,911,978,1048,1119,1191,
+1265,1339,1415,1492,1570,1649,1728,1807,1887,1968,
+};
+
+static volatile uint16_t waveTable150[150] = {
+2048,2134,2219,2305,2389,2474,2557,2640,2721,2802,
+2881,2958,3034,3108,3181,3251,3319,3386,3449,3511,
+3569,3625,3678,3729,3776,3821,3862,3900,3935,3967,
+3995,4020,4041,4059,4073,4084,4091,4095,4095,4091,
+4084,4073,4059,4041,4020,3995,3967,3935,3900,3862,
+3821,3776,3729,3678,3625,3569,3511,3449,3386,3319,
+3251,3181,3108,3034,2958,2881,2802,2721,2640,2557,
+2474,2389,2305,2219,2134,2048,1962,1877,1791,1707,
+1622,1539,1456,1375,1294,1215,1138,1062,988,915,
+845,777,710,647,585,527,471,418,367,320,
+275,234,196,161,129,101,76,55,37,23,
+12,5,1,1,5,12,23,37,55,76,
+101,129,161,196,234,275,320,367,418,471,
+527,585,647,710,777,845,915,988,1062,1138,
+1215,1294,1375,1456,1539,1622,1707,1791,1877,1962,
+};
+
+static volatile uint16_t waveTable144[144] = {
+2048,2137,2226,2315,2403,2491,2578,2664,2748,2831,
+2913,2993,3072,3148,3222,3294,3364,3431,3495,3557,
+3616,3672,3725,3774,3821,3864,3903,3939,3972,4000,
+4025,4046,4064,4077,4087,4093,4095,4093,4087,4077,
+4064,4046,4025,4000,3972,3939,3903,3864,3821,3774,
+3725,3672,3616,3557,3495,3431,3364,3294,3222,3148,
+3072,2993,2913,2831,2748,2664,2578,2491,2403,2315,
+2226,2137,2048,1959,1870,1781,1693,1605,1518,1432,
+1348,1265,1183,1103,1024,948,874,802,732,665,
+601,539,480,424,371,322,275,232,193,157,
+124,96,71,50,32,19,9,3,1,3,
+9,19,32,50,71,96,124,157,193,232,
+275,322,371,424,480,539,601,665,732,802,
+874,948,1024,1103,1183,1265,1348,1432,1518,1605,
+1693,1781,1870,1959,
+};
+
+static volatile uint16_t waveTable135[135] = {
+2048,2143,2238,2333,2427,2520,2612,2703,2793,2881,
+2967,3051,3133,3212,3289,3364,3435,3504,3569,3631,
+3690,3745,3796,3844,3888,3928,3963,3995,4022,4045,
+4064,4078,4088,4094,4095,4092,4084,4072,4055,4034,
+4009,3980,3946,3908,3866,3821,3771,3718,3661,3601,
+3537,3470,3400,3327,3251,3173,3092,3009,2924,2837,
+2748,2658,2566,2474,2380,2286,2191,2096,2000,1905,
+1810,1716,1622,1530,1438,1348,1259,1172,1087,1004,
+923,845,769,696,626,559,495,435,378,325,
+275,230,188,150,116,87,62,41,24,12,
+4,1,2,8,18,32,51,74,101,133,
+168,208,252,300,351,406,465,527,592,661,
+732,807,884,963,1045,1129,1215,1303,1393,1484,
+1576,1669,1763,1858,1953,
+};
+
+static volatile uint16_t waveTable128[128] = {
+2048,2148,2249,2348,2447,2545,2642,2738,2831,2923,
+3013,3100,3185,3267,3347,3423,3495,3565,3630,3692,
+3750,3804,3853,3898,3939,3975,4007,4034,4056,4073,
+4085,4093,4095,4093,4085,4073,4056,4034,4007,3975,
+3939,3898,3853,3804,3750,3692,3630,3565,3495,3423,
+3347,3267,3185,3100,3013,2923,2831,2738,2642,2545,
+2447,2348,2249,2148,2048,1948,1847,1748,1649,1551,
+1454,1358,1265,1173,1083,996,911,829,749,673,
+601,531,466,404,346,292,243,198,157,121,
+89,62,40,23,11,3,1,3,11,23,
+40,62,89,121,157,198,243,292,346,404,
+466,531,601,673,749,829,911,996,1083,1173,
+1265,1358,1454,1551,1649,1748,1847,1948,
+};
+
+static volatile uint16_t waveTable125[125] = {
+2048,2151,2253,2356,2457,2557,2656,2753,2849,2943,
+3034,3123,3209,3292,3373,3449,3522,3592,3658,3719,
+3776,3829,3878,3921,3961,3995,4024,4048,4068,4082,
+4091,4095,4094,4087,4075,4059,4037,4010,3978,3942,
+3900,3854,3803,3748,3689,3625,3558,3486,3411,3333,
+3251,3166,3079,2989,2896,2802,2705,2607,2507,2406,
+2305,2202,2099,1997,1894,1791,1690,1589,1489,1391,
+1294,1200,1107,1017,930,845,763,685,610,538,
+471,407,348,293,242,196,154,118,86,59,
+37,21,9,2,1,5,14,28,48,72,
+101,135,175,218,267,320,377,438,504,574,
+647,723,804,887,973,1062,1153,1247,1343,1440,
+1539,1639,1740,1843,1945,
+};
+
+static volatile uint16_t waveTable120[120] = {
+2048,2155,2262,2368,2474,2578,2681,2782,2881,2977,
+3072,3163,3251,3336,3418,3495,3569,3639,3704,3765,
+3821,3872,3918,3959,3995,4025,4050,4070,4084,4092,
+4095,4092,4084,4070,4050,4025,3995,3959,3918,3872,
+3821,3765,3704,3639,3569,3495,3418,3336,3251,3163,
+3072,2977,2881,2782,2681,2578,2474,2368,2262,2155,
+2048,1941,1834,1728,1622,1518,1415,1314,1215,1119,
+1024,933,845,760,678,601,527,457,392,331,
+275,224,178,137,101,71,46,26,12,4,
+1,4,12,26,46,71,101,137,178,224,
+275,331,392,457,527,601,678,760,845,933,
+1024,1119,1215,1314,1415,1518,1622,1728,1834,1941,
 };
+
+static volatile uint16_t waveTable112[112] = {
+2048,2163,2277,2391,2504,2615,2724,2831,2936,3038,
+3137,3233,3324,3412,3495,3574,3648,3717,3781,3840,
+3892,3939,3980,4015,4044,4066,4082,4092,4095,4092,
+4082,4066,4044,4015,3980,3939,3892,3840,3781,3717,
+3648,3574,3495,3412,3324,3233,3137,3038,2936,2831,
+2724,2615,2504,2391,2277,2163,2048,1933,1819,1705,
+1592,1481,1372,1265,1160,1058,959,863,772,684,
+601,522,448,379,315,256,204,157,116,81,
+52,30,14,4,1,4,14,30,52,81,
+116,157,204,256,315,379,448,522,601,684,
+772,863,959,1058,1160,1265,1372,1481,1592,1705,
+1819,1933,
+};
+
+static volatile uint16_t waveTable108[108] = {
+2048,2167,2286,2403,2520,2635,2748,2859,2967,3072,
+3173,3270,3364,3453,3537,3616,3690,3758,3821,3877,
+3928,3972,4009,4040,4064,4081,4092,4095,4092,4081,
+4064,4040,4009,3972,3928,3877,3821,3758,3690,3616,
+3537,3453,3364,3270,3173,3072,2967,2859,2748,2635,
+2520,2403,2286,2167,2048,1929,1810,1693,1576,1461,
+1348,1237,1129,1024,923,826,732,643,559,480,
+406,338,275,219,168,124,87,56,32,15,
+4,1,4,15,32,56,87,124,168,219,
+275,338,406,480,559,643,732,826,923,1024,
+1129,1237,1348,1461,1576,1693,1810,1929,
+};
+
+static volatile uint16_t waveTable100[100] = {
+2048,2177,2305,2432,2557,2681,2802,2920,3034,3145,
+3251,3353,3449,3540,3625,3704,3776,3842,3900,3951,
+3995,4031,4059,4079,4091,4095,4091,4079,4059,4031,
+3995,3951,3900,3842,3776,3704,3625,3540,3449,3353,
+3251,3145,3034,2920,2802,2681,2557,2432,2305,2177,
+2048,1919,1791,1664,1539,1415,1294,1176,1062,951,
+845,743,647,556,471,392,320,254,196,145,
+101,65,37,17,5,1,5,17,37,65,
+101,145,196,254,320,392,471,556,647,743,
+845,951,1062,1176,1294,1415,1539,1664,1791,1919,
+};
+
+static volatile uint16_t waveTable96[96] = {
+2048,2182,2315,2447,2578,2706,2831,2953,3072,3185,
+3294,3398,3495,3587,3672,3750,3821,3884,3939,3986,
+4025,4056,4077,4091,4095,4091,4077,4056,4025,3986,
+3939,3884,3821,3750,3672,3587,3495,3398,3294,3185,
+3072,2953,2831,2706,2578,2447,2315,2182,2048,1914,
+1781,1649,1518,1390,1265,1143,1024,911,802,698,
+601,509,424,346,275,212,157,110,71,40,
+19,5,1,5,19,40,71,110,157,212,
+275,346,424,509,601,698,802,911,1024,1143,
+1265,1390,1518,1649,1781,1914,
+};
+
+static volatile uint16_t waveTable90[90] = {
+2048,2191,2333,2474,2612,2748,2881,3009,3133,3251,
+3364,3470,3569,3661,3745,3821,3888,3946,3995,4034,
+4064,4084,4094,4094,4084,4064,4034,3995,3946,3888,
+3821,3745,3661,3569,3470,3364,3251,3133,3009,2881,
+2748,2612,2474,2333,2191,2048,1905,1763,1622,1484,
+1348,1215,1087,963,845,732,626,527,435,351,
+275,208,150,101,62,32,12,2,2,12,
+32,62,101,150,208,275,351,435,527,626,
+732,845,963,1087,1215,1348,1484,1622,1763,1905,
+};
+
+static volatile uint16_t waveTable84[84] = {
+2048,2201,2353,2504,2651,2796,2936,3072,3201,3324,
+3440,3549,3648,3739,3821,3892,3953,4004,4044,4072,
+4089,4095,4089,4072,4044,4004,3953,3892,3821,3739,
+3648,3549,3440,3324,3201,3072,2936,2796,2651,2504,
+2353,2201,2048,1895,1743,1592,1445,1300,1160,1024,
+895,772,656,547,448,357,275,204,143,92,
+52,24,7,1,7,24,52,92,143,204,
+275,357,448,547,656,772,895,1024,1160,1300,
+1445,1592,1743,1895,
+};
+
+static volatile uint16_t waveTable80[80] = {
+2048,2209,2368,2526,2681,2831,2977,3118,3251,3377,
+3495,3605,3704,3793,3872,3939,3995,4038,4070,4089,
+4095,4089,4070,4038,3995,3939,3872,3793,3704,3605,
+3495,3377,3251,3118,2977,2831,2681,2526,2368,2209,
+2048,1887,1728,1570,1415,1265,1119,978,845,719,
+601,491,392,303,224,157,101,58,26,7,
+1,7,26,58,101,157,224,303,392,491,
+601,719,845,978,1119,1265,1415,1570,1728,1887,
+};
+
+static volatile uint16_t waveTable75[75] = {
+2048,2219,2389,2557,2721,2881,3034,3181,3319,3449,
+3569,3678,3776,3862,3935,3995,4041,4073,4091,4095,
+4084,4059,4020,3967,3900,3821,3729,3625,3511,3386,
+3251,3108,2958,2802,2640,2474,2305,2134,1962,1791,
+1622,1456,1294,1138,988,845,710,585,471,367,
+275,196,129,76,37,12,1,5,23,55,
+101,161,234,320,418,527,647,777,915,1062,
+1215,1375,1539,1707,1877,
+};
+
+static volatile uint16_t waveTable72[72] = {
+2048,2226,2403,2578,2748,2913,3072,3222,3364,3495,
+3616,3725,3821,3903,3972,4025,4064,4087,4095,4087,
+4064,4025,3972,3903,3821,3725,3616,3495,3364,3222,
+3072,2913,2748,2578,2403,2226,2048,1870,1693,1518,
+1348,1183,1024,874,732,601,480,371,275,193,
+124,71,32,9,1,9,32,71,124,193,
+275,371,480,601,732,874,1024,1183,1348,1518,
+1693,1870,
+};
+
+static volatile uint16_t waveTable64[64] = {
+2048,2249,2447,2642,2831,3013,3185,3347,3495,3630,
+3750,3853,3939,4007,4056,4085,4095,4085,4056,4007,
+3939,3853,3750,3630,3495,3347,3185,3013,2831,2642,
+2447,2249,2048,1847,1649,1454,1265,1083,911,749,
+601,466,346,243,157,89,40,11,1,11,
+40,89,157,243,346,466,601,749,911,1083,
+1265,1454,1649,1847,
+};
+
+static volatile uint16_t waveTable60[60] = {
+2048,2262,2474,2681,2881,3072,3251,3418,3569,3704,
+3821,3918,3995,4050,4084,4095,4084,4050,3995,3918,
+3821,3704,3569,3418,3251,3072,2881,2681,2474,2262,
+2048,1834,1622,1415,1215,1024,845,678,527,392,
+275,178,101,46,12,1,12,46,101,178,
+275,392,527,678,845,1024,1215,1415,1622,1834,
+};
+
+static volatile uint16_t waveTable56[56] = {
+2048,2277,2504,2724,2936,3137,3324,3495,3648,3781,
+3892,3980,4044,4082,4095,4082,4044,3980,3892,3781,
+3648,3495,3324,3137,2936,2724,2504,2277,2048,1819,
+1592,1372,1160,959,772,601,448,315,204,116,
+52,14,1,14,52,116,204,315,448,601,
+772,959,1160,1372,1592,1819,
+};
+
+static volatile uint16_t waveTable50[50] = {
+2048,2305,2557,2802,3034,3251,3449,3625,3776,3900,
+3995,4059,4091,4091,4059,3995,3900,3776,3625,3449,
+3251,3034,2802,2557,2305,2048,1791,1539,1294,1062,
+845,647,471,320,196,101,37,5,5,37,
+101,196,320,471,647,845,1062,1294,1539,1791,
+};
+
+static volatile uint16_t waveTable48[48] = {
+2048,2315,2578,2831,3072,3294,3495,3672,3821,3939,
+4025,4077,4095,4077,4025,3939,3821,3672,3495,3294,
+3072,2831,2578,2315,2048,1781,1518,1265,1024,802,
+601,424,275,157,71,19,1,19,71,157,
+275,424,601,802,1024,1265,1518,1781,
+};
+
+static volatile uint16_t waveTable45[45] = {
+2048,2333,2612,2881,3133,3364,3569,3745,3888,3995,
+4064,4094,4084,4034,3946,3821,3661,3470,3251,3009,
+2748,2474,2191,1905,1622,1348,1087,845,626,435,
+275,150,62,12,2,32,101,208,351,527,
+732,963,1215,1484,1763,
+};
+
+static volatile uint16_t waveTable42[42] = {
+2048,2353,2651,2936,3201,3440,3648,3821,3953,4044,
+4089,4089,4044,3953,3821,3648,3440,3201,2936,2651,
+2353,2048,1743,1445,1160,895,656,448,275,143,
+52,7,7,52,143,275,448,656,895,1160,
+1445,1743,
+};
+
+static volatile uint16_t waveTable40[40] = {
+2048,2368,2681,2977,3251,3495,3704,3872,3995,4070,
+4095,4070,3995,3872,3704,3495,3251,2977,2681,2368,
+2048,1728,1415,1119,845,601,392,224,101,26,
+1,26,101,224,392,601,845,1119,1415,1728,
+};
+
+static volatile uint16_t waveTable36[36] = {
+2048,2403,2748,3072,3364,3616,3821,3972,4064,4095,
+4064,3972,3821,3616,3364,3072,2748,2403,2048,1693,
+1348,1024,732,480,275,124,32,1,32,124,
+275,480,732,1024,1348,1693,
+};
+
+static volatile uint16_t waveTable32[32] = {
+2048,2447,2831,3185,3495,3750,3939,4056,4095,4056,
+3939,3750,3495,3185,2831,2447,2048,1649,1265,911,
+601,346,157,40,1,40,157,346,601,911,
+1265,1649,
+};
+
+static const int lutSizes[NUM_LUTS] = {300, 288, 275, 256, 250, 240, 225, 216, 200, 192, 180, 175, 162, 160, 150, 144, 135, 128, 125, 120, 112, 108, 100, 96, 90, 84, 80, 75, 72, 64, 60, 56, 50, 48, 45, 42, 40, 36, 32};
+static volatile uint16_t *const waveTables[NUM_LUTS] = {waveTable300, waveTable288, waveTable275, waveTable256, waveTable250, waveTable240, waveTable225, waveTable216, waveTable200, waveTable192, waveTable180, waveTable175, waveTable162, waveTable160, waveTable150, waveTable144, waveTable135, waveTable128, waveTable125, waveTable120, waveTable112, waveTable108, waveTable100, waveTable96, waveTable90, waveTable84, waveTable80, waveTable75, waveTable72, waveTable64, waveTable60, waveTable56, waveTable50, waveTable48, waveTable45, waveTable42, waveTable40, waveTable36, waveTable32};
@@ -1,5 +1,5 @@
 '''
-Calculate LUT for a sine for 12-bit DAC output on Teensy 3.5.
+Calculate LUTs for a sine for 12-bit DAC output on Teensy 3.5.
 
 The bus clock for this 120 MHz processor is 60 MHz. (See cores/kinetis.h in the 
 Teensy core library.)
@@ -8,19 +8,26 @@ bus clocks.
 
 Since output ranges from 0 - 4095, center the output at 2048.
 Put the amplitude at 2047 so we don't clip.
+
+Tables of several sizes (LUT_SIZES in teensy_lockin/reference.py) are
+written to SineLUT.h, so that the internal reference can get closer to
+the requested frequency; the 300 sample table is also written to
+sine_lut.txt as before. Run from this directory.
 '''
 
+import os
+import sys
+
 import numpy as np
-from numpy import sin, arange, pi
 
-N_samples = 300
-idx = np.arange(N_samples)
-amplitude = 2047
-offset = 2048
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from teensy_lockin.reference import LUT_SIZES, sine_tables, write_header
 
-vals = np.rint(sin(idx / N_samples * 2 * pi) * amplitude + offset).astype(int)
+write_header('SineLUT.h', LUT_SIZES)
+
+vals = sine_tables((300,))[0]
 print(vals.dtype)
 # reshape to be less clunky for humans to read, 10 cols separated by commas
 vals = vals.reshape((-1, 10))
 np.savetxt('sine_lut.txt', vals, fmt = '%d', delimiter = ',', newline = ',\n')
-
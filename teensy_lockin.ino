@@ -57,18 +57,27 @@ int measPeriod_us;
 #endif
 
 long sinFreq;
+int lutSize = LUT_SIZE; // size of the sine table for the internal reference
+unsigned long pdbMod = 0; // PDB modulus; 0 = work it out from sinFreq
+unsigned long refMilliHz = 0; // external reference frequency given by the host (mHz); 0 = count it
+unsigned long refCheck_ms = 0; // count duration checking refMilliHz; 0 = use it without counting
+const double refTolerance = 1e-3; // relative error accepted in refMilliHz, as refcache.TOLERANCE
+int decimation = 1; // Normal Mode sends one point for every decimation points
 double referenceFreq;
 int filterPole;
-int fastMode;
+int fastMode; // 0 = Normal Mode, 1 = Fast Mode, 2 = Raw Mode, 3 = Continuous Mode
 
 short mySignal[maxPts]; // the raw digitized signal of interest
 ADC *adc = new ADC(); // create ADC object
 volatile bool daqDone = false;
 bool validDiff;
 int measCtr = 0;
+volatile long samplesTaken = 0; // Continuous Mode: samples digitized so far
+int halfPts; // Continuous Mode: mySignal is used as two halves of this size
+bool hostDone = false; // Continuous Mode: host asked to stop
 int refVal, lastVal;
 
-const int numInstructChars = 32; // number of characters in each instruction sent to arduino
+const int numInstructChars = 64; // number of characters in each instruction sent to arduino
 char instruct[numInstructChars]; // array to store instruction in
 bool externalFlag;
 
@@ -82,6 +91,23 @@ double a[numCoeffs];
 double b[numCoeffs];
 // **************************************************************
 
+// **************************************************************
+// Binary wire format for Normal Mode output
+// See teensy_lockin/binary.py for the layout of blocks and records.
+int wireFormat = 0; // 0 = ASCII, 1 = binary, 2 = binary without R and phi
+const uint8_t FIELD_SIGNAL = 1;
+const uint8_t FIELD_IQ = 2;
+const uint8_t FIELD_RPHI = 4;
+const int blockPts = 64; // records per block
+const int blockHeaderSize = 10;
+const int maxRecordSize = 18; // short signal + 4 floats
+uint8_t block[blockHeaderSize + blockPts * maxRecordSize];
+int blockPos;
+uint16_t blockCount;
+uint16_t blockSeq;
+uint8_t blockFields;
+// **************************************************************
+
 void setup()
 {
     // put your setup code here, to run once:
@@ -149,8 +175,42 @@ void setup()
     cutoffFreq = atoi(com);
     com = strtok(NULL, ":");
     filterPole = atoi(com);
-    com = strtok(NULL, "F");
+    com = strtok(NULL, ":F");
     fastMode = atoi(com);
+    // Optional fields, not sent by older host software
+    com = strtok(NULL, ":F");
+    if (com != NULL)
+    {
+        wireFormat = atoi(com);
+        com = strtok(NULL, ":F");
+    }
+    if (com != NULL)
+    {
+        lutSize = atoi(com);
+        com = strtok(NULL, ":F");
+    }
+    if (com != NULL)
+    {
+        pdbMod = (unsigned long)atol(com);
+        com = strtok(NULL, ":F");
+    }
+    if (com != NULL)
+    {
+        refMilliHz = strtoul(com, NULL, 10);
+        com = strtok(NULL, ":F");
+    }
+    if (com != NULL)
+    {
+        decimation = atoi(com);
+        if (decimation < 1){
+            decimation = 1;
+        }
+        com = strtok(NULL, ":F");
+    }
+    if (com != NULL)
+    {
+        refCheck_ms = strtoul(com, NULL, 10);
+    }
 
     if (!externalFlag)
     {
@@ -158,7 +218,8 @@ void setup()
         generateReferenceWave();
     }
     measPeriod_us = 1000000 / samplingRate;
-    if (nPts > maxPts){
+    // In Continuous Mode nPts is the total to stream (0 = until stopped)
+    if (nPts > maxPts && fastMode != 3){
         nPts = maxPts;
     }
  
@@ -168,7 +229,7 @@ void setup()
     // Set a max waiting time
     // Reset if max waiting time exceeded OR host signals successful read
 
-    if (fastMode == 1){
+    if (fastMode == 1 || fastMode == 3){
       maxWait = 5000;
     }
     else{
@@ -178,7 +239,7 @@ void setup()
     index = 0;
     elapsedMillis transmit_wait;
 
-    while (transmit_wait < maxWait){
+    while (!hostDone && transmit_wait < maxWait){
       if (Serial.available()) {
         receivedChar = Serial.read();
       }
@@ -220,7 +281,17 @@ void generateReferenceWave()
     // Use Teensy DMAChannel library
     dma1.begin(true);
     dma1.disable(); // disable DMA
-    dma1.sourceBuffer(waveTable, LUT_SIZE * sizeof(uint16_t));
+    // Pick the sine table; sizes not in SineLUT.h fall back to the first
+    int lut = 0;
+    for (int i = 0; i < NUM_LUTS; i++)
+    {
+        if (lutSizes[i] == lutSize)
+        {
+            lut = i;
+        }
+    }
+    lutSize = lutSizes[lut];
+    dma1.sourceBuffer(waveTables[lut], lutSize * sizeof(uint16_t));
     dma1.transferSize(2);                                  // each value is 2 bytes
     dma1.destination(*(volatile uint16_t *)&(DAC0_DAT0L)); // send to DAC
     dma1.triggerAtHardwareEvent(DMAMUX_SOURCE_PDB);        // set trigger to PDB
@@ -229,11 +300,16 @@ void generateReferenceWave()
     // Now set up PDB
     SIM_SCGC6 |= SIM_SCGC6_PDB; // Enable PDB clock. Again, see manual and kinetis.h
 
-    // Calculate period between outputs
-    uint32_t mod = F_BUS / (sinFreq * LUT_SIZE);
+    // Calculate period between outputs, unless the host planned it
+    // (see teensy_lockin/reference.py)
+    uint32_t mod = pdbMod;
+    if (mod == 0)
+    {
+        mod = F_BUS / (sinFreq * lutSize);
+    }
 
     // Calculate actual frequency used
-    referenceFreq = F_BUS / double(mod * LUT_SIZE) ;
+    referenceFreq = F_BUS / double(mod * lutSize) ;
     
     delay(500);
     // Serial.println(mod);
@@ -252,7 +328,7 @@ void measureLockIn()
 {
 
     // Clear data array
-    for (int i = 0; i < nPts; i++)
+    for (int i = 0; i < nPts && i < maxPts; i++)
     {
         mySignal[i] = 0;
     }
@@ -260,22 +336,42 @@ void measureLockIn()
     // Reset flag and signal array index
     daqDone = false;
     measCtr = 0;
+    samplesTaken = 0;
+    if (fastMode == 3){
+        // Send about ten halves a second, in whole blocks
+        halfPts = (samplingRate / 10) / blockPts * blockPts;
+        if (halfPts < blockPts){
+            halfPts = blockPts;
+        }
+        if (halfPts > maxPts / 2){
+            halfPts = (maxPts / 2) / blockPts * blockPts;
+        }
+    }
 
+    if(externalFlag && refMilliHz > 0 && refCheck_ms == 0){
+        // Frequency given by the host (measured on an earlier run): no count
+        referenceFreq = refMilliHz / 1000.0;
+    }
+    else if(externalFlag){
+        bool given = false;
+        if (refMilliHz > 0){
+            // A short count checks the frequency given by the host, which is
+            // used only if it is within refTolerance of the count, allowing
+            // for the count being up to one edge out
+            double counted = countReference(refCheck_ms);
+            double hint = refMilliHz / 1000.0;
+            given = fabs(counted - hint) <= refTolerance * hint - 1000.0 / refCheck_ms;
+            if (given){
+                referenceFreq = hint;
+            }
+        }
+        if (!given){
+            referenceFreq = countReference(countPeriod_ms);
+        }
+    }
     // Wait for rising edge of reference signal before starting digitization.
     // Otherwise phase info is meaningless.
     if(externalFlag){
-      // Measure reference frequency
-        #if defined(ARDUINO_TEENSY40) // T4.0 uses period in microseconds
-          FreqCount.begin(countPeriod_ms * 1000);
-        #else 
-          FreqCount.begin(countPeriod_ms);
-        #endif
-        while (FreqCount.available() == false) {
-            // Wait; do nothing
-        }
-        FreqCount.end();
-        edgeCounts = FreqCount.read();
-        referenceFreq = edgeCounts / (double) countPeriod_ms * 1000; // convert to get Hz
       //lastVal = digitalRead(referencePin);
       //while (true) {
       //  refVal = digitalRead(referencePin);
@@ -300,6 +396,15 @@ void measureLockIn()
     // Digitize the signal
     //myTimer.begin(digitizeSignal, measPeriod_us);
     
+    // In Continuous Mode the signal is sent while it is digitized, and the
+    // host does the mixing and filtering as in Raw Mode
+    if (fastMode == 3){
+        Serial.println(referenceFreq, 6);
+        streamSignal();
+        myTimer.end();
+        return;
+    }
+
     // wait for measurements to complete
     // check flag set by measureSignal()
     while (daqDone == false)
@@ -309,6 +414,14 @@ void measureLockIn()
     // Now disable timer
     myTimer.end();
 
+    // In Raw Mode the host does the mixing and filtering, so just send the
+    // reference frequency (with enough digits to keep the phase) and the signal
+    if (fastMode == 2){
+        Serial.println(referenceFreq, 6);
+        sendRawSignal();
+        return;
+    }
+
     // Calculate the actual frequency used 
     if (!externalFlag)
     {
@@ -345,6 +458,23 @@ void measureLockIn()
     }
 }
 
+// Count the edges of the external reference for period_ms; returns its frequency (Hz)
+double countReference(unsigned long period_ms)
+{
+    // Measure reference frequency
+    #if defined(ARDUINO_TEENSY40) // T4.0 uses period in microseconds
+      FreqCount.begin(period_ms * 1000);
+    #else 
+      FreqCount.begin(period_ms);
+    #endif
+    while (FreqCount.available() == false) {
+        // Wait; do nothing
+    }
+    FreqCount.end();
+    edgeCounts = FreqCount.read();
+    return edgeCounts / (double) period_ms * 1000; // convert to get Hz
+}
+
 // Start digitizing signal on rising edge of external reference signal
 void extMeasISR() {
   detachInterrupt(digitalPinToInterrupt(referencePin));
@@ -360,7 +490,23 @@ void digitizeSignal()
     #else
         int result = adc->adc0->analogRead(pinP);
     #endif
-    if (measCtr < nPts)
+    if (fastMode == 3)
+    {
+        // Continuous Mode: fill the two halves of mySignal in turn
+        if (daqDone){
+            return;
+        }
+        mySignal[measCtr] = (short)result;
+        measCtr++;
+        if (measCtr == 2 * halfPts){
+            measCtr = 0;
+        }
+        samplesTaken++;
+        if (nPts > 0 && samplesTaken >= nPts){
+            daqDone = true;
+        }
+    }
+    else if (measCtr < nPts)
     {
         mySignal[measCtr] = (short)result;
         measCtr++;
@@ -517,9 +663,21 @@ void mixAndFilter()
         yregY[i] = 0.0;
     }
 
+    if (wireFormat == 1){
+        startBlocks(FIELD_SIGNAL | FIELD_IQ | FIELD_RPHI);
+    }
+    else if (wireFormat == 2){
+        startBlocks(FIELD_SIGNAL | FIELD_IQ);
+    }
+
     //create sum variables and sine and cosine terms
     double ynX;
     double ynY;
+    // I and Q summed over the points of the current group when decimating
+    // (a first order CIC filter); one point is sent per group
+    double sumX = 0;
+    double sumY = 0;
+    int groupCtr = 0;
     //need to loop over the number of points
     for (int n = numCoeffs - 1; n < nPts; n++){
         //need to initialize the sums
@@ -537,22 +695,6 @@ void mixAndFilter()
             ynY = ynY + a[coeffCtr] * (double)mySignal[n - coeffCtr] * cosTerm + b[coeffCtr] * yregY[coeffCtr];
         }
 
-        //print output
-        double R;
-        double phi;
-        R = sqrt(ynX * ynX + ynY * ynY);
-        phi = atan2(ynY, ynX);
-        Serial.print(mySignal[n]); // print data to serial
-        Serial.print(", ");
-        Serial.print(ynX); // in phase
-        Serial.print(", ");
-        Serial.print(ynY); // quadrature
-        Serial.print(", ");
-        Serial.print(R); // amplitude - will be 0.5 as much as input amplitude
-        Serial.print(", ");
-        Serial.print(phi); // phase
-        Serial.print("E");
-
         //update registers by shifting yreg[n] to yreg[n+1]
         //this will need to be changed if we ever use more than 2 coeffs
         for (int coeffCtr = numCoeffs - 1; coeffCtr > 0; coeffCtr--){
@@ -565,6 +707,164 @@ void mixAndFilter()
                 yregY[coeffCtr] = yregY[coeffCtr - 1];
             }
         }
-        delayMicroseconds(150);
+
+        sumX = sumX + ynX;
+        sumY = sumY + ynY;
+        groupCtr++;
+        if (groupCtr < decimation){
+            continue;
+        }
+        double outX = sumX / decimation;
+        double outY = sumY / decimation;
+        sumX = 0;
+        sumY = 0;
+        groupCtr = 0;
+
+        //print output
+        double R;
+        double phi;
+        R = sqrt(outX * outX + outY * outY);
+        phi = atan2(outY, outX);
+        if (wireFormat != 0){
+            addRecord(mySignal[n], outX, outY, R, phi);
+        }
+        else{
+            Serial.print(mySignal[n]); // print data to serial
+            Serial.print(", ");
+            Serial.print(outX); // in phase
+            Serial.print(", ");
+            Serial.print(outY); // quadrature
+            Serial.print(", ");
+            Serial.print(R); // amplitude - will be 0.5 as much as input amplitude
+            Serial.print(", ");
+            Serial.print(phi); // phase
+            Serial.print("E");
+        }
+
+        // Binary blocks are paced by USB flow control instead
+        if (wireFormat == 0){
+            delayMicroseconds(150);
+        }
+    }
+    if (wireFormat != 0){
+        endBlocks();
+    }
+}
+
+void sendRawSignal()
+{
+    startBlocks(FIELD_SIGNAL);
+    for (int n = 0; n < nPts; n++){
+        addRecord(mySignal[n], 0, 0, 0, 0);
+    }
+    endBlocks();
+}
+
+void streamSignal()
+{
+    // Send each half of mySignal once it is full, while the timer fills the
+    // other half. If the host falls so far behind that a half is overwritten
+    // before it is sent, that half is skipped along with its block sequence
+    // numbers, so the host sees the gap as missing blocks.
+    long sent = 0; // samples sent (or skipped) so far
+    startBlocks(FIELD_SIGNAL);
+    while (true){
+        if (Serial.available() && Serial.read() == 'X'){
+            hostDone = true;
+            break;
+        }
+        long taken = samplesTaken;
+        while (taken - sent > 2 * halfPts){
+            sent += halfPts;
+            blockSeq += halfPts / blockPts;
+        }
+        long ready = taken - sent;
+        if (ready >= halfPts){
+            ready = halfPts;
+        }
+        else if (!daqDone || ready == 0){
+            if (daqDone){
+                break; // all nPts sent
+            }
+            continue;
+        }
+        int start = sent % (2 * halfPts);
+        for (int i = 0; i < ready; i++){
+            addRecord(mySignal[start + i], 0, 0, 0, 0);
+        }
+        sent += ready;
+    }
+    endBlocks();
+}
+
+void startBlocks(uint8_t fields)
+{
+    blockFields = fields;
+    blockSeq = 0;
+    blockCount = 0;
+    blockPos = blockHeaderSize;
+}
+
+void addToBlock(const void *value, int size)
+{
+    memcpy(&block[blockPos], value, size);
+    blockPos += size;
+}
+
+void addRecord(short signal, float I, float Q, float R, float phi)
+{
+    // Teensy is little-endian, like the wire format
+    if (blockFields & FIELD_SIGNAL){
+        addToBlock(&signal, sizeof(signal));
+    }
+    if (blockFields & FIELD_IQ){
+        addToBlock(&I, sizeof(I));
+        addToBlock(&Q, sizeof(Q));
+    }
+    if (blockFields & FIELD_RPHI){
+        addToBlock(&R, sizeof(R));
+        addToBlock(&phi, sizeof(phi));
+    }
+    blockCount++;
+    if (blockCount == blockPts){
+        sendBlock();
+    }
+}
+
+void sendBlock()
+{
+    // Header: sync, checksum, sequence number, count, fields, reserved
+    block[0] = 0xA5;
+    block[1] = 0x5A;
+    memcpy(&block[4], &blockSeq, 2);
+    memcpy(&block[6], &blockCount, 2);
+    block[8] = blockFields;
+    block[9] = 0;
+    uint16_t checksum = fletcher16(&block[4], blockPos - 4);
+    memcpy(&block[2], &checksum, 2);
+    Serial.write(block, blockPos);
+
+    blockSeq++;
+    blockCount = 0;
+    blockPos = blockHeaderSize;
+}
+
+void endBlocks()
+{
+    if (blockCount > 0){
+        sendBlock();
+    }
+    sendBlock(); // an empty block marks the end of the data
+    Serial.send_now();
+}
+
+uint16_t fletcher16(const uint8_t *data, int len)
+{
+    uint16_t sum1 = 0;
+    uint16_t sum2 = 0;
+    for (int i = 0; i < len; i++){
+        sum1 = (sum1 + data[i]) % 255;
+        sum2 = (sum2 + sum1) % 255;
     }
+    return (sum2 << 8) | sum1;
 }
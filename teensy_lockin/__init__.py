@@ -0,0 +1,6 @@
+'''
+Host-side tools for talking to a Teensy running teensy_lockin.ino.
+
+The modules in this package hold the serial protocol and data handling
+used by teensy_lockin_gui.py, kept free of any GUI code.
+'''
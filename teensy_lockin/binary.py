@@ -0,0 +1,261 @@
+'''
+Binary block format for Normal Mode output.
+
+When the instruction selects a binary wire format, mixAndFilter sends
+fixed-size little-endian records instead of printing text. Records are
+grouped into blocks, each preceded by a 10 byte header:
+
+    offset  size  field
+    0       2     sync bytes 0xA5 0x5A
+    2       2     Fletcher-16 checksum of bytes 4 to the end of the block
+    4       2     sequence number (uint16, wraps around)
+    6       2     number of records in the block (uint16)
+    8       1     fields present (FIELD_SIGNAL | FIELD_IQ | FIELD_RPHI)
+    9       1     reserved (0)
+
+A record holds, in order and only if present, Signal (int16), I and Q
+(float32) and R and Phi (float32). R and Phi can be left out and
+recomputed on the host. A block with zero records ends the stream.
+
+encode_blocks is a reference encoder matching the firmware, so the
+decoder can be exercised without hardware.
+'''
+
+import struct
+
+import numpy as np
+
+SYNC = b'\xa5\x5a'
+HEADER = struct.Struct('<2sHHHBB')
+BLOCK_POINTS = 64 # records per block sent by the firmware
+MAX_BLOCK_POINTS = 1024 # larger counts are treated as a corrupt header
+
+FIELD_SIGNAL = 1
+FIELD_IQ = 2
+FIELD_RPHI = 4
+
+RESULT_DTYPE = np.dtype([('Signal', '<i2'), ('I', '<f4'), ('Q', '<f4'),
+                         ('R', '<f4'), ('Phi', '<f4')])
+
+
+def record_dtype(fields):
+    '''Returns the packed record dtype for a fields bit mask'''
+    names = []
+    if fields & FIELD_SIGNAL:
+        names += ['Signal']
+    if fields & FIELD_IQ:
+        names += ['I', 'Q']
+    if fields & FIELD_RPHI:
+        names += ['R', 'Phi']
+    return np.dtype([(name, RESULT_DTYPE[name]) for name in names])
+
+
+def fletcher16(data):
+    '''Fletcher-16 checksum of a bytes-like object, computed vectorized'''
+    d = np.frombuffer(data, dtype=np.uint8).astype(np.int64)
+    sum1 = int(d.sum() % 255)
+    sum2 = int(np.dot(np.arange(len(d), 0, -1), d) % 255)
+    return (sum2 << 8) | sum1
+
+
+def encode_block(seq, records, fields):
+    '''Packs a structured array of records into one block'''
+    body = struct.pack('<HHBB', seq & 0xFFFF, len(records), fields, 0)
+    body += records.astype(record_dtype(fields), copy=False).tobytes()
+    return SYNC + struct.pack('<H', fletcher16(body)) + body
+
+
+def encode_blocks(signal=None, i=None, q=None, r=None, phi=None,
+                  block_points=BLOCK_POINTS, first_seq=0, end=True):
+    '''
+    Reference encoder: packs the given columns into blocks the way
+    mixAndFilter does and, if end is True, appends the empty end-of-stream
+    block. Columns left as None are not sent.
+    '''
+    fields = 0
+    columns = {}
+    if signal is not None:
+        fields |= FIELD_SIGNAL
+        columns['Signal'] = signal
+    if i is not None:
+        fields |= FIELD_IQ
+        columns['I'] = i
+        columns['Q'] = q
+    if r is not None:
+        fields |= FIELD_RPHI
+        columns['R'] = r
+        columns['Phi'] = phi
+    records = np.zeros(len(next(iter(columns.values()))),
+                       dtype=record_dtype(fields))
+    for name, column in columns.items():
+        records[name] = column
+
+    blocks = []
+    seq = first_seq
+    for start in range(0, len(records), block_points):
+        blocks.append(encode_block(seq, records[start:start + block_points],
+                                   fields))
+        seq += 1
+    if end:
+        blocks.append(encode_block(seq, records[:0], fields))
+    return b''.join(blocks)
+
+
+class BlockDecoder(object):
+    '''
+    Incrementally decodes a stream of binary blocks.
+    Feed it chunks of bytes as they arrive; partial blocks are kept until
+    the rest arrives, and after corruption it resynchronizes on the next
+    sync bytes. A header found while resynchronizing is not trusted to
+    be waited for: once a complete block that passes its checksum has
+    arrived after it, it is taken for a false sync and skipped.
+    Properties:
+    done - True once the end-of-stream block has been seen
+    fields - fields bit mask of the received records
+    blocks - number of good blocks received
+    points - number of records in them
+    bad_blocks - number of blocks dropped because of a checksum mismatch
+    missing_blocks - number of blocks lost (dropped ones included), going by
+                     the sequence numbers
+    skipped_bytes - number of bytes discarded while looking for sync
+    '''
+
+    def __init__(self):
+        self._buf = bytearray()
+        self._payloads = []
+        self._gaps = [] # blocks missing before each payload
+        self._gap = 0
+        self._next_seq = None
+        self.done = False
+        self.fields = None
+        self.blocks = 0
+        self.points = 0
+        self.bad_blocks = 0
+        self.missing_blocks = 0
+        self.skipped_bytes = 0
+        self._synced = True # the next header is where the last block ended
+
+    def feed(self, data):
+        '''Adds received bytes and decodes every complete block in them'''
+        self._buf += data
+        buf = self._buf
+        pos = 0
+        while not self.done and len(buf) - pos >= HEADER.size:
+            if buf[pos:pos + 2] != SYNC:
+                found = buf.find(SYNC, pos + 1)
+                if found < 0:
+                    found = len(buf) - 1 # keep a possible first sync byte
+                self.skipped_bytes += found - pos
+                self._synced = False
+                pos = found
+                continue
+            end = self._block_end(buf, pos)
+            if end is None:
+                pos += 1
+                self.skipped_bytes += 1
+                self._synced = False
+                continue
+            if end > len(buf):
+                if not self._synced and self._complete_block_after(buf, pos):
+                    # a false sync: its count would have us wait past good blocks
+                    pos += 1
+                    self.skipped_bytes += 1
+                    continue
+                break # wait for the rest of the block
+            if not self._check(buf, pos, end):
+                self.bad_blocks += 1
+                self._synced = False
+                pos += 1
+                continue
+            sync, checksum, seq, count, fields, _ = HEADER.unpack_from(buf, pos)
+            self._accept(seq, count, fields, bytes(buf[pos + HEADER.size:end]))
+            self._synced = True
+            pos = end
+        del buf[:pos]
+
+    @staticmethod
+    def _block_end(buf, pos):
+        '''End of the block whose header is at pos, or None if the header is implausible'''
+        sync, checksum, seq, count, fields, _ = HEADER.unpack_from(buf, pos)
+        if count > MAX_BLOCK_POINTS or fields == 0 or fields > 7:
+            return None
+        return pos + HEADER.size + count * record_dtype(fields).itemsize
+
+    @staticmethod
+    def _check(buf, pos, end):
+        '''True if the checksum in the header at pos matches the block'''
+        return fletcher16(memoryview(buf)[pos + 4:end]) == HEADER.unpack_from(buf, pos)[1]
+
+    def _complete_block_after(self, buf, pos):
+        '''True if a complete block passing its checksum starts after pos'''
+        found = buf.find(SYNC, pos + 1)
+        while 0 <= found <= len(buf) - HEADER.size:
+            end = self._block_end(buf, found)
+            if end is not None and end <= len(buf) and self._check(buf, found, end):
+                return True
+            found = buf.find(SYNC, found + 1)
+        return False
+
+    def _accept(self, seq, count, fields, payload):
+        if self._next_seq is not None:
+            gap = (seq - self._next_seq) & 0xFFFF
+            self.missing_blocks += gap
+            self._gap += gap
+        self._next_seq = (seq + 1) & 0xFFFF
+        if count == 0:
+            self.done = True
+            return
+        if self.fields is None:
+            self.fields = fields
+        elif fields != self.fields:
+            self.bad_blocks += 1
+            self._gap += 1
+            return
+        self.blocks += 1
+        self.points += count
+        self._payloads.append(payload)
+        self._gaps.append(self._gap)
+        self._gap = 0
+
+    def pop_blocks(self):
+        '''
+        Returns the blocks received since the last call as a list of
+        (missing, records), where missing is the number of blocks lost just
+        before that one, and frees them. For long streams; records() and
+        result() only return blocks that have not been popped.
+        '''
+        if self.fields is None:
+            return []
+        dtype = record_dtype(self.fields)
+        blocks = [(gap, np.frombuffer(payload, dtype=dtype))
+                  for gap, payload in zip(self._gaps, self._payloads)]
+        self._payloads = []
+        self._gaps = []
+        return blocks
+
+    def records(self, first_block=0):
+        '''
+        Returns the received records as a structured array, as sent, from
+        the given block (counting good blocks) onwards.
+        '''
+        if self.fields is None:
+            return np.zeros(0, dtype=RESULT_DTYPE)
+        return np.frombuffer(b''.join(self._payloads[first_block:]),
+                             dtype=record_dtype(self.fields))
+
+    def result(self, first_block=0):
+        '''
+        Returns the received records as a structured array with the fields
+        of RESULT_DTYPE, recomputing R and Phi from I and Q if they were
+        not sent.
+        '''
+        records = self.records(first_block)
+        if records.dtype == RESULT_DTYPE:
+            return records
+        out = np.zeros(len(records), dtype=RESULT_DTYPE)
+        for name in records.dtype.names:
+            out[name] = records[name]
+        if self.fields is not None and not self.fields & FIELD_RPHI:
+            out['R'] = np.hypot(out['I'], out['Q'])
+            out['Phi'] = np.arctan2(out['Q'], out['I'])
+        return out
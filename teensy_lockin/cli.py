@@ -0,0 +1,339 @@
+'''
+Command line interface to LockInClient, for running the lock-in without
+the GUI:
+
+    python -m teensy_lockin --port /dev/ttyACM0 --external 5000 \
+        --points 10000 --cutoff 5 --output run.csv
+    python -m teensy_lockin --port /dev/ttyACM0 --mode continuous \
+        --points 0 --segments run/ --keep-segments 10
+    python -m teensy_lockin --port /dev/ttyACM0 --mode continuous \
+        --points 0 --settle --precision 1e-3
+    python -m teensy_lockin --port /dev/ttyACM0 --format binary --decimate 0
+    python -m teensy_lockin --port /dev/ttyACM0 /dev/ttyACM1 --points 10000
+    python -m teensy_lockin --port /dev/ttyACM0 --sweep 100 200 500 1000
+    python -m teensy_lockin --port /dev/ttyACM0 --points 10000 --history runs.db
+    python -m teensy_lockin --port /dev/ttyACM0 --ref-cache reference.json
+    python -m teensy_lockin --port /dev/ttyACM0 --record runs.tlrec
+    python -m teensy_lockin --port teensyreplay://runs.tlrec?speed=0
+    python -m teensy_lockin --list-ports
+
+A Continuous Mode run with --points 0 goes on until interrupted (Ctrl-C),
+which stops it normally, as does reaching --precision (see
+convergence.py). Given several ports, all the boards run at once
+(see session.py) and a table of their averages is printed. --sweep runs
+the internal reference at each of several frequencies in turn (see
+sweep.py). --history records every run in a run history database (see
+history.py). --ref-cache keeps the external reference frequency measured
+in a file, and the runs that follow within --ref-ttl seconds send it
+instead of counting the reference again (see refcache.py). --decimate
+keeps one point in N of the output (0: as many as the filter allows; see
+decimate.py), on the Teensy for Normal Mode binary transfers and on this
+computer in Raw and Continuous Mode. --record writes everything sent
+and received over the port(s) to a file, which the teensyreplay:// port
+plays back without a board (see recording.py).
+'''
+
+import argparse
+import os
+import signal
+import sys
+import threading
+
+from .client import LockInClient, RunSettings, INTERNAL, EXTERNAL, MAX_POINTS
+from .export import SegmentWriter, StreamWriter, run_metadata, save
+from .history import RunHistory
+from .recording import SerialRecorder
+from .refcache import ReferenceCache, TTL
+from .instruction import (NORMAL, FAST, RAW, CONTINUOUS, ASCII, BINARY,
+                          BINARY_IQ)
+from .session import Session, TABLE_COLUMNS
+from .sweep import Sweep, internal_sweep, TABLE_COLUMNS as SWEEP_COLUMNS
+
+MODES = {"normal": NORMAL, "fast": FAST, "raw": RAW, "continuous": CONTINUOUS}
+FORMATS = {"ascii": ASCII, "binary": BINARY, "binary-iq": BINARY_IQ}
+
+
+def make_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m teensy_lockin",
+        description="Run lock-in detection on a Teensy without the GUI.")
+    parser.add_argument("--list-ports", action="store_true",
+                        help="list the available serial ports and exit")
+    parser.add_argument("--port", nargs="+", help="Teensy serial port, or "
+                        "teensysim:// for a simulated Teensy; several ports "
+                        "run several boards at once")
+    parser.add_argument("--timeout", type=float, metavar="S",
+                        help="with several ports, cancel boards still running "
+                        "after this many seconds")
+    parser.add_argument("--model", choices=["T35", "T40"], default="T35",
+                        help="Teensy model (default T35)")
+    ref = parser.add_mutually_exclusive_group()
+    ref.add_argument("--internal", type=int, metavar="HZ",
+                     help="use the internal reference at this frequency")
+    ref.add_argument("--external", type=int, metavar="MS", default=5000,
+                     help="use the external reference, counting its "
+                     "frequency for this long (default 5000 ms)")
+    ref.add_argument("--sweep", type=int, nargs="+", metavar="HZ",
+                     help="run the internal reference at each of these "
+                     "frequencies in turn")
+    parser.add_argument("--rate", type=int, default=10000,
+                        help="sampling rate in Hz (default 10000)")
+    parser.add_argument("--points", type=int, default=10000,
+                        help="number of points to measure (at most %d, except "
+                        "in continuous mode, where 0 means until stopped)"
+                        % MAX_POINTS)
+    parser.add_argument("--cutoff", type=int, default=5,
+                        help="low pass corner frequency in Hz (default 5)")
+    parser.add_argument("--stages", type=int, choices=[1, 2, 3, 4], default=1,
+                        help="number of filter stages (default 1)")
+    parser.add_argument("--mode", choices=list(MODES), default="normal")
+    parser.add_argument("--format", choices=list(FORMATS), default="ascii",
+                        help="Normal Mode transfer format (default ascii)")
+    parser.add_argument("--percent", type=int, default=75,
+                        help="percent of points used to average (default 75)")
+    parser.add_argument("--settle", action="store_true",
+                        help="average from where the filter has settled instead "
+                        "of the last --percent of the points")
+    parser.add_argument("--precision", type=float, default=0, metavar="REL",
+                        help="stop a Continuous Mode run once the relative "
+                        "standard error of the amplitude is this small")
+    parser.add_argument("--phase-precision", type=float, default=0, metavar="RAD",
+                        help="stop a Continuous Mode run once the standard "
+                        "error of the phase is this small")
+    parser.add_argument("--decimate", type=int, default=1, metavar="N",
+                        help="keep one point in N of the output, 0 for as many "
+                        "as the filter allows (default 1, every point)")
+    parser.add_argument("--output", metavar="FILE",
+                        help="save the data to this file (.csv, .npz, .parquet "
+                        "or .h5)")
+    parser.add_argument("--stream", metavar="NPY",
+                        help="write the data to this .npy file as they arrive")
+    parser.add_argument("--segments", metavar="DIR",
+                        help="write the data to .npy segments in this "
+                        "directory as they arrive")
+    parser.add_argument("--segment-points", type=int, default=1000000,
+                        help="points per segment (default 1000000)")
+    parser.add_argument("--keep-segments", type=int, metavar="N",
+                        help="keep only the newest N segments")
+    parser.add_argument("--history", metavar="DB",
+                        help="record the run(s) in this run history database "
+                        "(see python -m teensy_lockin.history)")
+    parser.add_argument("--ref-cache", metavar="FILE",
+                        help="reuse the external reference frequency kept in "
+                        "this file instead of counting it every run")
+    parser.add_argument("--ref-ttl", type=float, default=TTL, metavar="S",
+                        help="seconds a kept frequency is reused for "
+                        "(default %g)" % TTL)
+    parser.add_argument("--ref-count", type=int, default=0, metavar="MS",
+                        help="count the reference for at least this long to check a kept "
+                        "frequency (default 0, no count)")
+    parser.add_argument("--record", metavar="FILE",
+                        help="record the serial traffic in this file, numbered "
+                        "for each port when there are several (replay it with "
+                        "--port teensyreplay://FILE)")
+    return parser
+
+
+def reference_cache(args):
+    '''The ReferenceCache for parsed command line arguments, or None'''
+    if args.ref_cache is None:
+        return None
+    return ReferenceCache(ttl=args.ref_ttl, check_ms=args.ref_count,
+                          path=args.ref_cache,
+                          log=lambda *a: print(*a, file=sys.stderr))
+
+
+def recorders(args):
+    '''The SerialRecorder of each port for parsed command line arguments'''
+    if args.record is None:
+        return [None] * len(args.port)
+    if len(args.port) == 1:
+        return [SerialRecorder(args.record)]
+    return [SerialRecorder(output_path(args.record, index))
+            for index in range(1, len(args.port) + 1)]
+
+
+def settings_from_args(args):
+    '''Returns the RunSettings for parsed command line arguments'''
+    if args.internal is not None:
+        ref_select, freq_dur = INTERNAL, args.internal
+    else:
+        ref_select, freq_dur = EXTERNAL, args.external
+    settings = RunSettings(ref_select=ref_select, freq_dur=freq_dur,
+                           sampling_rate=args.rate, num_points=args.points,
+                           cutoff=args.cutoff, stages=args.stages,
+                           mode=MODES[args.mode], wire_format=FORMATS[args.format],
+                           teensy_model=args.model, percent=args.percent,
+                           settle=args.settle, precision=args.precision,
+                           phase_precision=args.phase_precision,
+                           decimation=args.decimate)
+    if ref_select == INTERNAL:
+        settings.plan_internal_freq()
+    return settings
+
+
+def main(argv=None):
+    args = make_parser().parse_args(argv)
+    if args.list_ports:
+        import serial.tools.list_ports
+        for port in serial.tools.list_ports.comports():
+            print(port)
+        return 0
+    if args.port is None:
+        print("No serial port given (see --list-ports)", file=sys.stderr)
+        return 2
+
+    settings = settings_from_args(args)
+    history = None
+    if args.history is not None:
+        history = RunHistory(args.history,
+                             log=lambda *a: print(*a, file=sys.stderr))
+    records = recorders(args)
+    try:
+        if len(args.port) > 1:
+            return run_session(args, settings, history, records)
+        if args.sweep is not None:
+            return run_sweep(args, settings, history, records[0])
+        return run_single(args, settings, history, records[0])
+    finally:
+        if history is not None:
+            history.close()
+        for recorder in records:
+            if recorder is not None:
+                recorder.close()
+
+
+def run_single(args, settings, history=None, recorder=None):
+    '''Runs one board, prints the averages and saves the data'''
+    args.port = args.port[0]
+    # progress messages go to stderr so the averages can be piped
+    client = LockInClient(args.port,
+                          log=lambda *a: print(*a, file=sys.stderr),
+                          ref_cache=reference_cache(args), recorder=recorder)
+    for line in settings.describe():
+        client.log(line)
+    if settings.ref_select == INTERNAL:
+        client.log("Actual frequency:", settings.actual_internal_freq(), "Hz")
+    cancel = None
+    if settings.mode == CONTINUOUS:
+        # Ctrl-C stops the run instead of abandoning it
+        cancel = threading.Event()
+        signal.signal(signal.SIGINT, lambda signum, frame: cancel.set())
+    if args.segments is not None:
+        sink = SegmentWriter(args.segments, args.segment_points,
+                             args.keep_segments)
+    elif args.stream is not None:
+        sink = StreamWriter(args.stream)
+    else:
+        sink = None
+    if sink is not None:
+        with sink:
+            result = client.run(settings, sink=sink, cancel=cancel)
+            sink.metadata.update(run_metadata(result))
+    else:
+        result = client.run(settings, cancel=cancel)
+
+    stats = result.statistics()
+    if stats is not None:
+        stats = stats.summary()
+        print("Average Measured Amplitude:", stats["amplitude"],
+              "+/-", stats["amplitude_sem"])
+        print("Average Measured Phase:", stats["phase"],
+              "+/-", stats["phase_sem"])
+    elif result.fast_r is not None:
+        amplitude, phase = result.averages()
+        print("Average Amplitude:", amplitude)
+        print("Average Phase:", phase)
+    else:
+        print("No data received", file=sys.stderr)
+        if history is not None:
+            history.record(result, port=args.port)
+        return 1
+    data_path = args.segments or args.stream
+    if args.output is not None:
+        if settings.mode == CONTINUOUS:
+            print("Continuous Mode keeps no data to save; use --stream or "
+                  "--segments", file=sys.stderr)
+        elif result.data is None:
+            print("Fast Mode sends no data to save", file=sys.stderr)
+        else:
+            save(args.output, result)
+            data_path = args.output
+    if history is not None:
+        history.record(result, port=args.port, data_path=data_path)
+    if result.ref_drifted:
+        print("The reference drifted: the run was demodulated at the old "
+              "frequency", file=sys.stderr)
+        return 1
+    return 0
+
+
+def print_table(rows, columns):
+    '''Prints dicts as tab-separated columns, leaving None blank'''
+    print("\t".join(columns))
+    for row in rows:
+        print("\t".join("" if row[name] is None else str(row[name])
+                        for name in columns))
+
+
+def output_path(path, index):
+    '''Numbered file for one board or sweep point: run.csv becomes run_1.csv, ...'''
+    stem, ext = os.path.splitext(path)
+    return "%s_%d%s" % (stem, index, ext)
+
+
+def run_session(args, settings, history=None, records=None):
+    '''Runs every port given at once and prints a table of the results'''
+    if settings.mode == CONTINUOUS or args.stream or args.segments:
+        print("Continuous Mode and streaming need a single port", file=sys.stderr)
+        return 2
+    for line in settings.describe():
+        print(line, file=sys.stderr)
+    session = Session(args.port, args.timeout,
+                      log=lambda *a: print(*a, file=sys.stderr))
+    ref_cache = reference_cache(args)
+    for client in session.clients.values():
+        client.ref_cache = ref_cache
+    if records is not None:
+        for port, recorder in zip(args.port, records):
+            session.clients[port].recorder = recorder
+    cancel = threading.Event()
+    signal.signal(signal.SIGINT, lambda signum, frame: cancel.set())
+    results = session.run(settings, cancel=cancel)
+    print_table(results.table(), TABLE_COLUMNS)
+    for index, port in enumerate(args.port, 1):
+        result = results.results.get(port)
+        data_path = None
+        if args.output is not None and result is not None and result.data is not None:
+            data_path = output_path(args.output, index)
+            save(data_path, result)
+        if history is not None:
+            history.record(result, settings, port, results.errors.get(port), data_path)
+    if all(results.status(port) == "ok" for port in args.port):
+        return 0
+    return 1
+
+
+def run_sweep(args, settings, history=None, recorder=None):
+    '''Runs the internal reference at each frequency of args.sweep'''
+    if settings.mode == CONTINUOUS or args.stream or args.segments:
+        print("Continuous Mode and streaming cannot be swept", file=sys.stderr)
+        return 2
+    points = internal_sweep(args.sweep, settings)
+    sweep = Sweep(args.port[0], log=lambda *a: print(*a, file=sys.stderr))
+    sweep.client.recorder = recorder
+    cancel = threading.Event()
+    signal.signal(signal.SIGINT, lambda signum, frame: cancel.set())
+    results = sweep.run(points, cancel=cancel)
+    print_table(results.table(), SWEEP_COLUMNS)
+    if results.cycle_times:
+        print("Mean cycle time: %.3f s" % results.mean_cycle_time(), file=sys.stderr)
+    for index, result in enumerate(results.results, 1):
+        data_path = None
+        if args.output is not None and result is not None and result.data is not None:
+            data_path = output_path(args.output, index)
+            save(data_path, result)
+        if history is not None:
+            history.record(result, points[index - 1], args.port[0],
+                           results.errors.get(index - 1), data_path)
+    return 0 if not results.errors and len(results.results) == len(points) else 1
@@ -0,0 +1,799 @@
+'''
+Headless interface to a Teensy running teensy_lockin.ino.
+
+LockInClient holds the serial protocol that the GUI used to implement
+inside its Tk frame: it sends the instruction for a RunSettings, reads
+and decodes what the Teensy sends back and returns a RunResult with NumPy
+arrays. Neither tkinter nor matplotlib is imported, so runs can be
+scripted on machines without a display.
+
+    client = LockInClient('/dev/ttyACM0')
+    result = client.run(RunSettings(num_points=10000, cutoff=5))
+    print(result.averages())
+'''
+
+import time
+
+import numpy as np
+import serial
+from numpy.lib.recfunctions import structured_to_unstructured
+
+from .binary import BLOCK_POINTS, BlockDecoder
+from .convergence import Convergence, settled_start
+from .data import LockInData
+from .decimate import Decimator, auto_factor, decimate, window_after, window_before
+from .decode import COLUMNS, decode_records
+from .engine import NUM_COEFFS, StreamingLockIn, mix_and_filter
+from .instruction import (NORMAL, FAST, RAW, CONTINUOUS, ASCII, BINARY,
+                          BINARY_IQ, SINE_LUT_LENGTH, build_instruction)
+from .reference import achieved_freq
+from .serial_reader import FrameReader
+from .stats import LockInStats, window_start
+from .timing import PhaseTimer
+
+INTERNAL = 0
+EXTERNAL = 1
+
+MAX_POINTS = 15000 # most points the GUI asks for in one run (except Continuous Mode)
+BAUD_RATE = 115200
+READ_TIMEOUT = 0.1 # serial read timeout (s), bounds how long a cancel takes
+FIRST_DATA_TIMEOUT = 60 # s to wait for the Teensy, plus the reference count
+DATA_TIMEOUT = 30 # s allowed for reading the data (in Continuous Mode, between chunks)
+RECONNECT_TIMEOUT = 5 # s to wait for the port to come back after the Teensy resets
+RETRY_DELAY = 0.01 # first wait between attempts to open the port (s), doubled each time
+MAX_RETRY_DELAY = 0.5
+CSV_ROWS = 65536 # rows formatted at a time by RunResult.save_csv
+
+MODE_NAMES = {NORMAL: "Normal Mode", FAST: "Fast Mode", RAW: "Raw Mode",
+              CONTINUOUS: "Continuous Mode"}
+FORMAT_NAMES = {ASCII: "ASCII", BINARY: "Binary", BINARY_IQ: "Binary (I/Q only)"}
+
+# Lets ports be given as URLs such as teensysim:// (see simulator.py)
+if 'teensy_lockin.urlhandler' not in serial.protocol_handler_packages:
+    serial.protocol_handler_packages.append('teensy_lockin.urlhandler')
+
+
+class RunSettings(object):
+    '''
+    Parameters of one acquisition, the same ones set in the GUI.
+    Properties:
+    ref_select - INTERNAL or EXTERNAL reference
+    freq_dur - internal reference frequency (Hz) or external reference count
+               duration (ms)
+    sampling_rate - sampling rate (Hz)
+    num_points - number of points to measure (at most MAX_POINTS, except in
+                 Continuous Mode, where 0 means until stopped)
+    cutoff - low pass corner frequency (Hz)
+    stages - number of filter stages (1-4)
+    mode - NORMAL, FAST, RAW or CONTINUOUS
+    wire_format - ASCII, BINARY or BINARY_IQ (Normal Mode only)
+    teensy_model - 'T35' or 'T40'
+    percent - percent of the points, at the end of the run, that are averaged
+    lut_size - size of the sine table for the internal reference
+    pdb_mod - PDB modulus for the internal reference, or 0 to have the Teensy
+              work it out from freq_dur (see reference.py)
+    ref_hint - external reference frequency known from an earlier run (Hz),
+               used instead of counting, or 0 to count it (see refcache.py)
+    ref_check - count duration checking ref_hint (ms): freq_dur is counted
+                if they disagree; 0 uses ref_hint without a count
+    settle - if True, the points from where the filter has settled are
+             averaged rather than the last percent (see convergence.py)
+    precision - relative standard error of the amplitude at which a
+                Continuous Mode run is stopped, or 0
+    phase_precision - standard error of the phase (rad) at which a
+                      Continuous Mode run is stopped, or 0
+    decimation - one point of output is kept for every decimation points,
+                 or 0 for the most the filter allows (see decimate.py);
+                 1 keeps them all
+    keep_signal - if True, a Raw Mode run also keeps its whole digitized
+                  signal (RunResult.signal)
+    '''
+
+    def __init__(self, ref_select=EXTERNAL, freq_dur=5000, sampling_rate=10000,
+                 num_points=10000, cutoff=5, stages=1, mode=NORMAL,
+                 wire_format=ASCII, teensy_model='T35', percent=75,
+                 lut_size=SINE_LUT_LENGTH, pdb_mod=0, ref_hint=0, ref_check=0,
+                 settle=False, precision=0, phase_precision=0, decimation=1, keep_signal=False):
+        self.ref_select = ref_select
+        self.freq_dur = freq_dur
+        self.sampling_rate = sampling_rate
+        self.num_points = num_points if mode == CONTINUOUS else min(num_points, MAX_POINTS)
+        self.cutoff = cutoff
+        self.stages = stages
+        self.mode = mode
+        self.wire_format = wire_format
+        self.teensy_model = teensy_model
+        self.percent = percent
+        self.lut_size = lut_size
+        self.pdb_mod = pdb_mod
+        self.ref_hint = ref_hint
+        self.ref_check = ref_check
+        self.settle = settle
+        self.precision = precision
+        self.phase_precision = phase_precision
+        self.decimation = decimation
+        self.keep_signal = keep_signal
+
+    def instruction(self):
+        '''Returns the instruction string sent to the Teensy'''
+        ref_mhz = 0
+        if self.ref_select == EXTERNAL and self.ref_hint:
+            ref_mhz = int(round(self.ref_hint * 1000))
+        return build_instruction(self.ref_select, self.freq_dur,
+                                 self.sampling_rate, self.num_points,
+                                 self.cutoff, self.stages, self.mode,
+                                 self.wire_format, self.lut_size, self.pdb_mod,
+                                 ref_mhz, self.device_decimation(), self.ref_check)
+
+    def volts_per_count(self):
+        '''Converts ADC counts to volts for this Teensy model'''
+        if self.teensy_model == 'T40':
+            return 3.3/1023
+        return 3.3/4096
+
+    def expected_points(self):
+        '''Number of points of output a complete run returns'''
+        if self.mode == NORMAL and self.wire_format == ASCII:
+            # the last 100 points are not read, the last one read and the
+            # first 2 are dropped
+            read = self.num_points - 100 if self.num_points > 100 else self.num_points
+            return max(read - 3, 0)
+        # mixAndFilter starts at the last filter coefficient, and the rows
+        # after the last point a decimating filter needs give no point
+        after = self.decimation_window()[1]
+        return max(self.num_points - NUM_COEFFS + 1 - after, 0) // self.decimation_factor()
+
+    def decimation_factor(self):
+        '''
+        Points of output computed for each one kept: 1 in Fast Mode and for
+        ASCII transfers, which are not decimated
+        '''
+        if self.mode == FAST or (self.mode == NORMAL and self.wire_format == ASCII):
+            return 1
+        if self.decimation == 0:
+            return auto_factor(self.cutoff, self.sampling_rate, self.stages)
+        return max(int(self.decimation), 1)
+
+    def device_decimation(self):
+        '''The decimation done on the Teensy (Normal Mode), 1 for none'''
+        return self.decimation_factor() if self.mode == NORMAL else 1
+
+    def decimation_window(self):
+        '''
+        Points of full rate output before and after each point kept that
+        it is filtered from, as (before, after)
+        '''
+        factor = self.decimation_factor()
+        boxcar = self.mode == NORMAL
+        return window_before(factor, boxcar), window_after(factor, boxcar)
+
+    def window_start(self, count=None):
+        '''
+        Index of the first of count points (expected_points() by default)
+        that is averaged: where the filter has settled, with settle, unless
+        the run is too short for that, and otherwise the first of the last
+        percent.
+        '''
+        if count is None:
+            count = self.expected_points()
+        if self.settle:
+            start = settled_start(self)
+            if start < count or (self.mode == CONTINUOUS and self.num_points == 0):
+                return start
+        return window_start(count, self.percent)
+
+    def first_index(self):
+        '''Index in the run of the digitized sample behind the first point of output'''
+        if self.mode == NORMAL and self.wire_format == ASCII:
+            return NUM_COEFFS - 1 + 2 # the first 2 lines are dropped
+        # a decimated point is the last of its group
+        return NUM_COEFFS - 1 + self.decimation_factor() - 1
+
+    def actual_internal_freq(self):
+        '''Frequency the Teensy actually generates for the internal reference'''
+        return achieved_freq(self.freq_dur, self.lut_size, self.pdb_mod)
+
+    def plan_internal_freq(self, planner=None):
+        '''
+        Sets lut_size and pdb_mod to make the internal reference frequency
+        nearest to freq_dur (see reference.FrequencyPlanner). Returns the
+        frequency that will be made.
+        '''
+        if planner is None:
+            from .reference import default_planner
+            planner = default_planner()
+        plan = planner.nearest(self.freq_dur)
+        self.lut_size = plan.lut_size
+        self.pdb_mod = plan.mod
+        return plan.freq
+
+    def describe(self):
+        '''Lines summarising the settings, as printed by the GUI'''
+        lines = ["Instuction Sent:"]
+        if self.ref_select == INTERNAL:
+            lines += ["Reference Mode: Internal Reference",
+                      "Reference Frequency: %s" % self.freq_dur]
+            if self.lut_size != SINE_LUT_LENGTH or self.pdb_mod:
+                lines += ["Sine Table: %s points, PDB modulus %s"
+                          % (self.lut_size, self.pdb_mod or "from frequency")]
+        else:
+            lines += ["Reference Mode: External Reference",
+                      "Frequency Count Duration: %s" % self.freq_dur]
+            if self.ref_hint:
+                lines += ["Reference Frequency Given: %s" % self.ref_hint,
+                          "Check Count Duration: %s" % self.ref_check]
+        numPoints = self.num_points
+        if self.mode == CONTINUOUS and numPoints == 0:
+            numPoints = "until stopped"
+        lines += ["Sampling Rate: %s" % self.sampling_rate,
+                  "Num Points: %s" % numPoints,
+                  "Filter Cutoff Frequency: %s" % self.cutoff,
+                  "Filter Order: %s" % self.stages,
+                  "Mode: %s" % MODE_NAMES[self.mode]]
+        if self.mode == NORMAL:
+            lines += ["Transfer Format: %s" % FORMAT_NAMES[self.wire_format]]
+        factor = self.decimation_factor()
+        if factor > 1:
+            lines += ["Decimation: %s (on the %s), %.4g points/s"
+                      % (factor, "Teensy" if self.device_decimation() > 1 else "computer",
+                         self.sampling_rate / float(factor))]
+        if self.settle:
+            start = self.window_start()
+            lines += ["Averaging From Point: %s" % start]
+            if start != settled_start(self):
+                lines += ["(too few points for the filter to settle)"]
+        if self.mode == CONTINUOUS and (self.precision or self.phase_precision):
+            lines += ["Stop At Precision: %s (amplitude), %s rad (phase)"
+                      % (self.precision or "-", self.phase_precision or "-")]
+        return lines
+
+
+class RunResult(object):
+    '''
+    Results of one acquisition.
+    Properties:
+    settings - the RunSettings used
+    ref_freq - reference frequency sent by the Teensy (Hz), or None; in Raw
+               Mode with a ReferenceCache that refines, the one estimated
+    ref_estimate - reference frequency estimated from the signal on the
+                   host (Hz), when a ReferenceCache is used, or None
+    signal - the whole digitized signal of a Raw Mode run, from its first
+             sample, with settings.keep_signal, or None (data only holds
+             the Signal of the points kept when decimating)
+    data - LockInData with the Signal, I, Q, R and Phi of each point (Normal
+           and Raw Mode), or None; an (N, 5) array assigned to it is
+           converted
+    points - number of points of output received
+    fast_r, fast_phi - averages of R and Phi sent in Fast Mode, or None
+    malformed - number of records that could not be decoded
+    missing_blocks - number of binary blocks lost
+    timed_out - True if not all the data arrived in time
+    cancelled - True if the run was cancelled
+    ref_drifted - True if the run was demodulated at a reference frequency
+                  given by a ReferenceCache that its signal showed had
+                  drifted; its outputs are not to be trusted
+    stopped - True if a Continuous Mode run was stopped before num_points
+    converged - True if a Continuous Mode run was stopped because its
+                averages reached settings.precision
+    stats - LockInStats over settings.percent of the points (or from where
+            the filter has settled, with settings.settle), updated as
+            they arrive (None in Fast Mode; over all the points in a
+            Continuous Mode run without num_points)
+    bytes_read - number of bytes received from the Teensy
+    timings - PhaseTimer with the time spent in each phase of the run
+    '''
+
+    def __init__(self, settings, timings=None):
+        self.settings = settings
+        self.ref_freq = None
+        self.ref_estimate = None
+        self.signal = None
+        self._data = None
+        self.points = 0
+        self.fast_r = None
+        self.fast_phi = None
+        self.malformed = 0
+        self.missing_blocks = 0
+        self.timed_out = False
+        self.cancelled = False
+        self.ref_drifted = False
+        self.stopped = False
+        self.converged = False
+        self.stats = None
+        if settings.mode != FAST:
+            self.stats = LockInStats(settings.expected_points(), settings.percent,
+                                     2 * settings.volts_per_count(),
+                                     settings.window_start())
+        self.bytes_read = 0
+        self.timings = timings if timings is not None else PhaseTimer()
+
+    @property
+    def data(self):
+        return self._data
+
+    @data.setter
+    def data(self, values):
+        if values is not None and not isinstance(values, LockInData):
+            values = LockInData(values, self.settings.volts_per_count())
+        self._data = values
+
+    def column(self, name):
+        return self.data[name]
+
+    def status(self):
+        '''"ok", "cancelled", "timed out", "no data" or "drifted"'''
+        if self.cancelled:
+            return "cancelled"
+        if self.timed_out:
+            return "timed out"
+        if self.points == 0 and self.fast_r is None:
+            return "no data"
+        if self.ref_drifted:
+            return "drifted"
+        return "ok"
+
+    def statistics(self, percent=None):
+        '''
+        Returns the LockInStats of the last percent of the points (by
+        default, those from settings.window_start), or None if there are no
+        data. The statistics kept while the data arrived are used when they cover the
+        same points, otherwise they are computed from the data. Continuous
+        Mode runs keep no data, so percent cannot be changed afterwards.
+        '''
+        if self.data is None:
+            if self.settings.mode == CONTINUOUS and self.points > 0:
+                return self.stats
+            return None
+        if percent is None:
+            start = self.settings.window_start(len(self.data))
+        else:
+            start = window_start(len(self.data), percent)
+        stats = self.stats
+        if (stats is not None and stats.seen == len(self.data)
+                and stats.start == start):
+            return stats
+        return LockInStats.from_data(self.column("R"), self.column("Phi"),
+                                     scale=2 * self.settings.volts_per_count(),
+                                     start=start)
+
+    def averages(self, percent=None):
+        '''
+        Returns (amplitude in volts, phase in radians) averaged over the last
+        percent of the points, or as sent by the Teensy in Fast Mode. The
+        phase is a circular mean.
+        '''
+        stats = self.statistics(percent)
+        if stats is None:
+            if self.fast_r is None:
+                return None, None
+            return self.fast_r * 2 * self.settings.volts_per_count(), self.fast_phi
+        return stats.amplitude.mean * stats.scale, stats.phase.mean()
+
+    def summary(self, percent=None):
+        '''
+        Returns a dict with the reference frequency, the number of points and
+        the average amplitude (V) and phase (rad) with their standard errors
+        (None in Fast Mode), for tables of several runs.
+        '''
+        row = {"ref_freq": self.ref_freq, "points": self.points,
+               "amplitude_sem": None, "phase_sem": None}
+        row["amplitude"], row["phase"] = self.averages(percent)
+        stats = self.statistics(percent)
+        if stats is not None:
+            summary = stats.summary()
+            row["amplitude_sem"] = summary["amplitude_sem"]
+            row["phase_sem"] = summary["phase_sem"]
+        return row
+
+    def to_dataframe(self):
+        '''Returns the data as a pandas DataFrame (pandas is imported on demand)'''
+        return self.data.to_dataframe()
+
+    def save_csv(self, path, rows=CSV_ROWS):
+        '''
+        Saves the data in the same CSV layout as the GUI's Save Data, R
+        doubled. The rows are formatted a block at a time, so only a block
+        is ever copied.
+        '''
+        records = self.data.records
+        with open(path, 'w') as f:
+            f.write(',' + ','.join(COLUMNS) + '\n')
+            for start in range(0, len(records), rows):
+                block = records[start:start + rows]
+                out = np.empty((len(block), 1 + len(COLUMNS)))
+                out[:, 0] = np.arange(start, start + len(block))
+                for k, name in enumerate(COLUMNS, 1):
+                    out[:, k] = block[name]
+                out[:, 1 + COLUMNS.index("R")] *= 2
+                # float32 holds about 7 significant digits; more show noise
+                np.savetxt(f, out, delimiter=',',
+                           fmt=['%d', '%d'] + ['%.7g'] * (len(COLUMNS) - 1))
+
+
+class LockInClient(object):
+    '''
+    Runs acquisitions on a Teensy over a serial port.
+    Properties:
+    port - name of the serial port
+    ser - the open serial connection, or None
+    settings - RunSettings used when acquire() is not given any
+    log - function called with messages about the run (print by default)
+    ref_cache - a refcache.ReferenceCache to reuse the external reference
+                frequency from earlier runs instead of counting it, or None
+    recorder - a recording.SerialRecorder the traffic of each connection
+               is recorded by, or None
+    '''
+
+    def __init__(self, port=None, settings=None, log=print, ref_cache=None,
+                 recorder=None):
+        self.port = port
+        self.ser = None
+        self.settings = settings if settings is not None else RunSettings()
+        self.log = log
+        self.ref_cache = ref_cache
+        self.recorder = recorder
+
+    def connect(self, port=None, timeout=RECONNECT_TIMEOUT, cancel=None):
+        '''
+        Opens the serial port, which may also be a pyserial URL. The Teensy
+        resets itself after every run and its USB port disappears until it
+        has restarted, so opening is retried, waiting RETRY_DELAY and then
+        twice as long each time, until timeout (s) has passed or cancel (an
+        optional threading.Event) is set. With a recorder, the connection
+        is wrapped so that its traffic is recorded.
+        '''
+        if port is not None:
+            self.port = port
+        deadline = time.monotonic() + timeout
+        delay = RETRY_DELAY
+        while True:
+            try:
+                self.ser = serial.serial_for_url(self.port, BAUD_RATE,
+                                                 timeout=READ_TIMEOUT,
+                                                 write_timeout=10)
+                break
+            except serial.SerialException:
+                if time.monotonic() + delay > deadline:
+                    raise
+                if cancel is None:
+                    time.sleep(delay)
+                elif cancel.wait(delay):
+                    raise
+                delay = min(2 * delay, MAX_RETRY_DELAY)
+        if hasattr(self.ser, 'set_buffer_size'):
+            # Implemented in Windows only
+            self.ser.set_buffer_size(rx_size=100000, tx_size=4096)
+        if self.recorder is not None:
+            self.ser = self.recorder.wrap(self.ser, self.port)
+
+    def close(self):
+        '''Closes the serial port'''
+        if self.ser is not None:
+            self.ser.close()
+            self.ser = None
+
+    def configure(self, settings=None, **kwargs):
+        '''Sets the settings for later runs, from a RunSettings or keywords'''
+        if settings is None:
+            settings = RunSettings(**kwargs)
+        self.settings = settings
+        return settings
+
+    def run(self, settings=None, **kwargs):
+        '''
+        Connects, acquires and closes the port again. The Teensy resets
+        itself after every run, so the port has to be reopened for each.
+        Keyword arguments are passed on to acquire().
+        '''
+        timings = PhaseTimer()
+        with timings.phase("open"):
+            self.connect()
+        try:
+            return self.acquire(settings, timings=timings, **kwargs)
+        finally:
+            self.close()
+
+    def acquire(self, settings=None, cancel=None, progress=None, partial=None,
+                timings=None, sink=None):
+        '''
+        Sends the instruction and reads the results of one run on the open
+        port. cancel is an optional threading.Event that stops the run;
+        progress(count) and partial(values) are optional callbacks with the
+        number of points read so far and each newly decoded (n, 5) block
+        of points. If sink is given (e.g. an export.StreamWriter), the
+        points are also passed to sink.append as they are decoded. Phase
+        times are added to timings (a PhaseTimer) if given.
+        In Continuous Mode the points are only passed to partial and sink,
+        not kept in the result, and cancel stops the run normally.
+        Returns a RunResult.
+        '''
+        settings = settings if settings is not None else self.settings
+        if self.ref_cache is not None:
+            settings = self.ref_cache.prepare(settings, self.port)
+            if settings.ref_hint:
+                self.log("Reference Frequency Given [Hz]:", settings.ref_hint)
+        result = RunResult(settings, timings)
+        if sink is not None:
+            partial = self._tee(sink, partial)
+        with result.timings.phase("write"):
+            self.ser.reset_output_buffer()
+            self.ser.reset_input_buffer()
+            try:
+                self.ser.write(settings.instruction().encode('utf-8'))
+            except serial.SerialTimeoutException:
+                self.log("writing timed out")
+
+        reader = FrameReader(self.ser, cancel=cancel)
+        with result.timings.phase("first_byte"):
+            arrived = self._wait(reader, settings)
+        if not arrived:
+            result.cancelled = reader.cancelled
+            result.timed_out = reader.timed_out
+            return result
+
+        # Raw and Continuous Mode send the reference frequency for internal
+        # reference too
+        if settings.ref_select == EXTERNAL or settings.mode in (RAW, CONTINUOUS):
+            with result.timings.phase("transfer"):
+                line = reader.readline(DATA_TIMEOUT)
+            if line is not None:
+                result.ref_freq = float(line.strip())
+            elif settings.mode in (RAW, CONTINUOUS):
+                # nothing to mix the signal with
+                self._reset()
+                result.cancelled = reader.cancelled
+                result.timed_out = not reader.cancelled
+                self.log("Run cancelled" if reader.cancelled
+                         else "No reference frequency sent from Teensy")
+                return result
+            if settings.ref_select == EXTERNAL:
+                self.log("Measured External Reference Frequency [Hz]:",
+                         result.ref_freq)
+
+        if settings.mode == FAST:
+            self._read_fast(reader, result)
+        elif settings.mode == RAW:
+            self._read_raw(reader, result, progress, partial)
+        elif settings.mode == CONTINUOUS:
+            self._read_continuous(reader, result, progress, partial)
+        elif settings.wire_format == ASCII:
+            self._read_ascii(reader, result, progress, partial)
+        else:
+            self._read_binary(reader, result, progress, partial)
+        result.bytes_read = reader.bytes_read
+        if result.data is not None:
+            result.points = len(result.data)
+        if settings.mode == CONTINUOUS:
+            result.stopped = reader.cancelled or result.converged
+        else:
+            result.cancelled = reader.cancelled
+        if result.cancelled:
+            self.log("Run cancelled")
+        if result.stopped:
+            self.log("Run stopped")
+        if self.ref_cache is not None and not result.cancelled:
+            with result.timings.phase("reference"):
+                if result.ref_estimate is None:
+                    result.ref_estimate = self.ref_cache.estimate(result)
+                self.ref_cache.observe(result, self.port, estimate=result.ref_estimate)
+        return result
+
+    @staticmethod
+    def _tee(sink, partial):
+        '''Returns a partial callback that also appends to sink'''
+        def tee(values):
+            sink.append(values)
+            if partial is not None:
+                partial(values)
+        return tee
+
+    def _reset(self):
+        '''Tells the Teensy the data were received so it resets itself'''
+        self.ser.write(str("DRX").encode('utf-8'))
+
+    def _wait(self, reader, settings):
+        '''
+        Waits for the first data, allowing for the external reference count.
+        Returns False if nothing arrived or the run was cancelled.
+        '''
+        timeout = FIRST_DATA_TIMEOUT
+        if settings.ref_select == EXTERNAL:
+            timeout += (settings.freq_dur + settings.ref_check) / 1000
+        if reader.wait(timeout):
+            return True
+        if reader.cancelled:
+            self.log("Run cancelled")
+            self._reset()
+        else:
+            self.log("Nothing sent from Teensy")
+        return False
+
+    def _read_fast(self, reader, result):
+        with result.timings.phase("transfer"):
+            d = next(reader.records(1, timeout=DATA_TIMEOUT), None)
+            self._reset()
+        result.timed_out = reader.timed_out
+        if d is not None:
+            with result.timings.phase("parse"):
+                d = d.decode().split(',')
+                result.fast_r = float(d[0])
+                result.fast_phi = float(d[1])
+
+    def _read_ascii(self, reader, result, progress, partial):
+        numPoints = result.settings.num_points
+        cutoff = numPoints - 100 if numPoints > 100 else numPoints
+        data = []
+        batches = [] # decoded points
+        decoded = 2 # the first 2 lines are left over from the previous run
+        count = 0
+        with result.timings.phase("transfer"):
+            for record in reader.records(cutoff, timeout=DATA_TIMEOUT):
+                data.append(record)
+                count += 1
+                if count % 1000 == 0:
+                    self.log(count, "lines read of " + str(numPoints))
+                    if progress is not None:
+                        progress(count)
+                    # decode all but the newest line, which is dropped if last
+                    batches.append(self._decode_lines(data[decoded:count - 1],
+                                                      result, partial))
+                    decoded = count - 1
+            self._reset()
+        result.timed_out = reader.timed_out
+        if reader.timed_out:
+            self.log("Could not read all lines")
+        data = data[:-1] #cutout last data point since is not actual data
+        self.log("lines read:", len(data))
+
+        with result.timings.phase("parse"):
+            batches.append(self._decode_lines(data[decoded:], result, partial))
+            result.data = np.concatenate(batches)
+        if result.malformed > 0:
+            self.log("Malformed lines skipped:", result.malformed)
+
+    def _decode_lines(self, lines, result, partial):
+        '''Decodes ASCII records, adding them to the statistics'''
+        values, valid = decode_records(lines)
+        malformed = len(valid) - np.count_nonzero(valid)
+        if malformed > 0:
+            result.malformed += malformed
+            values = values[valid]
+        result.stats.update(values[:, 3], values[:, 4])
+        if partial is not None and len(values) > 0:
+            partial(values)
+        return values
+
+    def _read_blocks(self, reader, result, progress, partial, stats=True):
+        '''
+        Reads binary blocks until the end of the data, returns the BlockDecoder.
+        If stats is True, the statistics are updated as blocks arrive.
+        '''
+        decoder = BlockDecoder()
+        sent = 0 # blocks already passed to partial
+        # blocks are decoded as they arrive, so this is transfer and parsing
+        with result.timings.phase("transfer"):
+            for chunk in reader.chunks(timeout=DATA_TIMEOUT):
+                decoder.feed(chunk)
+                if progress is not None:
+                    progress(decoder.points)
+                if stats and decoder.blocks > sent:
+                    new = decoder.result(sent)
+                    result.stats.update(new["R"], new["Phi"])
+                    if partial is not None:
+                        partial(structured_to_unstructured(new, dtype=np.float64))
+                    sent = decoder.blocks
+                if decoder.done:
+                    break
+            self._reset()
+        result.timed_out = not decoder.done and not reader.cancelled
+        if result.timed_out:
+            self.log("Could not read all lines")
+        result.missing_blocks = decoder.missing_blocks
+        if decoder.missing_blocks > 0:
+            self.log("Blocks lost:", decoder.missing_blocks)
+        self.log("lines read:", decoder.points)
+        return decoder
+
+    def _read_binary(self, reader, result, progress, partial):
+        decoder = self._read_blocks(reader, result, progress, partial)
+        with result.timings.phase("parse"):
+            result.data = decoder.result()
+
+    def _read_raw(self, reader, result, progress, partial):
+        decoder = self._read_blocks(reader, result, progress, None, stats=False)
+        settings = result.settings
+        signal = decoder.records()["Signal"]
+        if (self.ref_cache is not None and self.ref_cache.refine
+                and settings.ref_select == EXTERNAL):
+            # mix at the frequency of the signal rather than the count's
+            with result.timings.phase("reference"):
+                result.ref_estimate = self.ref_cache.estimate_signal(
+                    signal, settings.sampling_rate, result.ref_freq,
+                    hinted=bool(settings.ref_hint))
+            if result.ref_estimate is not None:
+                result.ref_freq = result.ref_estimate
+        with result.timings.phase("mix_filter"):
+            values = mix_and_filter(signal,
+                                    result.ref_freq, settings.sampling_rate,
+                                    settings.cutoff, settings.stages)
+            values = decimate(values, settings.decimation_factor())
+            result.stats.update(values[:, 3], values[:, 4])
+            result.data = values
+        if settings.keep_signal:
+            result.signal = signal
+        if partial is not None:
+            partial(values)
+
+    def _read_continuous(self, reader, result, progress, partial):
+        '''
+        Mixes and filters the signal as it is streamed, until num_points
+        have been sent, the run is stopped or its averages reach
+        settings.precision. Lost blocks are stepped over so that the
+        reference phase stays right. When decimating, the output goes
+        through a Decimator as it comes.
+        '''
+        settings = result.settings
+        lockin = StreamingLockIn(result.ref_freq, settings.sampling_rate,
+                                 settings.cutoff, settings.stages)
+        decimator = None
+        if settings.decimation_factor() > 1:
+            decimator = Decimator(settings.decimation_factor())
+        convergence = Convergence(settings)
+        decoder = BlockDecoder()
+        # as in _read_blocks, this is transfer, mixing and filtering
+        with result.timings.phase("transfer"):
+            for chunk in reader.chunks(idle=DATA_TIMEOUT):
+                decoder.feed(chunk)
+                signal = []
+                for missing, records in decoder.pop_blocks():
+                    if missing:
+                        self._process_stream(lockin, signal, result, partial,
+                                             decimator)
+                        signal = []
+                        self._skip_stream(lockin, missing * BLOCK_POINTS, decimator)
+                    signal.append(records["Signal"])
+                self._process_stream(lockin, signal, result, partial, decimator)
+                if progress is not None:
+                    progress(result.points)
+                if decoder.done:
+                    break
+                if convergence.check(result.stats):
+                    # DRX stops the stream between halves
+                    result.converged = True
+                    break
+            self._reset()
+        result.timed_out = not (decoder.done or reader.cancelled or result.converged)
+        if result.timed_out:
+            self.log("Data stopped arriving")
+        if result.converged:
+            amplitude, phase = convergence.errors(result.stats)
+            self.log("Converged after %d points: relative error %.3g (amplitude), "
+                     "%.3g rad (phase)" % (result.points, amplitude, phase))
+        result.missing_blocks = decoder.missing_blocks
+        if decoder.missing_blocks > 0:
+            self.log("Blocks lost:", decoder.missing_blocks)
+        self.log("points streamed:", result.points)
+
+    @staticmethod
+    def _skip_stream(lockin, count, decimator=None):
+        '''Steps over count lost samples'''
+        if decimator is not None:
+            # only the samples from NUM_COEFFS - 1 on give points of output
+            first = max(lockin.index, NUM_COEFFS - 1)
+            decimator.skip(max(lockin.index + count, NUM_COEFFS - 1) - first)
+        lockin.skip(count)
+
+    @staticmethod
+    def _process_stream(lockin, signal, result, partial, decimator=None):
+        '''Mixes and filters (and decimates) a list of contiguous pieces of signal'''
+        if not signal:
+            return
+        values = lockin.process(np.concatenate(signal))
+        if decimator is not None:
+            values = decimator.process(values)
+        if len(values) == 0:
+            return
+        result.points += len(values)
+        result.stats.update(values[:, 3], values[:, 4])
+        if partial is not None:
+            partial(values)
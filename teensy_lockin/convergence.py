@@ -0,0 +1,193 @@
+'''
+When the lock-in output has settled, and when its averages are precise
+enough to stop.
+
+The sketch low-pass filters the mixed signal with stages identical single
+pole filters, y[n] = (1 - x) u[n] + x y[n-1] with x = exp(-2 pi cutoff /
+sampling_rate), starting from rest. The output therefore starts with the
+step response of the cascade, which is known before the run: after n
+samples, the fraction of the step still missing is the chance of fewer
+than stages successes in n + stages - 1 trials of probability 1 - x
+(the impulse response is a negative binomial distribution).
+settling_samples finds the first n at which that is below tolerance, and
+settled_start the first point of a run's output past it. With
+RunSettings.settle, the averages start there instead of at the last
+percent of the points.
+
+The filtered points are correlated, so the standard errors of LockInStats
+(which treat them as independent) are too small. For noise much wider in
+band than the filter, the variance of the mean of n points is that of
+one point times correlation_length / n, where correlation_length is
+(sum h)^2 / sum h^2 for the filter's impulse response h: about
+sampling_rate / (pi cutoff) samples for one stage.
+
+Convergence uses both to stop a Continuous Mode run once the relative
+standard error of the amplitude (RunSettings.precision) and the standard
+error of the phase (RunSettings.phase_precision, rad) have been reached:
+
+    settings = RunSettings(mode=CONTINUOUS, num_points=0, settle=True,
+                           precision=1e-3)
+    result = client.run(settings) # stops by itself, sending DRX
+'''
+
+import collections
+import math
+
+import numpy as np
+
+from .engine import NUM_COEFFS
+
+SETTLE_TOLERANCE = 1e-4 # fraction of the step left when the filter has settled
+MIN_EFFECTIVE = 20 # independent points needed before convergence is tested
+
+Plan = collections.namedtuple("Plan", ["settle_samples", "settle_time", "start",
+                                       "correlation"])
+Plan.__doc__ = '''
+What is known about a run's output before it starts.
+settle_samples - samples the filter takes to settle
+settle_time - the same in seconds
+start - index of the first point of output past them
+correlation - correlation length of the output noise, in points (of the
+              decimated output, when decimating)
+'''
+
+
+def _stages(stages):
+    # as in the firmware, any stage count other than 1-3 means 4 stages
+    return stages if stages in (1, 2, 3) else 4
+
+
+def _pole(cutoff, sampling_rate):
+    if cutoff <= 0 or sampling_rate <= 0:
+        raise ValueError("the cutoff and sampling rate must be positive")
+    return math.exp(-2 * math.pi * cutoff / sampling_rate)
+
+
+def step_error(n, cutoff, sampling_rate, stages):
+    '''Fraction of a step the filter's output is still missing after n samples'''
+    stages = _stages(stages)
+    x = _pole(cutoff, sampling_rate)
+    if n <= 0:
+        return 1.0
+    if x <= 0:
+        return 0.0 if n >= stages else 1.0
+    trials = n + stages - 1
+    total = 0.0
+    for k in range(stages):
+        log_term = (math.lgamma(trials + 1) - math.lgamma(k + 1)
+                    - math.lgamma(trials - k + 1)
+                    + (k * math.log1p(-x) if k else 0.0) + (trials - k) * math.log(x))
+        total += math.exp(log_term)
+    return min(total, 1.0)
+
+
+def settling_samples(cutoff, sampling_rate, stages, tolerance=SETTLE_TOLERANCE):
+    '''Samples after which the filter's step response is within tolerance'''
+    if step_error(1, cutoff, sampling_rate, stages) <= tolerance:
+        return 1
+    high = 2
+    while step_error(high, cutoff, sampling_rate, stages) > tolerance:
+        high *= 2
+    low = high // 2 # step_error(low) > tolerance
+    while high - low > 1:
+        mid = (low + high) // 2
+        if step_error(mid, cutoff, sampling_rate, stages) > tolerance:
+            low = mid
+        else:
+            high = mid
+    return high
+
+
+def correlation_length(cutoff, sampling_rate, stages):
+    '''
+    (sum h)^2 / sum h^2 for the filter's impulse response h: the number of
+    output points that count as one independent point, for white noise.
+    '''
+    stages = _stages(stages)
+    x = _pole(cutoff, sampling_rate)
+    if x <= 0:
+        return 1.0
+    length = settling_samples(cutoff, sampling_rate, stages, 1e-12)
+    m = np.arange(1, length)
+    # h[m] / h[m-1] = x (m + stages - 1) / m, with h[0] = (1 - x)^stages
+    h = np.concatenate(([1.0], np.cumprod(x * (m + stages - 1) / m)))
+    h *= (1 - x) ** stages
+    return max(float(h.sum() ** 2 / np.square(h).sum()), 1.0)
+
+
+def settled_start(settings, tolerance=SETTLE_TOLERANCE):
+    '''Index of the first point of a run's output at which the filter has settled'''
+    samples = settling_samples(settings.cutoff, settings.sampling_rate,
+                               settings.stages, tolerance)
+    # the first point of output has filtered the samples from
+    # NUM_COEFFS - 1 to first_index, and each one after it factor more; a
+    # decimated point also needs the rows before it in its window to have
+    # settled
+    factor = settings.decimation_factor()
+    missing = (samples - 1 + settings.decimation_window()[0]
+               - (settings.first_index() - (NUM_COEFFS - 1)))
+    return max(-(-missing // factor), 0)
+
+
+def plan(settings, tolerance=SETTLE_TOLERANCE):
+    '''The Plan of a run with these settings'''
+    samples = settling_samples(settings.cutoff, settings.sampling_rate,
+                               settings.stages, tolerance)
+    correlation = correlation_length(settings.cutoff, settings.sampling_rate,
+                                     settings.stages)
+    return Plan(samples, samples / float(settings.sampling_rate),
+                settled_start(settings, tolerance),
+                max(correlation / settings.decimation_factor(), 1.0))
+
+
+class Convergence(object):
+    '''
+    Tells when the averages of a run are precise enough to stop it.
+    Properties:
+    precision - relative standard error of the amplitude to reach, or 0
+    phase_precision - standard error of the phase (rad) to reach, or 0
+    correlation - correlation length of the output, in points
+    converged - True once both have been reached
+    count - number of points averaged when they were
+    '''
+
+    def __init__(self, settings, precision=None, phase_precision=None):
+        self.precision = settings.precision if precision is None else precision
+        self.phase_precision = (settings.phase_precision if phase_precision is None
+                                else phase_precision)
+        # decimated points are factor samples apart
+        self.correlation = max(correlation_length(settings.cutoff, settings.sampling_rate,
+                                                  settings.stages)
+                               / settings.decimation_factor(), 1.0)
+        self.converged = False
+        self.count = None
+
+    @property
+    def enabled(self):
+        return bool(self.precision or self.phase_precision)
+
+    def errors(self, stats):
+        '''
+        (relative standard error of the amplitude, standard error of the
+        phase) of a LockInStats, allowing for the correlation of the points
+        '''
+        if stats.amplitude.count < 2:
+            return math.inf, math.inf
+        factor = math.sqrt(self.correlation)
+        amplitude = stats.amplitude.sem() * factor / abs(stats.amplitude.mean)
+        return amplitude, stats.phase.sem() * factor
+
+    def check(self, stats):
+        '''True once the averages of stats are precise enough'''
+        if self.converged:
+            return True
+        if not self.enabled or stats.amplitude.count < MIN_EFFECTIVE * self.correlation:
+            return False
+        amplitude, phase = self.errors(stats)
+        if self.precision and not amplitude <= self.precision:
+            return False
+        if self.phase_precision and not phase <= self.phase_precision:
+            return False
+        self.converged = True
+        self.count = stats.amplitude.count
+        return True
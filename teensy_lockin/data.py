@@ -0,0 +1,127 @@
+'''
+Compact storage for the output of a run.
+
+The Teensy digitizes the signal as 10 or 13-bit integers and computes I,
+Q, R and Phi in single precision, so LockInData keeps them in one
+structured array of binary.RESULT_DTYPE: int16 Signal and float32 I, Q, R
+and Phi, 18 bytes a point rather than 40 as float64 (and another 40 for a
+DataFrame copy). Columns are views into it, and what is derived from them
+(the signal in volts, the amplitude, which is twice R) is computed the
+first time it is asked for and kept:
+
+    data = result.data
+    data.r                  # R as sent, a view
+    data.amplitude_volts    # 2 * R in volts, computed once
+    data.to_dataframe()     # pandas, only when wanted
+
+The records are not copied when the run is saved (export.save writes them
+as they are) or plotted.
+'''
+
+import numpy as np
+from numpy.lib.recfunctions import unstructured_to_structured
+
+from .binary import RESULT_DTYPE
+from .decode import COLUMNS
+
+
+def to_records(values):
+    '''Converts an (n, 5) array of Signal, I, Q, R, Phi to RESULT_DTYPE'''
+    if isinstance(values, LockInData):
+        return values.records
+    if values.dtype == RESULT_DTYPE:
+        return values
+    if values.dtype.names is not None:
+        return values.astype(RESULT_DTYPE)
+    return unstructured_to_structured(np.asarray(values), dtype=RESULT_DTYPE,
+                                      casting='unsafe')
+
+
+class LockInData(object):
+    '''
+    Signal, I, Q, R and Phi of each point of a run.
+    Properties:
+    records - structured array of RESULT_DTYPE
+    volts_per_count - converts ADC counts (and R) to volts
+    '''
+    __slots__ = ("records", "volts_per_count", "_cache")
+
+    def __init__(self, records, volts_per_count=1.0):
+        self.records = to_records(records)
+        self.volts_per_count = volts_per_count
+        self._cache = {}
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, name):
+        '''The column called name (one of decode.COLUMNS), as a view'''
+        return self.records[name]
+
+    @property
+    def nbytes(self):
+        '''Memory held, including the derived columns computed so far'''
+        return self.records.nbytes + sum(a.nbytes for a in self._cache.values())
+
+    @property
+    def signal(self):
+        return self.records['Signal']
+
+    @property
+    def i(self):
+        return self.records['I']
+
+    @property
+    def q(self):
+        return self.records['Q']
+
+    @property
+    def r(self):
+        return self.records['R']
+
+    @property
+    def phi(self):
+        return self.records['Phi']
+
+    def _derived(self, name, compute):
+        if name not in self._cache:
+            self._cache[name] = compute()
+        return self._cache[name]
+
+    @property
+    def signal_volts(self):
+        '''Signal in volts (float32, computed once)'''
+        return self._derived('signal_volts', lambda: np.multiply(
+            self.signal, self.volts_per_count, dtype=np.float32))
+
+    @property
+    def amplitude(self):
+        '''Amplitude in ADC counts, twice R, as in the CSV files (computed once)'''
+        return self._derived('amplitude', lambda: 2 * self.r)
+
+    @property
+    def amplitude_volts(self):
+        '''Amplitude in volts (float32, computed once)'''
+        return self._derived('amplitude_volts', lambda: np.multiply(
+            self.r, np.float32(2 * self.volts_per_count)))
+
+    def values(self, columns=COLUMNS):
+        '''The columns as an (n, len(columns)) float64 array, a new copy'''
+        out = np.empty((len(self), len(columns)))
+        for k, name in enumerate(columns):
+            out[:, k] = self.records[name]
+        return out
+
+    def to_dataframe(self):
+        '''The columns as a pandas DataFrame (pandas is imported on demand)'''
+        import pandas as pd
+        return pd.DataFrame(dict((name, self.records[name]) for name in COLUMNS),
+                            columns=COLUMNS, copy=False)
+
+    def head(self, n=5):
+        '''The first n points as a table of text, for printing'''
+        lines = ["%6s" % "" + "".join("%12s" % name for name in COLUMNS)]
+        for index, row in enumerate(self.records[:n]):
+            lines.append("%6d%12d" % (index, row['Signal'])
+                         + "".join("%12.6g" % row[name] for name in COLUMNS[1:]))
+        return "\n".join(lines)
@@ -0,0 +1,161 @@
+'''
+Reducing the lock-in output to the rate its bandwidth needs.
+
+The output is low pass filtered at cutoff (a few Hz), but one point is
+computed for every sample, at the full sampling rate. A point every
+factor samples loses nothing as long as the output sampled at
+sampling_rate / factor does not alias: auto_factor picks the largest
+factor for which the lock-in filter (stages single poles at cutoff) has
+already fallen by ATTENUATION_DB at the Nyquist frequency of the reduced
+rate, so more stages allow more decimation.
+
+What is left above that, chiefly the ripple at twice the reference
+frequency, must not fold back onto the output, so I and Q go through an
+anti-aliasing filter first:
+
+Decimator, on the host (Raw and Continuous Mode), is a polyphase FIR
+decimator: a Blackman windowed sinc of TAPS_PER_PHASE * factor + 1 taps
+cutting off at the reduced Nyquist frequency, evaluated only at the
+points kept, so it costs about TAPS_PER_PHASE multiplications per sample
+and column. It is fed blocks of any size and keeps its state between
+them. The filter is symmetric, so it delays I and Q by half its length
+(group_delay, TAPS_PER_PHASE / 2 * factor rows); each point is given out
+once the rows after it have arrived, so that it is centred on the row it
+is at, and the last group_delay rows of a run give no point.
+
+In Normal Mode the Teensy does it (the instruction's dec field), so that
+factor times fewer points are sent. It averages I and Q over each factor
+points (a first order CIC filter, which needs no multiplications), and
+boxcar_decimate does the same here, for the simulator.
+
+Either way, point k of the output is at point (k + 1) * factor - 1 of the
+full rate output, with R and Phi computed from the filtered I and Q and
+Signal the sample at that point (the Teensy's averages are centred
+(factor - 1) / 2 rows before it). window_before and window_after give
+the rows around a point that it is filtered from. The full rate signal
+is only kept when asked for (RunSettings.keep_signal, Raw Mode).
+'''
+
+import math
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+ATTENUATION_DB = 40.0 # of the lock-in filter at the reduced Nyquist frequency
+TAPS_PER_PHASE = 8
+
+
+def auto_factor(cutoff, sampling_rate, stages, attenuation=ATTENUATION_DB):
+    '''
+    Largest decimation factor at which the lock-in filter has fallen by
+    attenuation (dB) at the Nyquist frequency of the reduced rate
+    '''
+    if stages not in (1, 2, 3):
+        stages = 4
+    # |H(f)|^2 = (1 + (f / cutoff)^2)^-stages for stages single poles
+    nyquist = cutoff * math.sqrt(10 ** (attenuation / (10.0 * stages)) - 1)
+    return max(int(sampling_rate / (2 * nyquist)), 1)
+
+
+def fir_taps(factor, taps_per_phase=TAPS_PER_PHASE):
+    '''Anti-aliasing filter for decimating by factor, with unit gain at DC'''
+    length = taps_per_phase * factor + 1
+    n = np.arange(length) - (length - 1) / 2.0
+    taps = np.sinc(n / factor) * np.blackman(length)
+    return taps / taps.sum()
+
+
+def window_before(factor, boxcar=False, taps_per_phase=TAPS_PER_PHASE):
+    '''Rows of full rate output before a decimated point that it is filtered from'''
+    if factor <= 1:
+        return 0
+    return factor - 1 if boxcar else taps_per_phase * factor // 2
+
+
+def window_after(factor, boxcar=False, taps_per_phase=TAPS_PER_PHASE):
+    '''Rows of full rate output after a decimated point that it is filtered from'''
+    if factor <= 1 or boxcar:
+        return 0
+    return taps_per_phase * factor - taps_per_phase * factor // 2
+
+
+def _recompute(values):
+    '''Sets R and Phi of (n, 5) rows from their I and Q'''
+    values[:, 3] = np.hypot(values[:, 1], values[:, 2])
+    values[:, 4] = np.arctan2(values[:, 2], values[:, 1])
+    return values
+
+
+def boxcar_decimate(values, factor):
+    '''
+    Decimates (n, 5) rows of Signal, I, Q, R, Phi as the sketch does,
+    averaging I and Q over each factor rows; a partial group at the end is
+    dropped
+    '''
+    values = np.asarray(values, dtype=np.float64)
+    if factor <= 1:
+        return values
+    count = len(values) // factor
+    groups = values[:count * factor].reshape(count, factor, values.shape[1])
+    out = np.empty((count, values.shape[1]))
+    out[:, 0] = groups[:, -1, 0]
+    out[:, 1:3] = groups[:, :, 1:3].mean(axis=1)
+    return _recompute(out)
+
+
+class Decimator(object):
+    '''
+    Polyphase FIR decimator of a stream of (n, 5) Signal, I, Q, R, Phi rows.
+    Properties:
+    factor - rows in per row out
+    taps - the anti-aliasing filter
+    group_delay - rows the filter delays I and Q by, which a point is
+                  given out after the row it is at
+    position - number of rows taken in so far (or skipped)
+    '''
+
+    def __init__(self, factor, taps_per_phase=TAPS_PER_PHASE):
+        self.factor = factor
+        self.taps = fir_taps(factor, taps_per_phase)
+        self.group_delay = (len(self.taps) - 1) // 2
+        # the output starts from rest, so the filter does too
+        self._history = np.zeros((len(self.taps) - 1, 3))
+        self.position = 0
+
+    def process(self, values):
+        '''Returns the decimated rows for the next rows of the stream'''
+        values = np.asarray(values, dtype=np.float64)
+        n = len(values)
+        if n == 0:
+            return np.empty((0, 5))
+        # the filter ending at row kept[k] is centred group_delay rows
+        # before it, on row (j + 1) * factor - 1 of the stream
+        first = (self.group_delay + self.factor - 1 - self.position) % self.factor
+        kept = np.arange(first, n, self.factor)
+        kept = kept[self.position + kept >= self.group_delay]
+        rows = np.concatenate((self._history, values[:, 0:3]))
+        self._history = rows[len(rows) - len(self._history):]
+        self.position += n
+        out = np.empty((len(kept), values.shape[1]))
+        if len(kept) == 0:
+            return out
+        # window k ends at row kept[k] of values
+        windows = sliding_window_view(rows[:, 1:3], len(self.taps), axis=0)[kept]
+        out[:, 0] = rows[kept + len(self._history) - self.group_delay, 0]
+        out[:, 1:3] = windows @ self.taps[::-1]
+        return _recompute(out)
+
+    def skip(self, count):
+        '''
+        Steps over count lost rows. The filter is refilled with the last row
+        it had, so the output stays near where it was.
+        '''
+        self._history[:] = self._history[-1]
+        self.position += count
+
+
+def decimate(values, factor):
+    '''Decimates complete (n, 5) rows of a run with a Decimator'''
+    if factor <= 1:
+        return np.asarray(values, dtype=np.float64)
+    return Decimator(factor).process(values)
@@ -0,0 +1,76 @@
+'''
+Vectorized decoding of the ASCII records sent by the Teensy.
+
+Each Normal Mode record is "signal, I, Q, R, phi". Instead of splitting
+and converting every record in a Python loop, the records are joined
+back into one buffer and parsed with one NumPy conversion per chunk of
+records.
+'''
+
+import warnings
+
+import numpy as np
+
+COLUMNS = ["Signal", "I", "Q", "R", "Phi"]
+
+
+def _fromstring(text):
+    '''
+    Parses comma separated numbers with NumPy, or returns None if one of
+    them is bad. On a bad number fromstring either raises or (older NumPy)
+    stops early with a DeprecationWarning, which shows up as a short
+    result, so the caller checks the size.
+    '''
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', DeprecationWarning)
+            return np.fromstring(text, sep=',')
+    except ValueError:
+        return None
+
+
+def decode_records(records, num_fields=len(COLUMNS), terminator=b'E',
+                   chunk_size=1024):
+    '''
+    Decodes a list of comma separated records (bytes, as produced by
+    FrameReader) into an (N, num_fields) float64 array, with one NumPy
+    conversion per chunk.
+    Returns (values, valid): rows of values for malformed records (wrong
+    number of fields or unparsable numbers) are NaN and False in valid.
+    The records are parsed chunk_size at a time, so that a malformed
+    record only sends its own chunk down the slow per-record path.
+    '''
+    n = len(records)
+    if n == 0:
+        return np.empty((0, num_fields)), np.zeros(0, dtype=bool)
+
+    # Records were split on the terminator, so it can't occur inside one
+    # and rejoining with it recovers the received buffer.
+    text = terminator.join(records)
+    raw = np.frombuffer(text, dtype=np.uint8)
+    ends = np.flatnonzero(raw == terminator[0])
+    commas = np.flatnonzero(raw == ord(','))
+    counts = np.bincount(np.searchsorted(ends, commas), minlength=n) + 1
+    valid = counts == num_fields
+    text = text.replace(terminator, b',')
+
+    # NumPy parses each chunk of records in one go; record k is
+    # text[starts[k]:stops[k]]
+    starts = np.concatenate(([0], ends + 1))
+    stops = np.append(ends, len(text))
+    values = np.full((n, num_fields), np.nan)
+    for first in range(0, n, chunk_size):
+        last = min(first + chunk_size, n)
+        if valid[first:last].all():
+            flat = _fromstring(text[starts[first]:stops[last - 1]])
+            if flat is not None and flat.size == (last - first) * num_fields:
+                values[first:last] = flat.reshape(-1, num_fields)
+                continue
+        for k in range(first, last):
+            if not valid[k]:
+                continue
+            try:
+                values[k] = [float(token) for token in records[k].split(b',')]
+            except ValueError:
+                valid[k] = False
+    return values, valid
@@ -0,0 +1,338 @@
+'''
+Host-side lock-in detection on the raw digitized signal.
+
+In Raw Mode the Teensy only sends mySignal and the reference frequency,
+and the mixing and filtering done by mixAndFilter in teensy_lockin.ino
+is reproduced here with vectorized NumPy. mix_and_filter_reference is a
+line-by-line port of the firmware loop, kept for checking the
+vectorized version against.
+
+demodulate does the same at several frequencies at once (harmonics of
+the reference, or a comb), from one capture.
+
+In Continuous Mode the signal arrives a piece at a time for as long as
+the run lasts; StreamingLockIn carries the filter state between pieces so
+that its output matches mix_and_filter of the whole signal.
+'''
+
+import numpy as np
+
+# scipy.signal.lfilter, or None without scipy. scipy is optional, and
+# takes most of a second to import, so it is imported on first use.
+lfilter = None
+_lfilter_loaded = False
+
+NUM_COEFFS = 5 # numCoeffs in the firmware; output starts at n = NUM_COEFFS - 1
+
+
+def get_lfilter():
+    '''Returns scipy.signal.lfilter (importing it the first time), or None'''
+    global lfilter, _lfilter_loaded
+    if not _lfilter_loaded:
+        try:
+            from scipy.signal import lfilter
+        except ImportError: # fall back to pure NumPy
+            lfilter = None
+        # only now, so that other threads never see None while it imports
+        _lfilter_loaded = True
+    return lfilter
+
+
+def filter_coeffs(cutoff, sampling_rate, stages):
+    '''
+    Returns the arrays (a, b) set by calcFilterCoeffs (1 stage) through
+    calcFilterCoeffs4p (4 stages), i.e. the coefficients of
+    y[n] = a[0] x[n] + b[1] y[n-1] + ... + b[4] y[n-4].
+    As in the firmware, any stage count other than 1-3 means 4 stages.
+    '''
+    if stages not in (1, 2, 3):
+        stages = 4
+    filterX = np.exp(-2 * np.pi * cutoff / sampling_rate)
+    a = np.zeros(NUM_COEFFS)
+    b = np.zeros(NUM_COEFFS)
+    a[0] = (1 - filterX) ** stages
+    # (1 - x z^-1)^stages expanded: b[k] = -C(stages, k) (-x)^k
+    binom = 1
+    for k in range(1, stages + 1):
+        binom = binom * (stages - k + 1) // k
+        b[k] = -binom * (-filterX) ** k
+    return a, b
+
+
+def _single_pole(u, filterX, axis=-1, state=None):
+    '''
+    Single-pole low pass y[n] = (1 - x) u[n] + x y[n-1], vectorized as a
+    scaled cumulative sum. The input is processed in blocks short enough
+    that x^-len stays far from overflowing. state is y[-1] (zero if None).
+    filterX may also be an array broadcasting against the other axes of u,
+    to filter each row with its own pole.
+    '''
+    u = np.moveaxis(u, axis, -1)
+    y = np.empty(u.shape)
+    if np.all(np.asarray(filterX) <= 0):
+        y[...] = u
+        return np.moveaxis(y, -1, axis)
+    filterX = np.clip(np.asarray(filterX, dtype=np.float64),
+                      np.finfo(np.float64).tiny, None)[..., None]
+    decay = -np.log(filterX)
+    block = max(1, int(300 / decay.max())) if decay.max() > 0 else u.shape[-1]
+    state = np.zeros(u.shape[:-1]) if state is None else state
+    for start in range(0, u.shape[-1], block):
+        seg = u[..., start:start + block]
+        j = np.arange(seg.shape[-1])
+        grow = np.exp(j * decay) # x^-j
+        shrink = np.exp(-j * decay) # x^j
+        y[..., start:start + block] = shrink * (
+            (1 - filterX) * np.cumsum(seg * grow, axis=-1)
+            + filterX * state[..., None])
+        state = y[..., start + seg.shape[-1] - 1]
+    return np.moveaxis(y, -1, axis)
+
+
+def lowpass(u, cutoff, sampling_rate, stages, axis=-1):
+    '''
+    Applies the firmware's low pass filter to u along axis, starting from
+    zero state.
+    '''
+    a, b = filter_coeffs(cutoff, sampling_rate, stages)
+    lfilter = get_lfilter()
+    if lfilter is not None:
+        return lfilter(a[:1], np.r_[1, -b[1:]], u, axis=axis)
+    # The filter is stages identical single-pole filters in cascade
+    filterX = np.exp(-2 * np.pi * cutoff / sampling_rate)
+    for _ in range(int(np.count_nonzero(b))):
+        u = _single_pole(u, filterX, axis=axis)
+    return u
+
+
+def mix_and_filter(signal, ref_freq, sampling_rate, cutoff, stages):
+    '''
+    Vectorized equivalent of mixAndFilter.
+    Returns an (N - 4, 5) float64 array with columns Signal, I, Q, R, Phi
+    (the rows the firmware prints, starting at n = 4).
+    '''
+    signal = np.asarray(signal, dtype=np.float64)
+    n = np.arange(NUM_COEFFS - 1, len(signal))
+    phase = 2 * np.pi * ref_freq * (n / float(sampling_rate))
+    mixed = np.empty((2, len(n)))
+    np.multiply(signal[n], np.sin(phase), out=mixed[0])
+    np.multiply(signal[n], np.cos(phase), out=mixed[1])
+    I, Q = lowpass(mixed, cutoff, sampling_rate, stages)
+
+    out = np.empty((len(n), 5))
+    out[:, 0] = signal[n]
+    out[:, 1] = I
+    out[:, 2] = Q
+    out[:, 3] = np.hypot(I, Q)
+    out[:, 4] = np.arctan2(Q, I)
+    return out
+
+
+def mix_and_filter_many(signal, ref_freq, sampling_rate, params, first=0):
+    '''
+    mix_and_filter for several (cutoff, stages) pairs at once. signal[i] is
+    sample first + i of the run, and rows are returned from n = 4 on, so a
+    saved Signal column (first = 4) gives a row for every point. The
+    signal is mixed once for all of params. Returns a list of (n, 5)
+    arrays in the order of params.
+    '''
+    signal = np.asarray(signal, dtype=np.float64)
+    skip = max(NUM_COEFFS - 1 - first, 0)
+    x = signal[skip:]
+    n = first + np.arange(skip, len(signal))
+    phase = 2 * np.pi * ref_freq * (n / float(sampling_rate))
+    mixed = np.stack((x * np.sin(phase), x * np.cos(phase)))
+
+    # as in filter_coeffs, any stage count other than 1-3 means 4 stages
+    params = [(cutoff, stages if stages in (1, 2, 3) else 4)
+              for cutoff, stages in params]
+    filtered = {}
+    if get_lfilter() is not None:
+        # The direct form rounds like the firmware does, which matters with
+        # several poles close to 1, so each filter is run on its own
+        for cutoff, stages in set(params):
+            filtered[cutoff, stages] = lowpass(mixed, cutoff, sampling_rate, stages)
+    else:
+        # The filters for all the cutoffs run together as one cascade of
+        # single-pole stages, the output for s stages taken after the s-th
+        cutoffs = sorted(set(cutoff for cutoff, _ in params))
+        filterX = np.exp(-2 * np.pi * np.array(cutoffs, dtype=np.float64)
+                         / sampling_rate)
+        u = np.broadcast_to(mixed, (len(cutoffs),) + mixed.shape)
+        for stage in range(1, max(stages for _, stages in params) + 1):
+            u = _single_pole(u, filterX[:, None])
+            for k, cutoff in enumerate(cutoffs):
+                if (cutoff, stage) in params:
+                    filtered[cutoff, stage] = u[k]
+
+    outputs = []
+    for key in params:
+        I, Q = filtered[key]
+        out = np.empty((len(x), 5))
+        out[:, 0] = x
+        out[:, 1] = I
+        out[:, 2] = Q
+        out[:, 3] = np.hypot(I, Q)
+        out[:, 4] = np.arctan2(Q, I)
+        outputs.append(out)
+    return outputs
+
+
+def demodulate(signal, freqs, sampling_rate, cutoff, stages, first=0,
+               block=65536):
+    '''
+    Lock-in detection of one signal at several frequencies at once, for
+    instance the harmonics of the reference (see harmonic_freqs). Each
+    frequency is mixed and filtered as mix_and_filter does at ref_freq,
+    with the firmware's filter; all of them are filtered together, block
+    points at a time so that memory does not grow with the number of
+    frequencies times points. signal[i] is sample first + i of the run.
+    Returns a (len(freqs), n, 4) float64 array with columns I, Q, R, Phi,
+    for the samples from n = 4 on.
+    '''
+    signal = np.asarray(signal, dtype=np.float64)
+    freqs = np.atleast_1d(np.asarray(freqs, dtype=np.float64))
+    skip = max(NUM_COEFFS - 1 - first, 0)
+    x = signal[skip:]
+    out = np.empty((len(freqs), len(x), 4))
+    a, b = filter_coeffs(cutoff, sampling_rate, stages)
+    num, den = a[:1], np.r_[1, -b[1:]]
+    poles = int(np.count_nonzero(b))
+    filterX = np.exp(-2 * np.pi * cutoff / sampling_rate)
+    lfilter = get_lfilter()
+    if lfilter is not None:
+        state = np.zeros((2, len(freqs), NUM_COEFFS - 1))
+    else:
+        state = [np.zeros((2, len(freqs))) for _ in range(poles)]
+    for start in range(0, len(x), block):
+        seg = x[start:start + block]
+        n = first + skip + start + np.arange(len(seg))
+        phase = 2 * np.pi * freqs[:, None] * (n / float(sampling_rate))
+        mixed = np.empty((2, len(freqs), len(seg)))
+        np.multiply(seg, np.sin(phase), out=mixed[0])
+        np.multiply(seg, np.cos(phase), out=mixed[1])
+        if lfilter is not None:
+            mixed, state = lfilter(num, den, mixed, zi=state)
+        else:
+            for stage in range(poles):
+                mixed = _single_pole(mixed, filterX, state=state[stage])
+                state[stage] = mixed[..., -1]
+        I, Q = mixed
+        rows = slice(start, start + len(seg))
+        out[:, rows, 0] = I
+        out[:, rows, 1] = Q
+        out[:, rows, 2] = np.hypot(I, Q)
+        out[:, rows, 3] = np.arctan2(Q, I)
+    return out
+
+
+def harmonic_freqs(ref_freq, orders):
+    '''Frequencies of the given harmonic orders of ref_freq (1 is ref_freq)'''
+    return ref_freq * np.asarray(orders, dtype=np.float64)
+
+
+class StreamingLockIn(object):
+    '''
+    mix_and_filter for a signal that arrives in pieces. The sample index
+    and the filter state are carried from one piece to the next.
+    Properties:
+    ref_freq, sampling_rate, cutoff, stages - as for mix_and_filter
+    index - number of samples processed or skipped so far
+    '''
+
+    def __init__(self, ref_freq, sampling_rate, cutoff, stages):
+        self.ref_freq = ref_freq
+        self.sampling_rate = sampling_rate
+        self.cutoff = cutoff
+        self.stages = stages
+        self.index = 0
+        a, b = filter_coeffs(cutoff, sampling_rate, stages)
+        self._num = a[:1]
+        self._den = np.r_[1, -b[1:]]
+        self._poles = int(np.count_nonzero(b))
+        self._filterX = np.exp(-2 * np.pi * cutoff / sampling_rate)
+        self._lfilter = get_lfilter()
+        if self._lfilter is not None:
+            self._state = np.zeros((2, NUM_COEFFS - 1))
+        else:
+            self._state = [np.zeros(2) for _ in range(self._poles)]
+
+    def process(self, signal):
+        '''
+        Mixes and filters the next samples. Returns an (n, 5) float64 array
+        with columns Signal, I, Q, R, Phi; as in mix_and_filter, the first
+        NUM_COEFFS - 1 samples of the run give no output.
+        '''
+        signal = np.asarray(signal, dtype=np.float64)
+        first = max(NUM_COEFFS - 1 - self.index, 0)
+        n = self.index + np.arange(first, len(signal))
+        self.index += len(signal)
+        signal = signal[first:]
+        out = np.empty((len(n), 5))
+        if len(n) == 0:
+            return out
+        phase = 2 * np.pi * self.ref_freq * (n / float(self.sampling_rate))
+        mixed = np.empty((2, len(n)))
+        np.multiply(signal, np.sin(phase), out=mixed[0])
+        np.multiply(signal, np.cos(phase), out=mixed[1])
+        if self._lfilter is not None:
+            mixed, self._state = self._lfilter(self._num, self._den, mixed,
+                                         zi=self._state)
+        else:
+            for stage in range(self._poles):
+                mixed = _single_pole(mixed, self._filterX, state=self._state[stage])
+                self._state[stage] = mixed[:, -1]
+        out[:, 0] = signal
+        out[:, 1:3] = mixed.T
+        out[:, 3] = np.hypot(mixed[0], mixed[1])
+        out[:, 4] = np.arctan2(mixed[1], mixed[0])
+        return out
+
+    def skip(self, count):
+        '''
+        Steps over count lost samples. The filter holds its state across
+        the gap, and the reference phase stays aligned with the samples
+        that follow.
+        '''
+        self.index += count
+
+
+def fast_mode_averages(R, phi, num_points):
+    '''
+    Averages as sent in Fast Mode by mixAndFilterFast, which divides the
+    sums over all output points by the number of digitized points.
+    '''
+    return np.sum(R) / num_points, np.sum(phi) / num_points
+
+
+def mix_and_filter_reference(signal, ref_freq, sampling_rate, cutoff, stages):
+    '''
+    Direct port of the mixAndFilter loop (slow, for validation only).
+    Returns the same array as mix_and_filter.
+    '''
+    a, b = filter_coeffs(cutoff, sampling_rate, stages)
+    a = [float(v) for v in a]
+    b = [float(v) for v in b]
+    PI = np.pi
+    yregX = [0.0] * NUM_COEFFS
+    yregY = [0.0] * NUM_COEFFS
+    rows = []
+    for n in range(NUM_COEFFS - 1, len(signal)):
+        ynX = 0.0
+        ynY = 0.0
+        for coeffCtr in range(NUM_COEFFS):
+            sinTerm = np.sin(2 * PI * ref_freq * ((n - coeffCtr) / float(sampling_rate)))
+            cosTerm = np.cos(2 * PI * ref_freq * ((n - coeffCtr) / float(sampling_rate)))
+            ynX = ynX + a[coeffCtr] * float(signal[n - coeffCtr]) * sinTerm + b[coeffCtr] * yregX[coeffCtr]
+            ynY = ynY + a[coeffCtr] * float(signal[n - coeffCtr]) * cosTerm + b[coeffCtr] * yregY[coeffCtr]
+        R = np.sqrt(ynX * ynX + ynY * ynY)
+        phi = np.arctan2(ynY, ynX)
+        rows.append((signal[n], ynX, ynY, R, phi))
+        for coeffCtr in range(NUM_COEFFS - 1, 0, -1):
+            if coeffCtr == 1:
+                yregX[coeffCtr] = ynX
+                yregY[coeffCtr] = ynY
+            else:
+                yregX[coeffCtr] = yregX[coeffCtr - 1]
+                yregY[coeffCtr] = yregY[coeffCtr - 1]
+    return np.array(rows, dtype=np.float64).reshape(-1, 5)
@@ -0,0 +1,328 @@
+'''
+Saving runs in compact binary formats, with their settings.
+
+Data are stored with the dtype of binary.RESULT_DTYPE: int16 Signal and
+float32 I, Q, R and Phi, as the Teensy computes them. Unlike the CSV
+written by Save Data, R is stored as sent, which is half the amplitude; the
+metadata include amplitude_scale to convert it to volts.
+
+    save(path, result)  # .npz, .parquet or .h5/.hdf5 by extension, else CSV
+    records, metadata = load(path)
+
+StreamWriter appends records to a .npy file while a run is in progress,
+so they need not be kept in memory. The file is a standard NumPy array
+file (its header is completed when it is closed) and can be opened with
+np.load(path, mmap_mode='r'); the metadata go in path + '.json'.
+
+SegmentWriter is for Continuous Mode runs of any length: records go into
+a directory of fixed-size .npy segments, each memory mapped while it is
+filled, and with keep_segments only the newest segments are kept, as a
+ring. load_segments opens them again, memory mapped.
+
+pyarrow is needed for Parquet and h5py for HDF5. Both are only imported
+when those formats are used.
+'''
+
+import datetime
+import glob
+import json
+import os
+import struct
+
+import numpy as np
+
+from .binary import RESULT_DTYPE
+from .data import to_records
+from .decode import COLUMNS
+
+METADATA_KEY = 'teensy_lockin' # key of the metadata in Parquet and HDF5 files
+HEADER_SIZE = 256 # bytes of .npy header written by StreamWriter and SegmentWriter
+SEGMENT_INDEX = 'index.json' # describes the segments written by SegmentWriter
+
+
+def run_metadata(result):
+    '''Returns a dict describing the run, saved alongside its data'''
+    settings = result.settings
+    return {"ref_freq": result.ref_freq,
+            "ref_select": settings.ref_select,
+            "freq_dur": settings.freq_dur,
+            "sampling_rate": settings.sampling_rate,
+            "num_points": settings.num_points,
+            "cutoff": settings.cutoff,
+            "stages": settings.stages,
+            "mode": settings.mode,
+            "wire_format": settings.wire_format,
+            "lut_size": settings.lut_size,
+            "pdb_mod": settings.pdb_mod,
+            "ref_hint": settings.ref_hint,
+            "ref_check": settings.ref_check,
+            "ref_estimate": result.ref_estimate,
+            "first_index": settings.first_index(),
+            "decimation": settings.decimation_factor(),
+            "teensy_model": settings.teensy_model,
+            "volts_per_count": settings.volts_per_count(),
+            "amplitude_scale": 2 * settings.volts_per_count(),
+            "saved": datetime.datetime.now().isoformat(timespec='seconds')}
+
+
+def save(path, result, metadata=None):
+    '''
+    Saves a RunResult in the format given by the extension of path: CSV,
+    as Save Data always wrote, for any extension not listed above
+    '''
+    if metadata is None:
+        metadata = run_metadata(result)
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.npz':
+        save_npz(path, to_records(result.data), metadata)
+    elif ext == '.parquet':
+        save_parquet(path, to_records(result.data), metadata)
+    elif ext in ('.h5', '.hdf5'):
+        save_hdf5(path, to_records(result.data), metadata)
+    else:
+        result.save_csv(path)
+
+
+def load(path):
+    '''
+    Returns (records, metadata) from a file written by save or StreamWriter,
+    or a directory written by SegmentWriter (its segments concatenated)
+    '''
+    if os.path.isdir(path):
+        segments, metadata = load_segments(path)
+        if not segments:
+            return np.zeros(0, dtype=RESULT_DTYPE), metadata
+        return np.concatenate(segments), metadata
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.npz':
+        return load_npz(path)
+    if ext == '.parquet':
+        return load_parquet(path)
+    if ext in ('.h5', '.hdf5'):
+        return load_hdf5(path)
+    if ext == '.npy':
+        return load_stream(path)
+    raise ValueError("Unknown file type: " + ext)
+
+
+def save_npz(path, records, metadata):
+    columns = dict((name, records[name]) for name in COLUMNS)
+    np.savez(path, metadata=np.array(json.dumps(metadata)), **columns)
+
+
+def load_npz(path):
+    with np.load(path) as f:
+        records = np.empty(len(f[COLUMNS[0]]), dtype=RESULT_DTYPE)
+        for name in COLUMNS:
+            records[name] = f[name]
+        return records, json.loads(str(f['metadata']))
+
+
+def save_parquet(path, records, metadata):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    table = pa.table(dict((name, records[name]) for name in COLUMNS))
+    table = table.replace_schema_metadata({METADATA_KEY: json.dumps(metadata)})
+    pq.write_table(table, path)
+
+
+def load_parquet(path):
+    import pyarrow.parquet as pq
+    table = pq.read_table(path)
+    records = np.empty(table.num_rows, dtype=RESULT_DTYPE)
+    for name in COLUMNS:
+        records[name] = table.column(name).to_numpy()
+    metadata = json.loads(table.schema.metadata[METADATA_KEY.encode()])
+    return records, metadata
+
+
+def save_hdf5(path, records, metadata):
+    import h5py
+    with h5py.File(path, 'w') as f:
+        dataset = f.create_dataset('data', data=records)
+        dataset.attrs[METADATA_KEY] = json.dumps(metadata)
+
+
+def load_hdf5(path):
+    import h5py
+    with h5py.File(path, 'r') as f:
+        dataset = f['data']
+        return dataset[()].astype(RESULT_DTYPE), json.loads(dataset.attrs[METADATA_KEY])
+
+
+def load_stream(path):
+    '''Returns (records, metadata) of a StreamWriter file, memory mapped'''
+    records = np.load(path, mmap_mode='r')
+    metadata = {}
+    if os.path.exists(path + '.json'):
+        with open(path + '.json') as f:
+            metadata = json.load(f)
+    return records, metadata
+
+
+def load_segments(directory):
+    '''
+    Returns (segments, metadata) for a SegmentWriter directory: a list of
+    memory mapped record arrays, oldest first, and the metadata, which
+    include the index of the first record kept ("first").
+    '''
+    with open(os.path.join(directory, SEGMENT_INDEX)) as f:
+        index = json.load(f)
+    segments = [np.load(os.path.join(directory, name), mmap_mode='r')
+                for name in index["segments"]]
+    metadata = dict(index["metadata"])
+    metadata.update(first=index["first"], count=index["count"])
+    return segments, metadata
+
+
+def _write_npy_header(f, count):
+    '''Writes a .npy header of HEADER_SIZE bytes for count records'''
+    header = "{'descr': %r, 'fortran_order': False, 'shape': (%d,), }" % (
+        np.lib.format.dtype_to_descr(RESULT_DTYPE), count)
+    header = header.ljust(HEADER_SIZE - 10 - 1) + '\n'
+    f.write(b'\x93NUMPY\x01\x00' + struct.pack('<H', len(header))
+            + header.encode('latin1'))
+
+
+class StreamWriter(object):
+    '''
+    Appends records to a .npy file as they arrive.
+    The header is written first with room for any number of records and
+    rewritten with the final count by close(). Usable as a context manager.
+    Properties:
+    path - the file written
+    count - number of records written so far
+    metadata - dict saved to path + '.json' when the file is closed
+    '''
+
+    def __init__(self, path, metadata=None):
+        self.path = path
+        self.count = 0
+        self.metadata = dict(metadata or {})
+        self._file = open(path, 'wb')
+        _write_npy_header(self._file, self.count)
+
+    def append(self, values):
+        '''Writes an (n, 5) array of Signal, I, Q, R, Phi or RESULT_DTYPE records'''
+        records = to_records(values)
+        self._file.write(records.tobytes())
+        self.count += len(records)
+
+    def close(self, metadata=None):
+        '''Completes the header and writes the metadata'''
+        if self._file is None:
+            return
+        if metadata is not None:
+            self.metadata.update(metadata)
+        self._file.seek(0)
+        _write_npy_header(self._file, self.count)
+        self._file.close()
+        self._file = None
+        with open(self.path + '.json', 'w') as f:
+            json.dump(self.metadata, f, indent=1)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SegmentWriter(object):
+    '''
+    Writes records to a directory of .npy files of segment_points records
+    each. The segment being filled is memory mapped, so memory use does not
+    grow with the length of the run. If keep_segments is given, the oldest
+    segment is deleted whenever a new one would make more. index.json in the
+    directory lists the segments and is rewritten as each one is completed.
+    Usable as a context manager.
+    Properties:
+    directory - where the segments are written
+    segment_points - records per segment
+    keep_segments - number of segments kept on disk, or None to keep all
+    count - number of records written so far
+    first - index of the oldest record still on disk
+    segments - file names of the segments on disk, oldest first
+    metadata - dict saved in index.json
+    '''
+
+    def __init__(self, directory, segment_points=1000000, keep_segments=None,
+                 metadata=None):
+        self.directory = directory
+        self.segment_points = segment_points
+        self.keep_segments = keep_segments
+        self.count = 0
+        self.first = 0
+        self.segments = []
+        self.metadata = dict(metadata or {})
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        for old in glob.glob(os.path.join(directory, 'segment_*.npy')):
+            os.remove(old)
+        self._map = None
+        self._pos = 0 # records in the current segment
+        self._number = 0 # number of the next segment file
+
+    def _open_segment(self):
+        name = 'segment_%06d.npy' % self._number
+        self._number += 1
+        path = os.path.join(self.directory, name)
+        with open(path, 'wb') as f:
+            _write_npy_header(f, self.segment_points)
+            f.truncate(HEADER_SIZE + self.segment_points * RESULT_DTYPE.itemsize)
+        self._map = np.memmap(path, dtype=RESULT_DTYPE, mode='r+',
+                              offset=HEADER_SIZE, shape=(self.segment_points,))
+        self._pos = 0
+        self.segments.append(name)
+        if self.keep_segments is not None and len(self.segments) > self.keep_segments:
+            os.remove(os.path.join(self.directory, self.segments.pop(0)))
+            self.first += self.segment_points
+
+    def _close_segment(self):
+        '''Unmaps the current segment, trimming it if it is not full'''
+        self._map.flush()
+        self._map = None
+        if self._pos < self.segment_points:
+            path = os.path.join(self.directory, self.segments[-1])
+            with open(path, 'r+b') as f:
+                _write_npy_header(f, self._pos)
+                f.truncate(HEADER_SIZE + self._pos * RESULT_DTYPE.itemsize)
+
+    def append(self, values):
+        '''Writes an (n, 5) array of Signal, I, Q, R, Phi or RESULT_DTYPE records'''
+        records = to_records(values)
+        done = 0
+        while done < len(records):
+            if self._map is None:
+                self._open_segment()
+            n = min(len(records) - done, self.segment_points - self._pos)
+            self._map[self._pos:self._pos + n] = records[done:done + n]
+            self._pos += n
+            self.count += n
+            done += n
+            if self._pos == self.segment_points:
+                self._close_segment()
+                self._write_index()
+
+    def _write_index(self):
+        index = {"segment_points": self.segment_points,
+                 "count": self.count,
+                 "first": self.first,
+                 "segments": self.segments,
+                 "metadata": self.metadata}
+        with open(os.path.join(self.directory, SEGMENT_INDEX), 'w') as f:
+            json.dump(index, f, indent=1)
+
+    def close(self, metadata=None):
+        '''Completes the last segment and writes the index'''
+        if metadata is not None:
+            self.metadata.update(metadata)
+        if self._map is not None:
+            self._close_segment()
+        self._write_index()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,159 @@
+'''
+Estimating the frequency of the measured signal from the samples
+themselves.
+
+The sketch measures an external reference by counting its edges for
+countPeriod_ms, which takes 5 s by default and resolves the frequency to
+1000 / countPeriod_ms Hz. The signal digitized in the run is at the
+reference frequency too, and its spectrum locates it much more finely:
+
+fft_peak finds the largest peak of the Hann windowed spectrum (within a
+band, if given) and interpolates between bins with a parabola through
+the log magnitudes, to a small fraction of a bin (sampling_rate / N Hz).
+refine_peak then maximizes the magnitude of the windowed discrete time
+Fourier transform around that, a golden section search costing one pass
+over the signal per step, which removes what is left of the bias of the
+interpolation. estimate_freq does both and gives up (returns None) when
+the peak does not stand clear of the noise, as it won't for a signal
+buried in noise, which is what a lock-in is for.
+
+zero_crossing_freq fits a straight line to the times of the rising zero
+crossings instead. It is cheaper but needs a clean signal.
+
+    freq = estimate_freq(result.column("Signal"), 10000, guess=result.ref_freq)
+'''
+
+import math
+
+import numpy as np
+
+MIN_SNR = 30.0 # peak power over the median power of the spectrum
+MIN_POINTS = 64 # fewer samples than this are not worth estimating from
+GOLDEN = (math.sqrt(5) - 1) / 2
+
+
+def _prepare(signal):
+    x = np.asarray(signal, dtype=np.float64)
+    return x - x.mean()
+
+
+def fft_peak(signal, sampling_rate, low=None, high=None):
+    '''
+    Frequency (Hz) of the largest peak of the spectrum between low and
+    high (Hz), interpolated between bins, and its power over the median
+    power of the whole spectrum. Returns (freq, snr).
+    '''
+    x = _prepare(signal)
+    n = len(x)
+    power = np.abs(np.fft.rfft(x * np.hanning(n))) ** 2
+    power[0] = 0 # what is left of the mean
+    bin_hz = sampling_rate / float(n)
+    first = 1 if low is None else max(int(math.floor(low / bin_hz)), 1)
+    last = len(power) - 1 if high is None else min(int(math.ceil(high / bin_hz)),
+                                                   len(power) - 1)
+    if last < first:
+        return None, 0.0
+    k = first + int(np.argmax(power[first:last + 1]))
+    offset = 0.0
+    if 0 < k < len(power) - 1 and power[k - 1] > 0 and power[k + 1] > 0:
+        left, mid, right = np.log(power[k - 1:k + 2])
+        denominator = left - 2 * mid + right
+        if denominator < 0:
+            offset = 0.5 * (left - right) / denominator
+    noise = np.median(power[1:])
+    snr = power[k] / noise if noise > 0 else math.inf
+    return (k + offset) * bin_hz, snr
+
+
+def _dtft_power(x, window, t, freq):
+    '''Power of the windowed DTFT of x at freq (t is in seconds)'''
+    phase = 2 * np.pi * freq * t
+    return np.dot(x, window * np.cos(phase)) ** 2 + np.dot(x, window * np.sin(phase)) ** 2
+
+
+def refine_peak(signal, sampling_rate, freq, width=None, tolerance=1e-6, max_steps=60):
+    '''
+    Frequency (Hz) within width (Hz, one bin by default) of freq at which
+    the Hann windowed DTFT of the signal is largest, found by golden
+    section search to tolerance (relative).
+    '''
+    x = _prepare(signal)
+    n = len(x)
+    if width is None:
+        width = sampling_rate / float(n)
+    window = np.hanning(n)
+    t = np.arange(n) / float(sampling_rate)
+    a, b = freq - width, freq + width
+    c, d = b - GOLDEN * (b - a), a + GOLDEN * (b - a)
+    pc, pd = _dtft_power(x, window, t, c), _dtft_power(x, window, t, d)
+    for step in range(max_steps):
+        if b - a <= tolerance * freq:
+            break
+        if pc > pd:
+            b, d, pd = d, c, pc
+            c = b - GOLDEN * (b - a)
+            pc = _dtft_power(x, window, t, c)
+        else:
+            a, c, pc = c, d, pd
+            d = a + GOLDEN * (b - a)
+            pd = _dtft_power(x, window, t, d)
+    return (a + b) / 2
+
+
+def zero_crossing_freq(signal, sampling_rate, guess=None):
+    '''
+    Frequency (Hz) from a least squares fit of the times of the rising
+    zero crossings, interpolated between samples. A crossing only counts
+    once the signal has been below minus half its standard deviation, so
+    noise near zero does not add crossings. guess (Hz), if given, numbers
+    the cycles so that a missed crossing does not bias the result.
+    Returns None if fewer than 2 crossings are found.
+    '''
+    x = _prepare(signal)
+    level = 0.5 * x.std()
+    times = []
+    # hysteresis needs the history of the signal, so this is a loop over
+    # the (few) candidate crossings only
+    below = np.flatnonzero(x < -level)
+    rising = np.flatnonzero((x[:-1] < 0) & (x[1:] >= 0))
+    if len(below) == 0 or len(rising) == 0:
+        return None
+    next_below = np.searchsorted(below, rising, side='right')
+    last_below = -1
+    for k, i in enumerate(rising):
+        armed = next_below[k] > 0 and below[next_below[k] - 1] > last_below
+        if armed:
+            times.append(i + x[i] / (x[i] - x[i + 1]))
+            last_below = i
+    if len(times) < 2:
+        return None
+    times = np.array(times) / float(sampling_rate)
+    if guess:
+        cycles = np.rint((times - times[0]) * guess)
+    else:
+        cycles = np.arange(len(times))
+    if cycles[-1] == 0:
+        return None
+    period = np.polyfit(cycles, times, 1)[0]
+    return 1.0 / period
+
+
+def estimate_freq(signal, sampling_rate, guess=None, span=None, min_snr=MIN_SNR):
+    '''
+    Frequency (Hz) of the signal from its spectrum (fft_peak, then
+    refine_peak), or None if there are too few points or the peak is not
+    min_snr above the noise. With a guess (Hz), only the band within span
+    (Hz; by default 1% of the guess or 3 bins, whichever is wider) is
+    searched, so a harmonic or interference elsewhere is not picked up.
+    '''
+    if signal is None or len(signal) < MIN_POINTS:
+        return None
+    low = high = None
+    if guess:
+        if span is None:
+            span = max(0.01 * guess, 3.0 * sampling_rate / len(signal))
+        low, high = guess - span, guess + span
+    freq, snr = fft_peak(signal, sampling_rate, low, high)
+    if freq is None or snr < min_snr:
+        return None
+    return refine_peak(signal, sampling_rate, freq)
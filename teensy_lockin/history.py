@@ -0,0 +1,410 @@
+'''
+A record of every run, in an SQLite database that can be queried later.
+
+RunHistory keeps one row per run: the settings of the instruction, the
+reference frequency, the averages with their standard errors, how the
+run ended, the time spent in each phase and the path of the file holding
+its data. Given a data directory, it also saves the data of each run
+there (as .npz, see export.py), so no run is lost for want of clicking
+Save Data. Those files can be limited by age (keep_days) and total size
+(max_bytes): the oldest are deleted, and the rows pointing to them are
+left without a data_path. With save_data False, runs are recorded
+without their data.
+
+record only puts the run on a queue and returns; a background thread
+saves the data and inserts the rows in batches, one transaction for each,
+so recording never holds up the next acquisition. The database is in
+write-ahead log mode, so it can be queried while runs are being written.
+
+    history = RunHistory('runs.db', data_dir='runs')
+    history.record(result, port='/dev/ttyACM0')
+    ...
+    history.flush() # wait for the queued runs to be written
+    for row in history.find(freq=1000, stages=2, since='2026-10-11'):
+        print(row["finished"], row["amplitude"], row["data_path"])
+
+From the command line:
+
+    python -m teensy_lockin.history runs.db --freq 1000 --stages 2 --since 2026-10-11
+'''
+
+import argparse
+import datetime
+import glob
+import json
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+
+from . import export
+from .client import INTERNAL
+
+BATCH_SIZE = 100 # most runs inserted in one transaction
+FLUSH_INTERVAL = 1.0 # s a queued run waits for others to join its batch
+FREQ_TOLERANCE = 0.01 # relative difference accepted by find(freq=...)
+
+# column name and SQLite type, in table order after the id
+FIELDS = [("finished", "TEXT"), # local time the run was recorded, ISO 8601
+          ("finished_at", "REAL"), # the same, in seconds since the epoch
+          ("port", "TEXT"),
+          ("status", "TEXT"),
+          ("error", "TEXT"),
+          ("ref_select", "INTEGER"),
+          ("freq_dur", "INTEGER"),
+          ("sampling_rate", "INTEGER"),
+          ("num_points", "INTEGER"),
+          ("cutoff", "REAL"),
+          ("stages", "INTEGER"),
+          ("mode", "INTEGER"),
+          ("wire_format", "INTEGER"),
+          ("lut_size", "INTEGER"),
+          ("pdb_mod", "INTEGER"),
+          ("teensy_model", "TEXT"),
+          ("percent", "INTEGER"),
+          ("ref_freq", "REAL"), # measured, or the internal reference made
+          ("points", "INTEGER"),
+          ("amplitude", "REAL"),
+          ("amplitude_sem", "REAL"),
+          ("phase", "REAL"),
+          ("phase_sem", "REAL"),
+          ("malformed", "INTEGER"),
+          ("missing_blocks", "INTEGER"),
+          ("bytes_read", "INTEGER"),
+          ("duration", "REAL"), # s, total of the timings
+          ("timings", "TEXT"), # JSON object of phase to seconds
+          ("data_path", "TEXT")]
+COLUMNS = ["id"] + [name for name, kind in FIELDS]
+INDEXES = {"runs_finished": "finished_at",
+           "runs_freq": "ref_freq, finished_at",
+           "runs_filter": "stages, cutoff, finished_at",
+           "runs_mode": "mode, finished_at",
+           "runs_port": "port, finished_at"}
+
+
+def timestamp(value):
+    '''
+    Seconds since the epoch for a datetime, a date, an ISO 8601 string
+    (local time) or a number, which is returned as it is
+    '''
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        value = datetime.datetime.fromisoformat(value)
+    if not isinstance(value, datetime.datetime): # a date
+        value = datetime.datetime.combine(value, datetime.time())
+    return value.timestamp()
+
+
+def run_row(settings, result=None, port=None, error=None, data_path=None,
+            finished_at=None):
+    '''The history row of a run as a dict of FIELDS'''
+    if finished_at is None:
+        finished_at = time.time()
+    row = dict.fromkeys(name for name, kind in FIELDS)
+    row["finished_at"] = finished_at
+    row["finished"] = datetime.datetime.fromtimestamp(finished_at).isoformat(
+        timespec='milliseconds')
+    row["port"] = port
+    for name in ("ref_select", "freq_dur", "sampling_rate", "num_points",
+                 "cutoff", "stages", "mode", "wire_format", "lut_size",
+                 "pdb_mod", "teensy_model", "percent"):
+        row[name] = getattr(settings, name)
+    if settings.ref_select == INTERNAL:
+        row["ref_freq"] = settings.actual_internal_freq()
+    row["data_path"] = data_path
+    if error is not None:
+        row["status"] = "failed"
+        row["error"] = str(error)
+    if result is None:
+        row["status"] = row["status"] or "failed"
+        return row
+    if error is None:
+        row["status"] = result.status()
+    summary = result.summary()
+    if summary["ref_freq"] is None:
+        del summary["ref_freq"]
+    row.update(summary)
+    row["malformed"] = result.malformed
+    row["missing_blocks"] = result.missing_blocks
+    row["bytes_read"] = result.bytes_read
+    row["duration"] = result.timings.total()
+    row["timings"] = json.dumps(result.timings.as_dict())
+    return row
+
+
+class RunHistory(object):
+    '''
+    Database of runs, written in the background.
+    Properties:
+    path - the SQLite database file
+    data_dir - directory the data of each run are saved in, or None to
+               only record the path given to record
+    save_data - if False, the data of the runs recorded are not saved in
+                data_dir
+    keep_days - data files in data_dir older than this (days) are deleted,
+                or None to keep them
+    max_bytes - the oldest data files in data_dir are deleted to keep
+                their total size under this, or None for no limit
+    batch_size - most runs inserted in one transaction
+    flush_interval - how long a queued run waits for others to join its batch (s)
+    log - function called with messages about failures
+    '''
+
+    def __init__(self, path, data_dir=None, batch_size=BATCH_SIZE,
+                 flush_interval=FLUSH_INTERVAL, log=print, save_data=True,
+                 keep_days=None, max_bytes=None):
+        self.path = path
+        self.data_dir = data_dir
+        self.save_data = save_data
+        self.keep_days = keep_days
+        self.max_bytes = max_bytes
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.log = log
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        if data_dir is not None:
+            os.makedirs(data_dir, exist_ok=True)
+        with self._connect() as db:
+            self._create(db)
+        db.close()
+        self._queue = queue.Queue()
+        self._writer = threading.Thread(target=self._write, daemon=True)
+        self._writer.start()
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=30)
+        db.row_factory = sqlite3.Row
+        return db
+
+    @staticmethod
+    def _create(db):
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("CREATE TABLE IF NOT EXISTS runs (id INTEGER PRIMARY KEY, %s)"
+                   % ", ".join("%s %s" % field for field in FIELDS))
+        for name, columns in INDEXES.items():
+            db.execute("CREATE INDEX IF NOT EXISTS %s ON runs (%s)" % (name, columns))
+
+    def record(self, result=None, settings=None, port=None, error=None,
+               data_path=None):
+        '''
+        Queues a run for writing and returns at once. result is its
+        RunResult (None if it failed before one was made, in which case
+        settings is needed); error is the exception it failed with, if
+        any; data_path is where its data were saved or streamed. Without
+        data_path, the data (if any) are saved in data_dir, unless
+        save_data is False.
+        '''
+        if settings is None:
+            settings = result.settings
+        self._queue.put((settings, result, port, error, data_path, time.time(),
+                         self.save_data))
+
+    def flush(self):
+        '''Waits until every run recorded so far has been written'''
+        self._queue.join()
+
+    def close(self):
+        '''Writes the queued runs and stops the writer thread'''
+        if self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
+
+    def _write(self):
+        '''The writer thread: inserts the queued runs a batch at a time'''
+        db = self._connect()
+        done = False
+        while not done:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while batch[-1] is not None and len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get(
+                        timeout=max(deadline - time.monotonic(), 0)))
+                except queue.Empty:
+                    break
+            if batch[-1] is None:
+                done = True
+            rows = []
+            for item in batch:
+                if item is None:
+                    continue
+                # a run that cannot be recorded must not stop the writer
+                try:
+                    rows.append(self._row(*item))
+                except Exception as e:
+                    self.log("Could not record a run:", e)
+            try:
+                with db:
+                    db.executemany("INSERT INTO runs (%s) VALUES (%s)"
+                                   % (", ".join(COLUMNS[1:]),
+                                      ", ".join("?" * len(COLUMNS[1:]))),
+                                   [[row[name] for name in COLUMNS[1:]] for row in rows])
+            except sqlite3.Error as e:
+                self.log("Could not record %d run(s):" % len(rows), e)
+            if rows:
+                self._prune(db)
+            for item in batch:
+                self._queue.task_done()
+        db.close()
+
+    def _row(self, settings, result, port, error, data_path, finished_at, save):
+        if (data_path is None and save and self.data_dir is not None
+                and result is not None and result.data is not None):
+            name = datetime.datetime.fromtimestamp(finished_at).strftime(
+                "run_%Y%m%d_%H%M%S_%f.npz")
+            data_path = os.path.join(self.data_dir, name)
+            try:
+                export.save(data_path, result)
+            except Exception as e:
+                self.log("Could not save the data of a run:", e)
+                data_path = None
+        return run_row(settings, result, port, error, data_path, finished_at)
+
+    def _prune(self, db):
+        '''
+        Deletes the data files saved in data_dir that are older than
+        keep_days, and then the oldest ones until they fit in max_bytes
+        '''
+        if self.data_dir is None or (self.keep_days is None and self.max_bytes is None):
+            return
+        # the names sort in the order the runs finished
+        paths = sorted(glob.glob(os.path.join(self.data_dir, "run_*.npz")))
+        try:
+            files = [(path, os.stat(path)) for path in paths]
+        except OSError as e:
+            self.log("Could not list the saved data:", e)
+            return
+        total = sum(stat.st_size for path, stat in files)
+        oldest = None if self.keep_days is None else time.time() - self.keep_days * 86400
+        removed = []
+        for path, stat in files:
+            if not ((oldest is not None and stat.st_mtime < oldest)
+                    or (self.max_bytes is not None and total > self.max_bytes)):
+                break
+            try:
+                os.remove(path)
+            except OSError as e:
+                self.log("Could not delete the data of a run:", e)
+                continue
+            total -= stat.st_size
+            removed.append(path)
+        if not removed:
+            return
+        try:
+            with db:
+                db.executemany("UPDATE runs SET data_path = NULL WHERE data_path = ?",
+                               [(path,) for path in removed])
+        except sqlite3.Error as e:
+            self.log("Could not clear the data paths of %d run(s):" % len(removed), e)
+
+    def find(self, since=None, until=None, freq=None, tolerance=FREQ_TOLERANCE,
+             stages=None, cutoff=None, mode=None, port=None, status=None,
+             limit=None):
+        '''
+        Returns the runs matching all the criteria given, newest first, as
+        a list of dicts of COLUMNS. since and until are datetimes, dates,
+        ISO 8601 strings or seconds since the epoch; freq matches a
+        reference frequency within tolerance (relative) of it. Runs still
+        queued are not seen until they are written (see flush).
+        '''
+        where = []
+        params = []
+        if since is not None:
+            where.append("finished_at >= ?")
+            params.append(timestamp(since))
+        if until is not None:
+            where.append("finished_at < ?")
+            params.append(timestamp(until))
+        if freq is not None:
+            where.append("ref_freq BETWEEN ? AND ?")
+            params += [freq * (1 - tolerance), freq * (1 + tolerance)]
+        for name, value in (("stages", stages), ("cutoff", cutoff),
+                            ("mode", mode), ("port", port), ("status", status)):
+            if value is not None:
+                where.append("%s = ?" % name)
+                params.append(value)
+        sql = "SELECT * FROM runs"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY finished_at DESC"
+        if limit is not None:
+            sql += " LIMIT %d" % limit
+        db = self._connect()
+        try:
+            return [dict(row) for row in db.execute(sql, params)]
+        finally:
+            db.close()
+
+    def count(self):
+        '''Number of runs written'''
+        db = self._connect()
+        try:
+            return db.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+        finally:
+            db.close()
+
+    def to_dataframe(self, **criteria):
+        '''find(**criteria) as a pandas DataFrame indexed by id (pandas is imported on demand)'''
+        import pandas as pd
+        return pd.DataFrame(self.find(**criteria), columns=COLUMNS).set_index("id")
+
+    @staticmethod
+    def load(row):
+        '''The (records, metadata) of the data file of a run found, see export.load'''
+        if row["data_path"] is None:
+            raise ValueError("No data were saved for run %s" % row["id"])
+        return export.load(row["data_path"])
+
+
+LIST_COLUMNS = ["id", "finished", "port", "status", "ref_freq", "cutoff",
+                "stages", "mode", "points", "amplitude", "phase", "data_path"]
+
+
+def make_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m teensy_lockin.history",
+        description="List runs recorded in a run history database.")
+    parser.add_argument("database", help="the history database")
+    parser.add_argument("--since", help="runs from this date or time (ISO 8601)")
+    parser.add_argument("--until", help="runs before this date or time (ISO 8601)")
+    parser.add_argument("--freq", type=float, metavar="HZ",
+                        help="runs at this reference frequency")
+    parser.add_argument("--tolerance", type=float, default=FREQ_TOLERANCE,
+                        help="relative tolerance of --freq (default %g)" % FREQ_TOLERANCE)
+    parser.add_argument("--stages", type=int, choices=[1, 2, 3, 4])
+    parser.add_argument("--cutoff", type=float)
+    parser.add_argument("--port")
+    parser.add_argument("--status")
+    parser.add_argument("--limit", type=int)
+    parser.add_argument("--json", action="store_true",
+                        help="print one JSON object per run, with every column")
+    return parser
+
+
+def main(argv=None):
+    args = make_parser().parse_args(argv)
+    if not os.path.exists(args.database):
+        print("No such database:", args.database, file=sys.stderr)
+        return 1
+    history = RunHistory(args.database)
+    rows = history.find(args.since, args.until, args.freq, args.tolerance,
+                        args.stages, args.cutoff, port=args.port,
+                        status=args.status, limit=args.limit)
+    history.close()
+    if args.json:
+        for row in rows:
+            print(json.dumps(row))
+    else:
+        print("\t".join(LIST_COLUMNS))
+        for row in rows:
+            print("\t".join("" if row[name] is None else str(row[name])
+                            for name in LIST_COLUMNS))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
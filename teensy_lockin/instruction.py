@@ -0,0 +1,93 @@
+'''
+The instruction string sent to the Teensy to start a run.
+
+setup() in teensy_lockin.ino reads colon separated fields terminated by
+"F":
+
+    ref:freq:rate:npts:cutoff:stages:mode[:format[:lut:mod[:refmhz[:dec[:check]]]]]F
+
+ref is 0 for internal and 1 for external reference, freq is either the
+internal reference frequency (Hz) or the external reference count
+duration (ms), and mode is one of the modes below. lut and mod pick the
+sine table (by its size) and the PDB modulus of the internal reference
+(see reference.py); mod 0 has the sketch work it out from freq. refmhz
+gives the external reference frequency in mHz, known from an earlier run
+(see refcache.py), and check how long (ms) the sketch counts to check it:
+with check 0 the sketch uses it without counting, otherwise it is used if
+it is within REF_TOLERANCE of a count of check ms, allowing for the count
+being one edge out, and the sketch counts for freq ms as usual if not.
+refmhz 0 has the sketch count as usual. dec has Normal Mode send one point
+for every dec, averaging I and Q over them (see decimate.py); 1 sends
+every point. Optional
+trailing fields are only sent when they differ from their defaults, so
+the string stays short and older sketches keep working.
+'''
+
+SINE_LUT_LENGTH = 300 # the lut field's default, the table in older sketches
+
+# Modes (the mode field)
+NORMAL = 0 # lock-in output for every point
+FAST = 1 # averages of R and phi only
+RAW = 2 # raw digitized signal; mixing and filtering done on the host
+CONTINUOUS = 3 # raw signal streamed while digitizing, for as long as the run lasts
+
+# Wire formats for Normal Mode output (the optional format field)
+ASCII = 0 # "signal, I, Q, R, phiE" records
+BINARY = 1 # binary blocks with signal, I, Q, R and phi
+BINARY_IQ = 2 # binary blocks with signal, I and Q; R and phi computed on host
+
+REF_TOLERANCE = 1e-3 # relative error the sketch accepts in refmhz when checking it
+
+
+def build_instruction(ref_select, freq_dur, sampling_rate, num_points,
+                      cutoff, stages, mode, wire_format=ASCII,
+                      lut_size=SINE_LUT_LENGTH, pdb_mod=0, ref_mhz=0,
+                      decimation=1, ref_check=0):
+    '''Returns the instruction string for the given run settings'''
+    fields = [ref_select, freq_dur, sampling_rate, num_points, cutoff,
+              stages, mode]
+    if ref_mhz and ref_check:
+        fields += [wire_format, lut_size, pdb_mod, ref_mhz, decimation, ref_check]
+    elif decimation > 1:
+        fields += [wire_format, lut_size, pdb_mod, ref_mhz, decimation]
+    elif ref_mhz:
+        fields += [wire_format, lut_size, pdb_mod, ref_mhz]
+    elif lut_size != SINE_LUT_LENGTH or pdb_mod:
+        fields += [wire_format, lut_size, pdb_mod]
+    elif wire_format != ASCII:
+        fields.append(wire_format)
+    return ":".join(str(int(field)) for field in fields) + "F"
+
+
+def parse_instruction(instruction):
+    '''
+    Parses an instruction string the way setup() does, returning a dict
+    with the keyword arguments of build_instruction. Like atoi, fields
+    that are not numbers read as 0.
+    '''
+    if isinstance(instruction, bytes):
+        instruction = instruction.decode('ascii', 'replace')
+    fields = instruction.split("F", 1)[0].split(":")
+
+    def field(index, default=0):
+        if index >= len(fields) or fields[index] == "":
+            return default
+        digits = fields[index].strip()
+        sign = -1 if digits[:1] == "-" else 1
+        digits = digits.lstrip("+-")
+        end = len(digits) - len(digits.lstrip("0123456789"))
+        return sign * int(digits[:end] or 0)
+
+    return {"ref_select": 0 if fields[0][:1] == "0" else 1,
+            "freq_dur": field(1),
+            "sampling_rate": field(2),
+            "num_points": field(3),
+            "cutoff": field(4),
+            "stages": field(5),
+            "mode": field(6),
+            "wire_format": field(7, ASCII),
+            "lut_size": field(8, SINE_LUT_LENGTH),
+            "pdb_mod": field(9),
+            "ref_mhz": field(10),
+            "decimation": max(field(11, 1), 1),
+            "ref_check": field(12)}
@@ -0,0 +1,91 @@
+'''
+Helpers for plotting lock-in data while it is still arriving.
+
+RingBuffer holds the most recent rows of a run in preallocated storage,
+and minmax_decimate reduces a trace to the minimum and maximum of each
+screen pixel column so that redrawing costs the same however many points
+were acquired. Only NumPy is needed here; the plot itself lives in the
+GUI.
+'''
+
+import numpy as np
+
+
+class RingBuffer(object):
+    '''
+    Fixed-capacity ring of rows, keeping the most recent capacity rows.
+    Properties:
+    capacity - maximum number of rows kept
+    total - number of rows added since the last clear (the index of the
+            next row in the run)
+    '''
+
+    def __init__(self, capacity, width, dtype=np.float64):
+        self.capacity = capacity
+        self._data = np.empty((capacity, width), dtype=dtype)
+        self._start = 0 # index of the oldest row
+        self._count = 0
+        self.total = 0
+
+    def __len__(self):
+        return self._count
+
+    def clear(self):
+        self._start = 0
+        self._count = 0
+        self.total = 0
+
+    def extend(self, rows):
+        '''Appends an (n, width) array of rows, dropping the oldest if full'''
+        self.total += len(rows)
+        rows = rows[-self.capacity:]
+        n = len(rows)
+        end = (self._start + self._count) % self.capacity
+        first = min(n, self.capacity - end)
+        self._data[end:end + first] = rows[:first]
+        self._data[:n - first] = rows[first:]
+        overflow = self._count + n - self.capacity
+        if overflow > 0:
+            self._start = (self._start + overflow) % self.capacity
+            self._count = self.capacity
+        else:
+            self._count += n
+
+    def values(self):
+        '''
+        Returns the rows oldest first, as a view when they don't wrap around
+        the end of the storage.
+        '''
+        end = self._start + self._count
+        if end <= self.capacity:
+            return self._data[self._start:end]
+        return np.concatenate((self._data[self._start:],
+                               self._data[:end - self.capacity]))
+
+    def first_index(self):
+        '''Index within the run of the oldest row kept'''
+        return self.total - self._count
+
+
+def minmax_decimate(y, width, x0=0):
+    '''
+    Reduces y to at most about 2 * width points for drawing at a resolution
+    of width pixels, keeping the minimum and maximum of each pixel column in
+    time order so that no peaks are lost.
+    Returns (x, y), where x counts from x0.
+    '''
+    n = len(y)
+    width = max(int(width), 1)
+    if n <= 2 * width:
+        return np.arange(x0, x0 + n), y
+    per = -(-n // width) # points per pixel column, rounded up
+    m = n - n % per
+    blocks = y[:m].reshape(-1, per)
+    offsets = np.arange(0, m, per)
+    idx = np.stack((blocks.argmin(axis=1), blocks.argmax(axis=1)), axis=1)
+    idx = (np.sort(idx, axis=1) + offsets[:, None]).ravel()
+    if m < n:
+        tail = y[m:]
+        extra = np.sort([tail.argmin(), tail.argmax()]) + m
+        idx = np.concatenate((idx, extra))
+    return idx + x0, y[idx]
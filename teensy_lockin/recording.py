@@ -0,0 +1,224 @@
+'''
+Recording the serial traffic of runs, to replay it without a board.
+
+When a run misbehaves (lines lost, "Could not read all lines", leftover
+lines from the previous run), the bytes that came over the port are what
+is needed to reproduce it. SerialRecorder writes every byte read from
+and written to the port, with the time (time.monotonic, from when the
+recording started), to a compact binary file:
+
+    client = LockInClient('/dev/ttyACM0')
+    client.recorder = SerialRecorder('runs.tlrec')
+    client.run(settings)  # recorded
+    client.recorder.close()
+
+LockInClient.connect wraps each connection it opens in a RecordingSerial,
+which passes every call on to the port. A file holds any number of
+connections (one per run, as the Teensy resets after each).
+
+The teensyreplay:// port (urlhandler/protocol_teensyreplay.py) plays a
+recording back: each open replays the next connection recorded, and the
+bytes read are released as long after the host's write that preceded
+them as they were recorded, divided by speed (0 for as fast as the host
+reads them):
+
+    client = LockInClient('teensyreplay://runs.tlrec?speed=0')
+    result = client.run(settings)  # the settings of the recorded run
+
+The file is a HEADER (MAGIC, VERSION and the time the recording started,
+in seconds since the epoch) followed by events: an EVENT header (kind,
+time in s, payload length) and the payload, which is the bytes read or
+written, or the port name for OPEN.
+
+    python -m teensy_lockin.recording runs.tlrec
+'''
+
+import argparse
+import collections
+import struct
+import sys
+import time
+
+MAGIC = b'TLREC'
+VERSION = 1
+HEADER = struct.Struct('<5sBd') # magic, version, start (s since the epoch)
+EVENT = struct.Struct('<BdI') # kind, time (s since start), payload length
+
+OPEN = 1 # a connection was opened; payload is the port name
+CLOSE = 2
+READ = 3 # bytes read from the port
+WRITE = 4 # bytes written to the port
+KIND_NAMES = {OPEN: "open", CLOSE: "close", READ: "read", WRITE: "write"}
+
+Event = collections.namedtuple("Event", ["kind", "time", "data"])
+Event.__doc__ = '''
+One event of a recording.
+kind - OPEN, CLOSE, READ or WRITE
+time - when it happened (s since the recording started)
+data - the bytes read or written, the port name for OPEN, or b''
+'''
+
+Connection = collections.namedtuple("Connection", ["port", "opened", "events"])
+Connection.__doc__ = '''
+The events of one connection, from when it was opened to when it was closed.
+port - name of the port
+opened - when it was opened (s since the recording started)
+events - the READ and WRITE Events, in order
+'''
+
+
+class SerialRecorder(object):
+    '''
+    Writes the traffic of the serial connections it wraps to a file.
+    Properties:
+    path - the recording file
+    start - time.monotonic() when the recording started
+    events - number of events written
+    '''
+
+    def __init__(self, path, clock=time.monotonic):
+        self.path = path
+        self.clock = clock
+        self.start = clock()
+        self.events = 0
+        self._file = open(path, 'wb')
+        self._file.write(HEADER.pack(MAGIC, VERSION, time.time()))
+
+    def record(self, kind, data=b''):
+        '''Writes an event'''
+        self._file.write(EVENT.pack(kind, self.clock() - self.start, len(data)))
+        self._file.write(data)
+        self.events += 1
+
+    def wrap(self, ser, port=None):
+        '''Returns ser wrapped in a RecordingSerial, recording its opening'''
+        if port is None:
+            port = getattr(ser, 'port', None) or ''
+        self.record(OPEN, port.encode('utf-8'))
+        return RecordingSerial(ser, self)
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class RecordingSerial(object):
+    '''
+    A serial connection that records what is read from it and written to
+    it. Anything else is passed on to the port.
+    Properties:
+    ser - the port wrapped
+    recorder - the SerialRecorder written to
+    '''
+
+    def __init__(self, ser, recorder):
+        self.ser = ser
+        self.recorder = recorder
+
+    def __getattr__(self, name):
+        return getattr(self.ser, name)
+
+    def read(self, size=1):
+        data = self.ser.read(size)
+        if data:
+            self.recorder.record(READ, bytes(data))
+        return data
+
+    def readinto(self, b):
+        n = self.ser.readinto(b)
+        if n:
+            self.recorder.record(READ, bytes(memoryview(b)[:n]))
+        return n
+
+    def write(self, data):
+        self.recorder.record(WRITE, bytes(data))
+        return self.ser.write(data)
+
+    def close(self):
+        self.ser.close()
+        self.recorder.record(CLOSE)
+        self.recorder.flush()
+
+
+def read_events(path):
+    '''Returns (start in s since the epoch, list of Events) of a recording'''
+    with open(path, 'rb') as f:
+        content = f.read()
+    if len(content) < HEADER.size:
+        raise ValueError("%s is not a recording" % path)
+    magic, version, start = HEADER.unpack_from(content)
+    if magic != MAGIC:
+        raise ValueError("%s is not a recording" % path)
+    if version > VERSION:
+        raise ValueError("%s is a newer recording (version %d)" % (path, version))
+    events = []
+    offset = HEADER.size
+    # an event cut short by the program stopping ends the recording
+    while offset + EVENT.size <= len(content):
+        kind, t, length = EVENT.unpack_from(content, offset)
+        offset += EVENT.size
+        if offset + length > len(content):
+            break
+        events.append(Event(kind, t, content[offset:offset + length]))
+        offset += length
+    return start, events
+
+
+def read_connections(path):
+    '''Returns the Connections of a recording'''
+    connections = []
+    current = None
+    for event in read_events(path)[1]:
+        if event.kind == OPEN:
+            current = Connection(event.data.decode('utf-8'), event.time, [])
+            connections.append(current)
+        elif event.kind == CLOSE:
+            current = None
+        elif current is not None:
+            current.events.append(event)
+    return connections
+
+
+def describe(connection):
+    '''Lines summarising a Connection'''
+    events = connection.events
+    read = sum(len(e.data) for e in events if e.kind == READ)
+    writes = [e for e in events if e.kind == WRITE]
+    duration = events[-1].time - connection.opened if events else 0
+    lines = ["Port: %s" % connection.port,
+             "Duration: %.3f s" % duration,
+             "Bytes Read: %d in %d reads" % (read, len(events) - len(writes))]
+    for event in writes:
+        lines += ["Written at %.3f s: %r" % (event.time - connection.opened,
+                                              event.data.decode('utf-8', 'replace'))]
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Summarise the connections in a serial recording")
+    parser.add_argument("path")
+    args = parser.parse_args(argv)
+    try:
+        connections = read_connections(args.path)
+    except (OSError, ValueError) as e:
+        print(e, file=sys.stderr)
+        return 1
+    for index, connection in enumerate(connections):
+        print("Connection %d" % index)
+        for line in describe(connection):
+            print("    " + line)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
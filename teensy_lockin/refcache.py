@@ -0,0 +1,218 @@
+'''
+Reusing the external reference frequency from one run to the next.
+
+With an external reference, every run starts with the Teensy counting the
+reference's edges for freq_dur ms (5 s by default), which is dead time
+when the reference is stable and runs follow each other. ReferenceCache
+remembers the frequency measured on each board (by port, and board: the
+Teensy model unless given), and for the next run within ttl seconds sends
+it in the instruction (RunSettings.ref_hint). With check_ms 0 the Teensy
+uses it without counting; otherwise it counts for check_ms (at least
+check_duration, long enough to resolve instruction.REF_TOLERANCE) to check
+it, and counts for the full freq_dur if the two disagree (see
+instruction.py). When even check_duration is not shorter than freq_dur,
+the run just counts.
+
+After each run, the frequency is estimated from the digitized signal
+(frequency.estimate_freq), which is far finer than the count, and stored.
+If the run used a cached frequency and the estimate differs from it by
+more than tolerance (relative), the reference has drifted: the estimate
+replaces it, and the drift is logged. If the run was also demodulated at
+the cached frequency, its result is marked (RunResult.ref_drifted, status
+"drifted"), as its outputs are not to be trusted. The estimate searches near the
+cached frequency first and, if nothing is found there, the whole
+spectrum, since the reference may have moved further; if the signal
+still gives no estimate, the cached frequency cannot be trusted and is
+dropped, so that the next run counts. Fast Mode sends no signal, so only
+counted runs update the cache there. In Raw Mode, with refine, the host
+also mixes at the estimated frequency rather than the one sent.
+
+    client = LockInClient('/dev/ttyACM0')
+    client.ref_cache = ReferenceCache(ttl=600)
+    for k in range(100):
+        result = client.run(settings) # only the first one counts for 5 s
+
+Given a path, the entries are kept in a JSON file, so that runs from the
+command line can share them.
+'''
+
+import collections
+import copy
+import json
+import math
+import os
+import time
+
+from .client import EXTERNAL
+from .frequency import estimate_freq
+from .instruction import FAST, CONTINUOUS, REF_TOLERANCE
+
+TTL = 300.0 # s a frequency is reused for
+TOLERANCE = 1e-3 # relative change taken as drift
+CHECK_MS = 0 # count duration sent with a cached frequency (0: no count)
+
+
+
+def check_duration(freq):
+    '''
+    The shortest count (ms) that checks freq to within REF_TOLERANCE: one
+    edge more or less is then at most half of it
+    '''
+    return int(math.ceil(2000.0 / (REF_TOLERANCE * freq)))
+
+
+Entry = collections.namedtuple("Entry", ["freq", "time", "source"])
+Entry.__doc__ = '''
+A cached reference frequency.
+freq - the frequency (Hz)
+time - when it was measured (seconds since the epoch)
+source - "count" (by the Teensy) or "estimate" (from the signal)
+'''
+
+
+class ReferenceCache(object):
+    '''
+    External reference frequencies by port and board.
+    Properties:
+    ttl - s a frequency is reused for
+    tolerance - relative change from the cached frequency taken as drift
+    check_ms - count duration sent with a cached frequency (0 skips the count)
+    refine - if True, Raw Mode runs are mixed at the frequency estimated
+             from their signal
+    path - JSON file the entries are kept in, or None
+    log - function called with messages about drift
+    drifts - number of times drift was found
+    '''
+
+    def __init__(self, ttl=TTL, tolerance=TOLERANCE, check_ms=CHECK_MS,
+                 refine=True, path=None, log=print, clock=time.time):
+        self.ttl = ttl
+        self.tolerance = tolerance
+        self.check_ms = check_ms
+        self.refine = refine
+        self.path = path
+        self.log = log
+        self.clock = clock
+        self.drifts = 0
+        self._entries = {}
+        if path is not None and os.path.exists(path):
+            with open(path) as f:
+                self._entries = dict((key, Entry(*value))
+                                     for key, value in json.load(f).items())
+
+    @staticmethod
+    def _key(port, board):
+        return "%s|%s" % (port, board)
+
+    def get(self, port, board):
+        '''The Entry for a board, or None if there is none or it has expired'''
+        entry = self._entries.get(self._key(port, board))
+        if entry is None or self.clock() - entry.time > self.ttl:
+            return None
+        return entry
+
+    def put(self, port, board, freq, source="count"):
+        self._entries[self._key(port, board)] = Entry(float(freq), self.clock(), source)
+        self._save()
+
+    def forget(self, port=None, board=None):
+        '''Drops the entry of a board, or every entry'''
+        if port is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(self._key(port, board), None)
+        self._save()
+
+    def _save(self):
+        if self.path is None:
+            return
+        temp = self.path + ".tmp"
+        with open(temp, "w") as f:
+            json.dump(dict((key, list(entry)) for key, entry in self._entries.items()), f)
+        os.replace(temp, self.path)
+
+    def prepare(self, settings, port, board=None):
+        '''
+        The settings to send for a run: for an external reference with a
+        cached frequency, a copy with ref_hint set and ref_check to the
+        count that checks it (0 for none); otherwise settings as they are.
+        '''
+        if settings.ref_select != EXTERNAL:
+            return settings
+        if board is None:
+            board = settings.teensy_model
+        entry = self.get(port, board)
+        if entry is None:
+            return settings
+        hint = round(entry.freq, 3)
+        check = 0
+        if self.check_ms:
+            check = max(self.check_ms, check_duration(hint))
+            if check >= settings.freq_dur:
+                return settings # checking would take as long as counting
+        prepared = copy.copy(settings)
+        prepared.ref_hint = hint
+        prepared.ref_check = check
+        return prepared
+
+    @staticmethod
+    def estimate_signal(signal, sampling_rate, guess, hinted=False):
+        '''
+        The frequency estimated from a signal near guess, or None. For a run
+        that used a cached frequency (hinted), the whole spectrum is searched
+        if nothing is found near it.
+        '''
+        freq = estimate_freq(signal, sampling_rate, guess=guess)
+        if freq is None and hinted:
+            freq = estimate_freq(signal, sampling_rate)
+        return freq
+
+    def estimate(self, result):
+        '''The frequency estimated from the signal of a run, or None'''
+        settings = result.settings
+        hinted = bool(settings.ref_hint)
+        if result.signal is not None:
+            return self.estimate_signal(result.signal, settings.sampling_rate,
+                                        result.ref_freq, hinted)
+        # a decimated Signal is sampled too slowly to tell
+        if (result.data is None or settings.mode in (FAST, CONTINUOUS)
+                or settings.decimation_factor() > 1):
+            return None
+        return self.estimate_signal(result.column("Signal"), settings.sampling_rate,
+                                    result.ref_freq, hinted)
+
+    def observe(self, result, port, board=None, estimate=None):
+        '''
+        Updates the cache from a finished run (estimate is the frequency
+        estimated from its signal, if already known), and marks the run
+        ref_drifted if it was demodulated at a cached frequency the
+        estimate disagrees with. Returns the frequency stored, or None.
+        '''
+        settings = result.settings
+        if settings.ref_select != EXTERNAL or result.ref_freq is None:
+            return None
+        if board is None:
+            board = settings.teensy_model
+        if estimate is None:
+            estimate = self.estimate(result)
+        if estimate is None:
+            if settings.ref_hint and abs(result.ref_freq - settings.ref_hint) < 0.01:
+                # the Teensy used the hint and the signal cannot confirm it
+                if settings.mode in (FAST, CONTINUOUS):
+                    return None # these send no signal to check it against
+                self.forget(port, board)
+                self.log("Could not check the reference frequency of %.3f Hz "
+                         "against the signal; it will be counted next run"
+                         % settings.ref_hint)
+                return None
+            self.put(port, board, result.ref_freq, "count")
+            return result.ref_freq
+        if settings.ref_hint and abs(estimate - settings.ref_hint) > self.tolerance * settings.ref_hint:
+            self.drifts += 1
+            self.log("Reference frequency drifted from %.3f to %.3f Hz"
+                     % (settings.ref_hint, estimate))
+            if abs(result.ref_freq - estimate) > self.tolerance * estimate:
+                # demodulated at the old frequency
+                result.ref_drifted = True
+        self.put(port, board, estimate, "estimate")
+        return estimate
@@ -0,0 +1,202 @@
+'''
+Frequencies the Teensy 3.5 can generate for the internal reference.
+
+generateReferenceWave in teensy_lockin.ino has the DMA copy a sine table
+(src/SineLUT.h) to the DAC, one entry each time the programmable delay
+block (PDB) counts mod cycles of the bus clock, so the reference runs at
+
+    F_BUS / (mod * size)
+
+for a table of size entries. With the single 300 entry table, mod has to
+be a whole number and the frequencies that can be made get sparse as the
+frequency goes up (33 kHz is 33.3 or 28.6 kHz). SineLUT.h now holds tables
+of several sizes, LUT_SIZES, and the instruction can name the table and
+the modulus to use. FrequencyPlanner lists every frequency that some
+table and modulus give, sorted, so the best one for any request (or for
+each point of a sweep) is found by binary search. Smaller tables make a
+coarser sine, so the largest table within TOLERANCE of the request is
+preferred over a slightly closer frequency from a smaller one:
+
+    planner = FrequencyPlanner()
+    plan = planner.nearest(33000) # 32894.7 Hz from the 96 entry table, mod 19
+    settings.lut_size, settings.pdb_mod = plan.lut_size, plan.mod
+
+Building the index takes a fraction of a second, so default_planner keeps
+one for LUT_SIZES once it has been built.
+
+sine_tables and write_header generate SineLUT.h for LUT_SIZES (see
+src/calculate_sine_table.py).
+'''
+
+import collections
+
+import numpy as np
+
+from .instruction import SINE_LUT_LENGTH
+
+BUS_CLOCK_FREQ = 60e6 # F_BUS of a Teensy 3.5 running at 120 MHz
+# Sizes of the tables in SineLUT.h, the default first. Many sizes make the
+# products mod * size, and so the frequencies, closely spaced; tables
+# below 32 entries would make a poor sine.
+LUT_SIZES = (300, 288, 275, 256, 250, 240, 225, 216, 200, 192, 180, 175, 162,
+             160, 150, 144, 135, 128, 125, 120, 112, 108, 100, 96, 90, 84, 80,
+             75, 72, 64, 60, 56, 50, 48, 45, 42, 40, 36, 32)
+TOLERANCE = 1e-3 # relative error accepted to use a larger table
+MIN_MOD = 2 # fewest bus clocks between DAC updates
+MAX_MOD = 1 << 16 # PDB0_MOD is a 16-bit register holding mod - 1
+SINE_AMPLITUDE = 2047 # 12-bit DAC output centred at 2048, not clipping
+SINE_OFFSET = 2048
+
+Plan = collections.namedtuple("Plan", ["requested", "freq", "lut_size", "mod"])
+Plan.__doc__ = '''
+Internal reference settings for a requested frequency.
+requested - the frequency asked for (Hz)
+freq - the frequency generated (Hz)
+lut_size - sine table to use
+mod - PDB modulus to use
+'''
+
+
+def achieved_freq(freq, lut_size=SINE_LUT_LENGTH, mod=0, clock=BUS_CLOCK_FREQ):
+    '''
+    Frequency generated for an internal reference instruction: with the
+    given mod, or (mod 0) with the mod the sketch works out from freq.
+    '''
+    if not mod:
+        mod = int(clock // (freq * lut_size)) # integer division in the sketch
+    return clock / (mod * lut_size)
+
+
+class FrequencyPlanner(object):
+    '''
+    Sorted index of the frequencies the internal reference can make.
+    Properties:
+    freqs - the frequencies, ascending (Hz)
+    lut_sizes, mods - the table size and modulus giving each of freqs;
+                      where several do, the largest table
+    clock - bus clock (Hz)
+    '''
+
+    def __init__(self, lut_sizes=LUT_SIZES, clock=BUS_CLOCK_FREQ,
+                 min_mod=MIN_MOD, max_mod=MAX_MOD, min_lut_size=0):
+        self.clock = clock
+        sizes = np.array(sorted(size for size in set(lut_sizes)
+                                if size >= min_lut_size), dtype=np.int64)
+        mods = np.arange(min_mod, max_mod + 1, dtype=np.int64)
+        # the frequency only depends on the product mod * size
+        products = (mods[None, :] * sizes[:, None]).ravel()
+        size_of = np.repeat(sizes, len(mods))
+        # sort by product, largest table first, and keep one of each
+        order = np.lexsort((-size_of, products))
+        products = products[order]
+        first = np.r_[True, products[1:] != products[:-1]]
+        products = products[first][::-1] # ascending frequency
+        self.lut_sizes = size_of[order][first][::-1]
+        self.mods = products // self.lut_sizes
+        self.freqs = clock / products
+
+    def __len__(self):
+        return len(self.freqs)
+
+    def _nearest_index(self, freqs):
+        freqs = np.asarray(freqs, dtype=np.float64)
+        right = np.clip(np.searchsorted(self.freqs, freqs), 1, len(self.freqs) - 1)
+        left = right - 1
+        closer = np.abs(self.freqs[left] - freqs) <= np.abs(self.freqs[right] - freqs)
+        return np.where(closer, left, right)
+
+    def _best_index(self, freq, nearest, low, high):
+        '''The largest table from index low to high, or nearest if none'''
+        if high <= low:
+            return nearest
+        sizes = self.lut_sizes[low:high]
+        candidates = low + np.flatnonzero(sizes == sizes.max())
+        errors = np.abs(self.freqs[candidates] - freq)
+        return int(candidates[np.argmin(errors)])
+
+    def _plan(self, requested, index):
+        return Plan(requested, float(self.freqs[index]),
+                    int(self.lut_sizes[index]), int(self.mods[index]))
+
+    def nearest(self, freq, tolerance=TOLERANCE):
+        '''
+        The Plan for freq: the largest table giving a frequency within
+        tolerance (relative) of freq, or the nearest frequency if none does.
+        tolerance 0 always gives the nearest frequency.
+        '''
+        return self.nearest_many([freq], tolerance)[0]
+
+    def nearest_many(self, freqs, tolerance=TOLERANCE):
+        '''Plans for each of freqs, as nearest, with one search for all'''
+        targets = np.asarray(freqs, dtype=np.float64)
+        nearest = self._nearest_index(targets)
+        lows = np.searchsorted(self.freqs, targets * (1 - tolerance), side='left')
+        highs = np.searchsorted(self.freqs, targets * (1 + tolerance), side='right')
+        return [self._plan(freq, self._best_index(target, index, low, high))
+                for freq, target, index, low, high
+                in zip(freqs, targets, nearest, lows, highs)]
+
+    def between(self, low, high):
+        '''Plans for every frequency that can be made from low to high'''
+        start = np.searchsorted(self.freqs, low, side='left')
+        stop = np.searchsorted(self.freqs, high, side='right')
+        return [self._plan(self.freqs[index], index) for index in range(start, stop)]
+
+    def grid(self, start, stop, num, log=False, tolerance=TOLERANCE):
+        '''
+        Plans for a sweep of num frequencies from start to stop, evenly
+        spaced (or logarithmically, if log), each moved to a frequency that
+        can be made as by nearest.
+        '''
+        if log:
+            targets = np.geomspace(start, stop, num)
+        else:
+            targets = np.linspace(start, stop, num)
+        return self.nearest_many(targets, tolerance)
+
+
+_planner = None
+
+
+def default_planner():
+    '''The FrequencyPlanner for LUT_SIZES, built on first use'''
+    global _planner
+    if _planner is None:
+        _planner = FrequencyPlanner()
+    return _planner
+
+
+def sine_tables(sizes=LUT_SIZES, amplitude=SINE_AMPLITUDE, offset=SINE_OFFSET):
+    '''
+    One period of a sine for the DAC, for each of sizes, computed in one
+    pass. Returns a list of int arrays.
+    '''
+    sizes = np.asarray(sizes, dtype=np.int64)
+    ends = np.cumsum(sizes)
+    # index of each entry within its own table
+    idx = np.arange(ends[-1]) - np.repeat(ends - sizes, sizes)
+    vals = np.rint(np.sin(idx / np.repeat(sizes, sizes) * 2 * np.pi)
+                   * amplitude + offset).astype(int)
+    return np.split(vals, ends[:-1])
+
+
+def write_header(path, sizes=LUT_SIZES):
+    '''Writes SineLUT.h with a table for each of sizes, the default first'''
+    lines = ["// Generated by src/calculate_sine_table.py; do not edit.",
+             "// One period of a sine for the 12-bit DAC, in tables of",
+             "// several sizes (see teensy_lockin/reference.py).",
+             "",
+             "#define NUM_LUTS %d" % len(sizes),
+             "#define LUT_SIZE %d // the table used unless the instruction names another"
+             % sizes[0], ""]
+    for size, vals in zip(sizes, sine_tables(sizes)):
+        lines.append("static volatile uint16_t waveTable%d[%d] = {" % (size, size))
+        for row in range(0, size, 10):
+            lines.append(",".join(str(v) for v in vals[row:row + 10]) + ",")
+        lines += ["};", ""]
+    lines.append("static const int lutSizes[NUM_LUTS] = {%s};"
+                 % ", ".join(str(size) for size in sizes))
+    lines.append("static volatile uint16_t *const waveTables[NUM_LUTS] = {%s};"
+                 % ", ".join("waveTable%d" % size for size in sizes))
+    with open(path, "w") as f:
+        f.write("\n".join(lines) + "\n")
@@ -0,0 +1,369 @@
+'''
+Mixing and filtering saved runs again on the host, with other settings.
+
+The low pass filter normally runs on the Teensy, so trying another cutoff
+or number of stages used to mean measuring again. The Signal column of a
+saved run (a Save Data CSV, a binary export or a streamed file) is all
+that is needed to mix and filter it again here:
+
+    capture = load_capture('run.npz')
+    values = Reprocessor().process(capture, cutoff=2, stages=4)
+
+Reprocessor keeps the most recent results in an LRU cache keyed by a hash
+of the signal, the reference frequency and the filter settings, so going
+back to earlier settings costs nothing, and process_many mixes the signal
+once for any number of settings. reprocess_directory does the same for
+every capture in a directory, spread over a pool of processes. Given
+harmonic orders, the signal is demodulated at those harmonics of the
+reference as well, all in one pass (engine.demodulate).
+
+CSV files do not record the reference frequency or the sampling rate, so
+those have to be given. Nor do they record the index of their first
+sample, which is taken to be CSV_FIRST, that of a Normal Mode ASCII run
+(the GUI's default); give --first for CSVs of other runs:
+
+    python -m teensy_lockin.reprocess run.csv --ref-freq 1000 --rate 10000 \
+        --cutoff 1 2 5 --stages 1 4
+    python -m teensy_lockin.reprocess run.npz --harmonics 1 2 3
+    python -m teensy_lockin.reprocess runs/ --cutoff 2 --stages 1 2 3 4
+'''
+
+import argparse
+import collections
+import concurrent.futures
+import copy
+import glob
+import hashlib
+import json
+import os
+import sys
+
+import numpy as np
+
+from . import export
+from .client import RunResult, RunSettings, INTERNAL
+from .engine import NUM_COEFFS, demodulate, harmonic_freqs, mix_and_filter_many
+from .instruction import NORMAL, ASCII, SINE_LUT_LENGTH
+from .stats import LockInStats
+
+CAPTURE_EXTENSIONS = ('.csv', '.npz', '.parquet', '.h5', '.hdf5', '.npy')
+CSV_FIRST = RunSettings(mode=NORMAL, wire_format=ASCII).first_index() # of a Save Data CSV
+
+
+class Capture(object):
+    '''
+    The signal of a saved run and what is needed to mix and filter it again.
+    Properties:
+    signal - the Signal column, in ADC counts
+    ref_freq - reference frequency (Hz)
+    sampling_rate - sampling rate (Hz)
+    first - index in the run of the sample signal[0]
+    scale - converts R to the amplitude in volts (2 * volts per count)
+    path - file the capture was loaded from, or None
+    '''
+
+    def __init__(self, signal, ref_freq, sampling_rate, first=NUM_COEFFS - 1,
+                 scale=2 * 3.3/4096, path=None):
+        self.signal = np.asarray(signal, dtype=np.float64)
+        self.ref_freq = ref_freq
+        self.sampling_rate = sampling_rate
+        self.first = first
+        self.scale = scale
+        self.path = path
+        self._digest = None
+
+    @classmethod
+    def from_result(cls, result):
+        '''
+        The capture of a RunResult with data. Decimated runs only keep the
+        Signal of the points kept, so their whole signal (RunResult.signal)
+        is needed.
+        '''
+        settings = result.settings
+        ref_freq = result.ref_freq
+        if ref_freq is None: # only sent for an external reference
+            ref_freq = settings.actual_internal_freq()
+        if result.signal is not None:
+            return cls(result.signal, ref_freq, settings.sampling_rate, 0,
+                       2 * settings.volts_per_count())
+        if settings.decimation_factor() > 1:
+            raise ValueError("the run was decimated and did not keep its signal")
+        return cls(result.column("Signal"), ref_freq, settings.sampling_rate,
+                   settings.first_index(), 2 * settings.volts_per_count())
+
+    def digest(self):
+        '''Hash of the signal (computed once)'''
+        if self._digest is None:
+            self._digest = hashlib.sha1(np.ascontiguousarray(self.signal)).hexdigest()
+        return self._digest
+
+
+def _load_csv_signal(path):
+    '''Reads the Signal column of a CSV written by Save Data'''
+    with open(path) as f:
+        header = f.readline().strip().split(',')
+    return np.loadtxt(path, delimiter=',', skiprows=1,
+                      usecols=header.index('Signal'), ndmin=1)
+
+
+def load_capture(path, ref_freq=None, sampling_rate=None, first=None,
+                 teensy_model='T35'):
+    '''
+    Loads the Signal column of a saved run as a Capture. ref_freq,
+    sampling_rate and first are taken from the saved metadata unless given;
+    ref_freq and sampling_rate must be given for CSV files, whose first
+    sample is taken to be CSV_FIRST. teensy_model is only used if the
+    metadata do not give the amplitude scale.
+    '''
+    if os.path.splitext(path)[1].lower() == '.csv':
+        signal = _load_csv_signal(path)
+        metadata = {}
+    else:
+        records, metadata = export.load(path)
+        signal = records['Signal']
+        if metadata.get("decimation", 1) > 1:
+            raise ValueError("%s was decimated; its Signal cannot be filtered again"
+                             % path)
+    settings = RunSettings(ref_select=metadata.get("ref_select", INTERNAL),
+                           freq_dur=metadata.get("freq_dur", 0),
+                           mode=metadata.get("mode", 0),
+                           wire_format=metadata.get("wire_format", 0),
+                           teensy_model=metadata.get("teensy_model", teensy_model),
+                           lut_size=metadata.get("lut_size", SINE_LUT_LENGTH),
+                           pdb_mod=metadata.get("pdb_mod", 0))
+    if ref_freq is None:
+        ref_freq = metadata.get("ref_freq")
+        if ref_freq is None and metadata.get("ref_select") == INTERNAL:
+            ref_freq = settings.actual_internal_freq()
+    if sampling_rate is None:
+        sampling_rate = metadata.get("sampling_rate")
+    if ref_freq is None or sampling_rate is None:
+        raise ValueError("%s does not record the reference frequency and "
+                         "sampling rate; give them" % path)
+    if first is None:
+        first = metadata.get("first_index", settings.first_index()
+                             if metadata else CSV_FIRST)
+    scale = metadata.get("amplitude_scale", 2 * settings.volts_per_count())
+    return Capture(signal, ref_freq, sampling_rate, first, scale, path)
+
+
+class Reprocessor(object):
+    '''
+    Mixes and filters captures again, keeping the most recent results.
+    Results are returned read-only, since they are shared with the cache.
+    Properties:
+    cache_size - number of results kept
+    hits, misses - number of results found in the cache, and computed
+    '''
+
+    def __init__(self, cache_size=64):
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self._cache = collections.OrderedDict()
+
+    def _key(self, capture, cutoff, stages):
+        if stages not in (1, 2, 3):
+            stages = 4 # as in filter_coeffs
+        return (capture.digest(), capture.ref_freq, capture.sampling_rate,
+                capture.first, cutoff, stages)
+
+    def process(self, capture, cutoff, stages):
+        '''Returns the (n, 5) Signal, I, Q, R, Phi array for one filter setting'''
+        return self.process_many(capture, [(cutoff, stages)])[0]
+
+    def process_many(self, capture, params):
+        '''
+        Returns a list of (n, 5) arrays, one for each (cutoff, stages) in
+        params, mixing the signal once for all those not in the cache.
+        '''
+        keys = [self._key(capture, cutoff, stages) for cutoff, stages in params]
+        todo = collections.OrderedDict()
+        for key, param in zip(keys, params):
+            if key not in self._cache:
+                todo[key] = param
+        if todo:
+            outputs = mix_and_filter_many(capture.signal, capture.ref_freq,
+                                          capture.sampling_rate, list(todo.values()),
+                                          first=capture.first)
+            for key, values in zip(todo, outputs):
+                values.flags.writeable = False
+                self._cache[key] = values
+        self.misses += len(todo)
+        self.hits += len(keys) - len(todo)
+        results = []
+        for key in keys:
+            self._cache.move_to_end(key)
+            results.append(self._cache[key])
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return results
+
+    def clear(self):
+        self._cache.clear()
+
+
+def reprocessed_result(result, values, cutoff, stages):
+    '''A copy of a RunResult with the data of another filter setting'''
+    settings = copy.copy(result.settings)
+    settings.cutoff = cutoff
+    settings.stages = stages
+    out = RunResult(settings)
+    out.ref_freq = result.ref_freq
+    out.data = values
+    out.points = len(values)
+    return out
+
+
+def summarize(capture, values, percent=75):
+    '''Statistics (LockInStats.summary) of the last percent of the points'''
+    return LockInStats.from_data(values[:, 3], values[:, 4], percent,
+                                 capture.scale).summary()
+
+
+def harmonics(capture, orders, cutoff, stages, percent=75):
+    '''
+    Demodulates a capture at harmonics of its reference frequency. Returns
+    a list of dicts with the harmonic, its frequency and its statistics
+    for each of orders.
+    '''
+    freqs = harmonic_freqs(capture.ref_freq, orders)
+    values = demodulate(capture.signal, freqs, capture.sampling_rate,
+                        cutoff, stages, first=capture.first)
+    rows = []
+    for order, freq, out in zip(orders, freqs, values):
+        row = {"harmonic": order, "freq": freq}
+        row.update(LockInStats.from_data(out[:, 2], out[:, 3], percent,
+                                         capture.scale).summary())
+        rows.append(row)
+    return rows
+
+
+def reprocess_file(path, params, percent=75, ref_freq=None, sampling_rate=None,
+                   orders=None, first=None):
+    '''
+    Loads a capture and returns a list of dicts with the cutoff, stages and
+    statistics for each (cutoff, stages) in params. Given harmonic orders,
+    there is a dict for each harmonic (see harmonics) instead. ref_freq,
+    sampling_rate and first are passed to load_capture.
+    '''
+    capture = load_capture(path, ref_freq, sampling_rate, first)
+    rows = []
+    if orders:
+        for cutoff, stages in params:
+            for row in harmonics(capture, orders, cutoff, stages, percent):
+                row.update(cutoff=cutoff, stages=stages)
+                rows.append(row)
+        return rows
+    outputs = mix_and_filter_many(capture.signal, capture.ref_freq,
+                                  capture.sampling_rate, params, first=capture.first)
+    for (cutoff, stages), values in zip(params, outputs):
+        row = {"cutoff": cutoff, "stages": stages}
+        row.update(summarize(capture, values, percent))
+        rows.append(row)
+    return rows
+
+
+def find_captures(directory):
+    '''Paths of the saved runs in a directory, sorted'''
+    return sorted(path for path in glob.glob(os.path.join(directory, '*'))
+                  if os.path.splitext(path)[1].lower() in CAPTURE_EXTENSIONS)
+
+
+def reprocess_directory(directory, params, percent=75, processes=None,
+                        ref_freq=None, sampling_rate=None, log=print, orders=None,
+                        first=None):
+    '''
+    Runs reprocess_file on every capture in a directory, in a pool of
+    processes (as many as CPUs by default; 1 runs them here). Returns a dict
+    of path to rows; captures that fail are left out and logged.
+    '''
+    paths = find_captures(directory)
+    results = {}
+    if processes == 1:
+        for path in paths:
+            try:
+                results[path] = reprocess_file(path, params, percent,
+                                               ref_freq, sampling_rate, orders, first)
+            except Exception as e:
+                log(path, "failed:", e)
+        return results
+    with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as pool:
+        futures = dict((pool.submit(reprocess_file, path, params, percent,
+                                    ref_freq, sampling_rate, orders, first), path)
+                       for path in paths)
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                results[futures[future]] = future.result()
+            except Exception as e:
+                log(futures[future], "failed:", e)
+    return dict((path, results[path]) for path in paths if path in results)
+
+
+def make_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m teensy_lockin.reprocess",
+        description="Mix and filter saved runs again with other filter settings.")
+    parser.add_argument("paths", nargs="+",
+                        help="saved runs, or directories of them")
+    parser.add_argument("--cutoff", type=float, nargs="+", default=[5.0],
+                        help="low pass corner frequencies in Hz (default 5)")
+    parser.add_argument("--stages", type=int, nargs="+", choices=[1, 2, 3, 4],
+                        default=[1], help="numbers of filter stages (default 1)")
+    parser.add_argument("--ref-freq", type=float,
+                        help="reference frequency in Hz (needed for CSV files)")
+    parser.add_argument("--rate", type=int,
+                        help="sampling rate in Hz (needed for CSV files)")
+    parser.add_argument("--first", type=int,
+                        help="index in the run of the first sample (default: from "
+                        "the metadata, or %d, a Normal Mode ASCII run, for CSV "
+                        "files)" % CSV_FIRST)
+    parser.add_argument("--harmonics", type=int, nargs="+", metavar="ORDER",
+                        help="demodulate at these harmonics of the reference "
+                        "frequency (1 is the reference)")
+    parser.add_argument("--percent", type=int, default=75,
+                        help="percent of points used to average (default 75)")
+    parser.add_argument("--jobs", type=int, default=None,
+                        help="processes to use for directories (default: one per CPU)")
+    parser.add_argument("--json", action="store_true",
+                        help="print one JSON object per result")
+    return parser
+
+
+def main(argv=None):
+    args = make_parser().parse_args(argv)
+    params = [(cutoff, stages) for cutoff in args.cutoff for stages in args.stages]
+    log = lambda *a: print(*a, file=sys.stderr)
+    results = {}
+    for path in args.paths:
+        if os.path.isdir(path) and not os.path.exists(os.path.join(path, export.SEGMENT_INDEX)):
+            results.update(reprocess_directory(path, params, args.percent, args.jobs,
+                                               args.ref_freq, args.rate, log,
+                                               args.harmonics, args.first))
+            continue
+        try:
+            results[path] = reprocess_file(path, params, args.percent,
+                                           args.ref_freq, args.rate, args.harmonics,
+                                           args.first)
+        except Exception as e:
+            log(path, "failed:", e)
+    for path, rows in results.items():
+        for row in rows:
+            if args.json:
+                print(json.dumps(dict(path=path, **row)))
+            elif "harmonic" in row:
+                print("%s  cutoff %g  stages %d  harmonic %d (%g Hz)  amplitude %.6g "
+                      "+/- %.2g  phase %.6g +/- %.2g"
+                      % (path, row["cutoff"], row["stages"], row["harmonic"],
+                         row["freq"], row["amplitude"], row["amplitude_sem"],
+                         row["phase"], row["phase_sem"]))
+            else:
+                print("%s  cutoff %g  stages %d  amplitude %.6g +/- %.2g  "
+                      "phase %.6g +/- %.2g" % (path, row["cutoff"], row["stages"],
+                                               row["amplitude"], row["amplitude_sem"],
+                                               row["phase"], row["phase_sem"]))
+    return 0 if results else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,146 @@
+'''
+Chunked reader for the record stream sent by the Teensy.
+
+In Normal Mode the Teensy prints every point as "signal, I, Q, R, phi"
+followed by the terminator "E"; in Fast Mode it prints a single "R, phi"
+record. Rather than pulling the stream one byte at a time, FrameReader
+reads whatever the serial port has buffered into a preallocated buffer,
+splits it on the terminator in bulk and carries any partial record over
+to the next chunk.
+
+Open the port with a short read timeout (e.g. 0.1 s) rather than
+timeout=None: reads then block without spinning, and the timeouts and
+cancel event passed to FrameReader are checked between reads.
+'''
+
+import collections
+import time
+
+
+class FrameReader(object):
+    '''
+    Iterates over the terminator-delimited records arriving on a serial port.
+    Use either records() or chunks() on a stream, not both.
+    Properties:
+    ser - the serial connection (anything with in_waiting and readinto)
+    terminator - byte string that ends each record
+    bytes_read - total number of bytes pulled from the port
+    records_read - total number of complete records handed out
+    timed_out - True if the last read gave up on its timeout
+    cancel - optional threading.Event; once set, reading stops
+    cancelled - True if reading stopped because cancel was set
+    '''
+
+    def __init__(self, ser, terminator=b'E', chunk_size=65536, cancel=None):
+        self.ser = ser
+        self.terminator = terminator
+        self.cancel = cancel
+        self.cancelled = False
+        self._buf = bytearray(chunk_size)
+        self._view = memoryview(self._buf)
+        self._pending = b'' # partial record carried over between chunks
+        self._ready = collections.deque() # complete records not yet handed out
+        self.bytes_read = 0
+        self.records_read = 0
+        self.timed_out = False
+
+    def _fill(self):
+        '''
+        Reads everything currently waiting on the port (at least one byte,
+        so this blocks according to the port timeout) into the buffer.
+        Returns the number of bytes read.
+        '''
+        n = min(max(self.ser.in_waiting, 1), len(self._buf))
+        n = self.ser.readinto(self._view[:n])
+        self.bytes_read += n
+        return n
+
+    def _stop(self, start, timeout):
+        '''Checks for cancellation or an expired timeout'''
+        if self.cancel is not None and self.cancel.is_set():
+            self.cancelled = True
+            return True
+        if timeout is not None and time.time() - start > timeout:
+            self.timed_out = True
+            return True
+        return False
+
+    def _split(self, n):
+        '''Splits the pending bytes plus n new bytes of buffer into records'''
+        parts = (self._pending + self._view[:n]).split(self.terminator)
+        self._pending = parts.pop()
+        self._ready.extend(parts)
+
+    def wait(self, timeout=None):
+        '''
+        Blocks until the first data arrive. Returns False if the timeout (in
+        seconds) expires or the reader is cancelled first.
+        '''
+        start = time.time()
+        while not self._pending:
+            if self._stop(start, timeout):
+                return False
+            n = self._fill()
+            self._pending = self._pending + self._view[:n]
+        return True
+
+    def readline(self, timeout=None):
+        '''
+        Returns the next newline-terminated line (without the newline), e.g.
+        the measured external reference frequency printed before the data.
+        Returns None if the timeout (in seconds) expires or the reader is
+        cancelled first.
+        '''
+        start = time.time()
+        while b'\n' not in self._pending:
+            if self._stop(start, timeout):
+                return None
+            n = self._fill()
+            self._pending = self._pending + self._view[:n]
+        line, self._pending = self._pending.split(b'\n', 1)
+        return line
+
+    def records(self, count=None, timeout=None):
+        '''
+        Yields complete records (bytes, terminator stripped) as they arrive.
+        Stops after count records, once timeout seconds have passed (setting
+        timed_out) or when cancelled (setting cancelled). Records that arrived
+        but were not consumed are kept for the next call.
+        '''
+        self.timed_out = False
+        if self.terminator in self._pending:
+            self._split(0)
+        start = time.time()
+        emitted = 0
+        while count is None or emitted < count:
+            if self._ready:
+                self.records_read += 1
+                emitted += 1
+                yield self._ready.popleft()
+                continue
+            if self._stop(start, timeout):
+                return
+            n = self._fill()
+            if n:
+                self._split(n)
+
+    def chunks(self, timeout=None, idle=None):
+        '''
+        Yields the raw bytes as they arrive, starting with anything already
+        buffered, for consumers that do their own framing (e.g. the binary
+        block format). Stops once timeout seconds have passed, or no data
+        have arrived for idle seconds (setting timed_out), or when cancelled.
+        Stop iterating when done with the stream.
+        '''
+        self.timed_out = False
+        if self._pending:
+            pending, self._pending = self._pending, b''
+            yield pending
+        start = last = time.time()
+        while True:
+            if self._stop(start, timeout) or self._stop(last, idle):
+                return
+            n = self._fill()
+            if n:
+                last = time.time()
+                yield bytes(self._view[:n])
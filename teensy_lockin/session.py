@@ -0,0 +1,156 @@
+'''
+Runs on several Teensies at once, one per serial port.
+
+Each board is driven by its own LockInClient in its own thread, which
+opens the port, sends the instruction and reads the results. The ports
+are all opened first, and the instructions are only sent once every board
+has opened (or failed to), so the boards start together however long
+their ports took to open. All the boards run at the same time, so a rig
+of several boards takes about as long as its slowest board rather than
+the sum of all of them. A board that fails to open (after the retries of
+LockInClient.connect) or errors out is reported without holding up the
+others, and a board still opening or running when the timeout is reached
+is cancelled.
+
+    session = Session(['/dev/ttyACM0', '/dev/ttyACM1'])
+    results = session.run(RunSettings(num_points=10000, cutoff=5))
+    for row in results.table():
+        print(row["device"], row["amplitude"], row["phase"])
+'''
+
+import concurrent.futures
+import threading
+import time
+
+from .client import LockInClient, RunSettings
+from .timing import PhaseTimer
+
+TABLE_COLUMNS = ["device", "status", "ref_freq", "points", "amplitude",
+                 "amplitude_sem", "phase", "phase_sem"]
+
+
+class SessionResult(object):
+    '''
+    Results of one run on every board of a Session.
+    Properties:
+    devices - the ports, in the order given to the Session
+    results - dict of port to RunResult, for the boards that ran
+    errors - dict of port to the exception raised, for those that failed
+    elapsed - time the run took over all boards (s)
+    '''
+
+    def __init__(self, devices):
+        self.devices = list(devices)
+        self.results = {}
+        self.errors = {}
+        self.elapsed = 0.0
+
+    def status(self, device):
+        '''"ok", "failed", "cancelled", "timed out", "no data" or "drifted"'''
+        if device in self.errors:
+            return "failed"
+        return self.results[device].status()
+
+    def table(self, percent=None):
+        '''
+        Returns a list of dicts with the TABLE_COLUMNS for each board: its
+        status, reference frequency, number of points and the average
+        amplitude (V) and phase (rad) with their standard errors (None in
+        Fast Mode, or without data).
+        '''
+        rows = []
+        for device in self.devices:
+            row = dict.fromkeys(TABLE_COLUMNS)
+            row["device"] = device
+            row["status"] = self.status(device)
+            result = self.results.get(device)
+            if result is not None:
+                row.update(result.summary(percent))
+            rows.append(row)
+        return rows
+
+    def to_dataframe(self, percent=None):
+        '''table() as a pandas DataFrame indexed by device (pandas is imported on demand)'''
+        import pandas as pd
+        return pd.DataFrame(self.table(percent), columns=TABLE_COLUMNS).set_index("device")
+
+
+class Session(object):
+    '''
+    Acquisitions on several boards at once.
+    Properties:
+    ports - serial ports (or URLs) of the boards
+    clients - dict of port to its LockInClient
+    timeout - seconds after which boards still running are cancelled, or None
+    log - function called with messages, prefixed by the port
+    '''
+
+    def __init__(self, ports, timeout=None, log=print):
+        self.ports = list(ports)
+        self.timeout = timeout
+        self.log = log
+        self.clients = dict((port, LockInClient(port, log=self._logger(port)))
+                            for port in self.ports)
+
+    def _logger(self, port):
+        return lambda *args: self.log(port + ":", *args)
+
+    def _settings_for(self, settings, port):
+        if isinstance(settings, dict):
+            return settings[port]
+        return settings if settings is not None else RunSettings()
+
+    def _acquire(self, port, settings, cancel, start, kwargs):
+        client = self.clients[port]
+        timings = PhaseTimer()
+        try:
+            with timings.phase("open"):
+                client.connect(cancel=cancel)
+        finally:
+            # a board that failed to open still lets the others start
+            with timings.phase("start"):
+                start.wait()
+        try:
+            return client.acquire(settings, cancel=cancel, timings=timings,
+                                  **kwargs)
+        finally:
+            client.close()
+
+    def run(self, settings=None, cancel=None, **kwargs):
+        '''
+        Runs every board and returns a SessionResult. settings is a
+        RunSettings for all the boards or a dict of port to RunSettings.
+        cancel is an optional threading.Event that cancels all of them.
+        Keyword arguments (e.g. progress, partial) are passed to each
+        LockInClient.acquire; callbacks are called from the boards' threads.
+        '''
+        result = SessionResult(self.ports)
+        start = time.perf_counter()
+        cancels = dict((port, threading.Event()) for port in self.ports)
+        # every board waits here, once open, before sending its instruction
+        barrier = threading.Barrier(len(self.ports))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(self.ports)) as pool:
+            running = dict((pool.submit(self._acquire, port,
+                                        self._settings_for(settings, port),
+                                        cancels[port], barrier, kwargs), port)
+                           for port in self.ports)
+            deadline = None if self.timeout is None else start + self.timeout
+            pending = set(running)
+            while pending:
+                wait = 0.1
+                if deadline is not None:
+                    wait = min(wait, max(deadline - time.perf_counter(), 0))
+                done, pending = concurrent.futures.wait(pending, wait)
+                if (cancel is not None and cancel.is_set()) or (
+                        deadline is not None and time.perf_counter() >= deadline):
+                    for future in pending:
+                        cancels[running[future]].set()
+                    deadline = None
+            for future, port in running.items():
+                try:
+                    result.results[port] = future.result()
+                except Exception as e:
+                    self.log(port + ":", "failed:", e)
+                    result.errors[port] = e
+        result.elapsed = time.perf_counter() - start
+        return result
@@ -0,0 +1,372 @@
+'''
+A software Teensy running teensy_lockin.ino, for testing and benchmarking
+the host software without hardware.
+
+SimulatedTeensy takes the instruction written by the host, synthesizes a
+noisy sinusoid, and sends back exactly what the sketch would: the
+reference frequency line, then the Normal, Fast or Raw Mode output in the
+requested format. Output is released at the rate the board would send
+it, allowing for the reference count, digitization, the 150 us delay
+after each ASCII record and the USB transfer rate. After the data the
+board waits for "DRX" (or times out) and resets, ready for the next
+instruction.
+
+In Continuous Mode the signal is synthesized a half buffer at a time as
+the run goes on, for as long as it lasts, and sent once each half would
+be digitized. DRX stops the stream. If the host leaves the board alone
+for longer than two halves take, the halves in between are skipped, as
+the sketch does.
+
+The simulator is also available as a pyserial URL, so anything that opens
+a port by name can use it:
+
+    ser = serial.serial_for_url('teensysim://?ref_freq=1000&noise=0.05')
+    LockInClient('teensysim://').run(RunSettings(num_points=5000))
+
+Query parameters are the keyword arguments of SimulatedTeensy.
+'''
+
+import time
+
+import numpy as np
+
+from .binary import (BLOCK_POINTS, FIELD_SIGNAL, FIELD_IQ, FIELD_RPHI, HEADER,
+                     encode_block, encode_blocks, record_dtype)
+from .decimate import boxcar_decimate
+from .engine import NUM_COEFFS, mix_and_filter
+from .instruction import (FAST, RAW, CONTINUOUS, ASCII, BINARY_IQ, REF_TOLERANCE,
+                          parse_instruction)
+from .reference import LUT_SIZES, achieved_freq
+
+MAX_DEVICE_POINTS = 50000 # maxPts in the sketch
+POINT_DELAY = 150e-6 # delayMicroseconds(150) after each ASCII record
+USB_RATE = 1.0e6 # bytes/s a Teensy 3.5 manages over USB full speed
+REFERENCE_SETUP_TIME = 0.75 # DAC ramp and delay in generateReferenceWave (s)
+RESET_TIME = 0.1 # time for the board to restart (s)
+MAX_WAIT = 5.0 # s the sketch waits for DRX after Fast and Continuous Mode runs
+TRIM_SIZE = 1 << 20 # read bytes kept before they are dropped in Continuous Mode
+
+ADC_RANGE = {'T35': (-4096, 4095), # 13-bit differential
+             'T40': (0, 1023)} # 10-bit single ended
+VOLTS_PER_COUNT = {'T35': 3.3/4096, 'T40': 3.3/1023}
+
+
+def synthesize_signal(num_points, ref_freq, sampling_rate, amplitude=1.0,
+                      phase=0.0, noise=0.1, offset=None, model='T35',
+                      rng=None, first=0):
+    '''
+    Returns the ADC counts (int16) digitized from
+    offset + amplitude * sin(2 pi ref_freq t + phase) plus Gaussian noise,
+    all in volts, starting at a rising edge of the reference (or at sample
+    first after it). offset defaults to 0 V for the differential Teensy 3.5
+    input and to mid-range for the Teensy 4.0.
+    '''
+    if rng is None:
+        rng = np.random.default_rng()
+    if offset is None:
+        offset = 0.0 if model == 'T35' else 1.65
+    t = (first + np.arange(num_points)) / sampling_rate
+    volts = (offset + amplitude * np.sin(2 * np.pi * ref_freq * t + phase)
+             + rng.normal(0, noise, num_points))
+    low, high = ADC_RANGE[model]
+    counts = np.rint(volts / VOLTS_PER_COUNT[model])
+    return np.clip(counts, low, high).astype(np.int16)
+
+
+def format_records(values):
+    '''
+    Returns a list of the Normal Mode ASCII records mixAndFilter prints for
+    an (n, 5) array of values (Serial.print uses 2 decimals)
+    '''
+    return [('%d, %.2f, %.2f, %.2f, %.2fE' % tuple(row)).encode()
+            for row in values.tolist()]
+
+
+class SimulatedTeensy(object):
+    '''
+    The board side of the serial connection.
+    Properties:
+    ref_freq - frequency of the external reference (Hz)
+    amplitude, phase, noise, offset, model - passed to synthesize_signal
+    compute_time - time the board takes to mix and filter a point (s), on
+                   top of the ASCII delay
+    usb_rate - most bytes/s sent over USB
+    time_scale - multiplies the modelled durations; 0 sends everything at
+                 once
+    settings - the parsed instruction of the current run, or None when idle
+    signal - the digitized signal of the current run
+    runs - number of instructions received
+    resets - number of times the board has reset itself
+    drx_received - True if the host sent DRX during the current run
+    '''
+
+    def __init__(self, ref_freq=1000.0, amplitude=1.0, phase=0.0, noise=0.1,
+                 offset=None, model='T35', compute_time=0.0,
+                 usb_rate=USB_RATE, time_scale=1.0, seed=None,
+                 clock=time.monotonic):
+        self.ref_freq = ref_freq
+        self.amplitude = amplitude
+        self.phase = phase
+        self.noise = noise
+        self.offset = offset
+        self.model = model
+        self.compute_time = compute_time
+        self.usb_rate = usb_rate
+        self.time_scale = time_scale
+        self.rng = np.random.default_rng(seed)
+        self.clock = clock
+        self.runs = 0
+        self.resets = 0
+        self._idle()
+
+    def _idle(self):
+        '''Waits for the next instruction'''
+        self.settings = None
+        self.signal = None
+        self.drx_received = False
+        self._instruction = b''
+        self._received = b''
+        self._output = b''
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._times = np.full(1, -np.inf)
+        self._pos = 0
+        self._done_time = None
+        self._reset_time = None
+        self._stream = None # state of a Continuous Mode run
+
+    def receive(self, data):
+        '''Bytes written by the host'''
+        now = self.clock()
+        self._check_reset(now)
+        if self.settings is None:
+            self._instruction += data
+            if b'F' in self._instruction:
+                self._start(self._instruction, now)
+        else:
+            self._received += data
+            if b'X' in self._received and not self.drx_received:
+                self.drx_received = True
+                if self._stream is not None and not self._stream["done"]:
+                    # streamSignal checks for X between halves
+                    self._generate(now)
+                    self._finish(now)
+                # the sketch only reads the port once all the data are sent
+                self._reset_time = max(now, self._done_time) + self._scaled(RESET_TIME)
+
+    def ready_time(self):
+        '''
+        Time at which the board will have reset after the current run, or
+        None if it is idle. Its USB port is gone until then.
+        '''
+        if self.settings is None:
+            return None
+        return self._reset_time
+
+    def available(self):
+        '''Number of bytes sent by the board and not yet read'''
+        now = self.clock()
+        self._check_reset(now)
+        if self._stream is not None:
+            if now < self._stream["start"]: # still counting the reference
+                return 0
+            self._generate(now)
+            return len(self._output) - self._pos
+        sent = np.searchsorted(self._times, now, side='right') - 1
+        return int(self._offsets[max(sent, 0)]) - self._pos
+
+    def read(self, size):
+        '''Returns up to size of the bytes available now'''
+        n = max(min(size, self.available()), 0)
+        data = self._output[self._pos:self._pos + n]
+        self._pos += n
+        if self._stream is not None and self._pos > TRIM_SIZE:
+            self._output = self._output[self._pos:]
+            self._pos = 0
+        return data
+
+    def next_time(self):
+        '''Time at which more bytes will become available, or None'''
+        s = self._stream
+        if s is not None:
+            if s["done"]:
+                return None
+            return s["start"] + self._scaled((s["sent"] + s["half"]) / s["rate"])
+        later = np.searchsorted(self._times, self.clock(), side='right')
+        if later < len(self._times):
+            return self._times[later]
+        return None
+
+    def _scaled(self, seconds):
+        return seconds * self.time_scale
+
+    def _check_reset(self, now):
+        if self._reset_time is not None and now >= self._reset_time:
+            self.resets += 1
+            self._idle()
+
+    def _start(self, instruction, now):
+        '''Runs the measurement and schedules the output, like setup()'''
+        settings = parse_instruction(instruction)
+        self.settings = settings
+        self.runs += 1
+        mode = settings["mode"]
+        numPoints = settings["num_points"]
+        if mode != CONTINUOUS:
+            numPoints = min(numPoints, MAX_DEVICE_POINTS)
+        rate = settings["sampling_rate"]
+        if rate <= 0 or (numPoints <= NUM_COEFFS and mode != CONTINUOUS):
+            # the sketch would hang or send garbage; send nothing at all
+            self._done_time = now
+            return
+        stages = settings["stages"] if settings["stages"] in (1, 2, 3) else 4
+
+        if settings["ref_select"] == 0:
+            # sizes not in SineLUT.h fall back to the first table
+            lutSize = settings["lut_size"]
+            if lutSize not in LUT_SIZES:
+                lutSize = LUT_SIZES[0]
+            trueFreq = achieved_freq(settings["freq_dur"], lutSize,
+                                     settings["pdb_mod"])
+            refFreq = trueFreq
+            start = now + self._scaled(REFERENCE_SETUP_TIME)
+        else:
+            trueFreq = self.ref_freq
+            countPeriod_ms = settings["freq_dur"]
+            given = settings["ref_mhz"] / 1000.0
+            check_ms = settings["ref_check"]
+            counted_ms = 0
+            refFreq = None
+            if given > 0 and check_ms <= 0:
+                refFreq = given # no count
+            elif given > 0:
+                counted_ms += check_ms
+                checked = int(trueFreq * check_ms / 1000) / float(check_ms) * 1000
+                if abs(checked - given) <= REF_TOLERANCE * given - 1000.0 / check_ms:
+                    refFreq = given
+            if refFreq is None:
+                counted_ms += max(countPeriod_ms, 0)
+                edgeCounts = int(trueFreq * countPeriod_ms / 1000)
+                refFreq = edgeCounts / float(countPeriod_ms) * 1000
+            start = now + self._scaled(counted_ms / 1000)
+        if mode == CONTINUOUS:
+            self._start_stream(refFreq, trueFreq, rate, max(numPoints, 0), start)
+            return
+        self.signal = synthesize_signal(numPoints, trueFreq, rate,
+                                        self.amplitude, self.phase, self.noise,
+                                        self.offset, self.model, self.rng)
+        start += self._scaled(numPoints / rate) # digitization
+
+        pieces = [] # (bytes, number of points computed when they are sent)
+        if mode == RAW:
+            pieces.append((('%.6f\r\n' % refFreq).encode(), 0))
+            pieces += self._blocks(self.signal, None, 0)
+            perPoint = 0.0
+        else:
+            if settings["ref_select"] == 1:
+                pieces.append((('%.2f\r\n' % refFreq).encode(), 0))
+            values = mix_and_filter(self.signal, refFreq, rate,
+                                    settings["cutoff"], stages)
+            perPoint = self.compute_time
+            if mode == FAST:
+                # the sketch divides by all the points, not only those filtered
+                pieces.append((('%.2f, %.2fE' % (values[:, 3].sum() / numPoints,
+                                                 values[:, 4].sum() / numPoints)).encode(),
+                               len(values)))
+            else:
+                # one point is sent for every decimation points computed
+                values = boxcar_decimate(values, settings["decimation"])
+                perPoint *= settings["decimation"]
+                if settings["wire_format"] == ASCII:
+                    perPoint += POINT_DELAY
+                    pieces += [(record, k + 1) for k, record
+                               in enumerate(format_records(values))]
+                else:
+                    pieces += self._blocks(values, settings["wire_format"], perPoint)
+        # reset after maxWait if the host never sends DRX
+        maxWait = MAX_WAIT if mode == FAST else (numPoints + 5000) / 1000
+        self._schedule(pieces, start, perPoint, maxWait)
+
+    def _start_stream(self, refFreq, trueFreq, rate, numPoints, start):
+        '''Starts a Continuous Mode run, digitizing from time start'''
+        half = max((rate // 10) // BLOCK_POINTS * BLOCK_POINTS, BLOCK_POINTS)
+        half = min(half, (MAX_DEVICE_POINTS // 2) // BLOCK_POINTS * BLOCK_POINTS)
+        self._stream = {"start": start, "rate": rate, "freq": trueFreq,
+                        "total": numPoints, "half": half, "sent": 0, "seq": 0,
+                        "done": False}
+        self._output = ('%.6f\r\n' % refFreq).encode()
+
+    def _generate(self, now):
+        '''Sends the halves of mySignal digitized by now (Continuous Mode)'''
+        s = self._stream
+        if s["done"] or now < s["start"]:
+            return
+        half = s["half"]
+        if self.time_scale:
+            taken = int((now - s["start"]) / self.time_scale * s["rate"])
+        else:
+            taken = s["sent"] + half # as fast as the host reads
+        if s["total"]:
+            taken = min(taken, s["total"])
+        while taken - s["sent"] > 2 * half: # overwritten before being sent
+            s["sent"] += half
+            s["seq"] += half // BLOCK_POINTS
+        pieces = []
+        while taken - s["sent"] >= half or (taken == s["total"] and s["sent"] < taken):
+            count = min(half, taken - s["sent"])
+            signal = synthesize_signal(count, s["freq"], s["rate"], self.amplitude,
+                                       self.phase, self.noise, self.offset,
+                                       self.model, self.rng, first=s["sent"])
+            pieces.append(encode_blocks(signal, first_seq=s["seq"], end=False))
+            s["seq"] += -(-count // BLOCK_POINTS)
+            s["sent"] += count
+        self._output += b''.join(pieces)
+        if s["total"] and s["sent"] >= s["total"]:
+            self._finish(now)
+
+    def _finish(self, now):
+        '''Ends a Continuous Mode stream with the end-of-stream block'''
+        s = self._stream
+        s["done"] = True
+        self._output += encode_block(s["seq"], np.zeros(0, record_dtype(FIELD_SIGNAL)),
+                                     FIELD_SIGNAL)
+        self._done_time = now
+        self._reset_time = now + MAX_WAIT
+
+    def _blocks(self, values, wire_format, perPoint):
+        '''Binary blocks of values, each paired with the points it completes'''
+        if wire_format is None: # Raw Mode signal
+            data = encode_blocks(values)
+            fields = FIELD_SIGNAL
+        elif wire_format == BINARY_IQ:
+            data = encode_blocks(values[:, 0], values[:, 1], values[:, 2])
+            fields = FIELD_SIGNAL | FIELD_IQ
+        else:
+            data = encode_blocks(*values.T)
+            fields = FIELD_SIGNAL | FIELD_IQ | FIELD_RPHI
+        recordSize = record_dtype(fields).itemsize
+        pieces = []
+        pos = 0
+        done = 0
+        while pos < len(data):
+            count = min(BLOCK_POINTS, len(values) - done)
+            size = HEADER.size + count * recordSize
+            done += count
+            pieces.append((data[pos:pos + size], done))
+            pos += size
+        return pieces
+
+    def _schedule(self, pieces, start, perPoint, maxWait):
+        '''Sets when each piece of output is sent'''
+        self._output = b''.join(piece for piece, _ in pieces)
+        sizes = np.array([len(piece) for piece, _ in pieces], dtype=np.int64)
+        points = np.array([done for _, done in pieces], dtype=np.float64)
+        self._offsets = np.concatenate(([0], np.cumsum(sizes)))
+        computed = start + self._scaled(points * perPoint)
+        if self.usb_rate:
+            sent = start + self._scaled(self._offsets[1:] / self.usb_rate)
+            computed = np.maximum(computed, sent)
+        # output is sent in order
+        self._times = np.concatenate(([-np.inf], np.maximum.accumulate(computed)))
+        self._done_time = self._times[-1]
+        # maxWait is how long the host has to read the data, so not scaled
+        self._reset_time = self._done_time + maxWait
@@ -0,0 +1,183 @@
+'''
+Statistics of the lock-in output, updated as records arrive.
+
+RunningStats keeps the count, mean, variance (Welford's method, updated a
+block at a time with Chan's formula for combining), minimum and maximum
+of a stream of values. CircularStats does the same for angles, so that
+phases near +-pi average correctly. LockInStats combines the two for the
+amplitude and phase over the last percent of a run (or from a given
+point, such as where the filter has settled; see convergence.py): since
+the number of points is known when the run starts, points before the
+window are simply skipped, and the results are ready when the last
+record arrives.
+
+Standard errors treat the points as independent. The filtered output is
+correlated over roughly the filter time constant, so they are lower
+bounds unless the points are much further apart than that.
+'''
+
+import math
+
+import numpy as np
+
+
+class RunningStats(object):
+    '''
+    Count, mean, variance, minimum and maximum of a stream of values.
+    Properties:
+    count - number of values
+    mean - their mean (nan if none)
+    minimum, maximum - their extremes (nan if none)
+    '''
+
+    def __init__(self):
+        self.count = 0
+        self.mean = math.nan
+        self._m2 = 0.0 # sum of squared deviations from the mean
+        self.minimum = math.nan
+        self.maximum = math.nan
+
+    def update(self, values):
+        '''Adds an array of values'''
+        values = np.asarray(values, dtype=np.float64).ravel()
+        n = len(values)
+        if n == 0:
+            return
+        mean = values.mean()
+        m2 = np.square(values - mean).sum()
+        if self.count == 0:
+            self.count, self.mean, self._m2 = n, mean, m2
+            self.minimum, self.maximum = values.min(), values.max()
+            return
+        total = self.count + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self._m2 += m2 + delta * delta * self.count * n / total
+        self.count = total
+        self.minimum = min(self.minimum, values.min())
+        self.maximum = max(self.maximum, values.max())
+
+    def variance(self):
+        '''Sample variance'''
+        if self.count < 2:
+            return math.nan
+        return self._m2 / (self.count - 1)
+
+    def std(self):
+        return math.sqrt(self.variance())
+
+    def sem(self):
+        '''Standard error of the mean'''
+        return self.std() / math.sqrt(self.count) if self.count else math.nan
+
+
+class CircularStats(object):
+    '''
+    Mean direction and spread of a stream of angles in radians, from the sums
+    of their sines and cosines (and of twice the angles, for the standard
+    error).
+    Properties:
+    count - number of angles
+    minimum, maximum - their extremes (as given, not wrapped)
+    '''
+
+    def __init__(self):
+        self.count = 0
+        self._sums = np.zeros(4) # cos, sin, cos 2x, sin 2x
+        self.minimum = math.nan
+        self.maximum = math.nan
+
+    def update(self, angles):
+        '''Adds an array of angles'''
+        angles = np.asarray(angles, dtype=np.float64).ravel()
+        if len(angles) == 0:
+            return
+        self._sums += (np.cos(angles).sum(), np.sin(angles).sum(),
+                       np.cos(2 * angles).sum(), np.sin(2 * angles).sum())
+        self.minimum = np.fmin(self.minimum, angles.min())
+        self.maximum = np.fmax(self.maximum, angles.max())
+        self.count += len(angles)
+
+    def mean(self):
+        '''Mean direction in (-pi, pi]'''
+        if self.count == 0:
+            return math.nan
+        return math.atan2(self._sums[1], self._sums[0])
+
+    def resultant_length(self):
+        '''Mean resultant length, 1 when all angles are equal'''
+        if self.count == 0:
+            return math.nan
+        return math.hypot(self._sums[0], self._sums[1]) / self.count
+
+    def std(self):
+        '''Circular standard deviation, sqrt(-2 ln R)'''
+        r = self.resultant_length()
+        if r == 0:
+            return math.inf
+        return math.sqrt(-2 * math.log(min(r, 1.0)))
+
+    def sem(self):
+        '''Standard error of the mean direction, from the circular dispersion'''
+        r = self.resultant_length()
+        if self.count < 2 or not r > 0:
+            return math.nan
+        mu = self.mean()
+        rho2 = (self._sums[2] * math.cos(2 * mu)
+                + self._sums[3] * math.sin(2 * mu)) / self.count
+        dispersion = max(1 - rho2, 0.0) / (2 * r * r)
+        return math.sqrt(dispersion / self.count)
+
+
+class LockInStats(object):
+    '''
+    Amplitude and phase statistics over the last percent of a run's points,
+    or from point start if given.
+    Properties:
+    start - index of the first point in the window
+    seen - number of points passed to update so far
+    amplitude - RunningStats of R, in ADC counts
+    phase - CircularStats of Phi
+    scale - converts R to the amplitude in volts (2 * volts per count)
+    '''
+
+    def __init__(self, expected, percent=100, scale=1.0, start=None):
+        self.start = window_start(expected, percent) if start is None else start
+        self.seen = 0
+        self.amplitude = RunningStats()
+        self.phase = CircularStats()
+        self.scale = scale
+
+    @classmethod
+    def from_data(cls, R, phi, percent=100, scale=1.0, start=None):
+        '''Statistics of complete columns of R and Phi'''
+        stats = cls(len(R), percent, scale, start)
+        stats.update(R, phi)
+        return stats
+
+    def update(self, R, phi):
+        '''Adds the next points of the run'''
+        skip = max(self.start - self.seen, 0)
+        self.seen += len(R)
+        self.amplitude.update(R[skip:])
+        self.phase.update(phi[skip:])
+
+    def summary(self):
+        '''Dict of the statistics, with the amplitude in volts'''
+        a = self.amplitude
+        return {"count": a.count,
+                "amplitude": a.mean * self.scale,
+                "amplitude_std": a.std() * self.scale,
+                "amplitude_sem": a.sem() * self.scale,
+                "amplitude_min": a.minimum * self.scale,
+                "amplitude_max": a.maximum * self.scale,
+                "phase": self.phase.mean(),
+                "phase_std": self.phase.std(),
+                "phase_sem": self.phase.sem(),
+                "phase_min": self.phase.minimum,
+                "phase_max": self.phase.maximum}
+
+
+def window_start(count, percent):
+    '''Index of the first of the last percent of count points'''
+    return int(((100 - int(percent)) / 100) * count)
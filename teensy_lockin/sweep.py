@@ -0,0 +1,188 @@
+'''
+Frequency sweeps: one run for each of a list of settings on one board, one
+after another, as fast as the board allows.
+
+The Teensy resets itself after every run and its USB port disappears until
+it has restarted, so the port cannot be kept open from one run to the
+next. Sweep reopens it as soon as it is back (LockInClient.connect retries
+with a growing delay rather than sleeping for a fixed time), sends the
+next instruction straight away, and hands each finished run to a
+background thread to be processed while the next one is measured.
+
+    sweep = Sweep('/dev/ttyACM0')
+    result = sweep.run(internal_sweep([100, 200, 500, 1000], num_points=5000))
+    for row in result.table():
+        print(row["freq"], row["amplitude"], row["phase"])
+    print("cycle time:", result.mean_cycle_time())
+
+For an external reference, pass RunSettings with EXTERNAL and a before
+callback that sets the source for each point.
+'''
+
+import concurrent.futures
+import copy
+import time
+
+from .client import LockInClient, RunSettings, INTERNAL, RECONNECT_TIMEOUT
+from .reference import default_planner
+from .timing import PhaseTimer
+
+TABLE_COLUMNS = ["index", "freq", "status", "points", "amplitude",
+                 "amplitude_sem", "phase", "phase_sem", "cycle_time"]
+
+
+def internal_sweep(freqs, settings=None, planner=None, **kwargs):
+    '''
+    Returns RunSettings for the internal reference at each of freqs (Hz),
+    copied from settings or made from keyword arguments. Each uses the sine
+    table and PDB modulus giving the nearest frequency, from planner
+    (reference.default_planner() if None).
+    '''
+    base = settings if settings is not None else RunSettings(**kwargs)
+    if planner is None:
+        planner = default_planner()
+    points = []
+    for plan in planner.nearest_many(freqs):
+        point = copy.copy(base)
+        point.ref_select = INTERNAL
+        point.freq_dur = int(round(plan.requested))
+        point.lut_size = plan.lut_size
+        point.pdb_mod = plan.mod
+        points.append(point)
+    return points
+
+
+class SweepResult(object):
+    '''
+    Results of a sweep.
+    Properties:
+    points - the RunSettings of each point
+    results - RunResult of each point measured (None if it failed)
+    processed - what process returned for each point measured (by default
+                RunResult.summary()), or None
+    errors - dict of point index to the exception raised
+    cycle_times - time taken by each point, from the end of the previous
+                  one, including reopening the port (s)
+    elapsed - time the whole sweep took (s)
+    '''
+
+    def __init__(self, points):
+        self.points = list(points)
+        self.results = []
+        self.processed = []
+        self.errors = {}
+        self.cycle_times = []
+        self.elapsed = 0.0
+
+    def mean_cycle_time(self):
+        '''Average time per point (s), or None before any point'''
+        if not self.cycle_times:
+            return None
+        return sum(self.cycle_times) / len(self.cycle_times)
+
+    def freq(self, index):
+        '''Reference frequency of a point: as measured, or the internal one'''
+        result = self.results[index]
+        if result is not None and result.ref_freq is not None:
+            return result.ref_freq
+        settings = self.points[index]
+        if settings.ref_select == INTERNAL:
+            return settings.actual_internal_freq()
+        return None
+
+    def table(self, percent=None):
+        '''
+        Returns a list of dicts with the TABLE_COLUMNS for each point
+        measured, as in SessionResult.table.
+        '''
+        rows = []
+        for index, result in enumerate(self.results):
+            row = dict.fromkeys(TABLE_COLUMNS)
+            row["index"] = index
+            row["cycle_time"] = self.cycle_times[index]
+            if result is None:
+                row["status"] = "failed"
+            else:
+                row.update(result.summary(percent))
+                del row["ref_freq"]
+                row["status"] = result.status()
+            row["freq"] = self.freq(index)
+            rows.append(row)
+        return rows
+
+    def to_dataframe(self, percent=None):
+        '''table() as a pandas DataFrame (pandas is imported on demand)'''
+        import pandas as pd
+        return pd.DataFrame(self.table(percent), columns=TABLE_COLUMNS).set_index("index")
+
+
+class Sweep(object):
+    '''
+    Runs a list of settings on one board.
+    Properties:
+    client - the LockInClient used
+    reconnect_timeout - how long to wait for the port after each reset (s)
+    log - function called with messages about the sweep
+    '''
+
+    def __init__(self, port, reconnect_timeout=RECONNECT_TIMEOUT, log=print):
+        self.client = LockInClient(port, log=log)
+        self.reconnect_timeout = reconnect_timeout
+        self.log = log
+
+    def run(self, points, process=None, before=None, cancel=None, progress=None):
+        '''
+        Measures each RunSettings of points in turn and returns a
+        SweepResult. process(result) is called in a background thread for
+        each RunResult while the next point is measured (RunResult.summary
+        by default). before(index, settings) is called before each point,
+        for instance to set an external source. progress(index, result) is
+        called after each point, from this thread. cancel is an optional
+        threading.Event that stops the current point and the sweep.
+        '''
+        if process is None:
+            process = lambda result: result.summary()
+        sweep = SweepResult(points)
+        start = last = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as pool:
+            futures = []
+            for index, settings in enumerate(sweep.points):
+                if cancel is not None and cancel.is_set():
+                    break
+                if before is not None:
+                    before(index, settings)
+                result = self._measure(index, settings, cancel, sweep)
+                now = time.perf_counter()
+                sweep.cycle_times.append(now - last)
+                last = now
+                sweep.results.append(result)
+                futures.append(None if result is None
+                               else pool.submit(process, result))
+                self.log("Point %d of %d: %.3f s" % (index + 1, len(sweep.points),
+                                                    sweep.cycle_times[-1]))
+                if progress is not None:
+                    progress(index, result)
+            for index, future in enumerate(futures):
+                try:
+                    sweep.processed.append(None if future is None else future.result())
+                except Exception as e:
+                    self.log("Processing point %d failed:" % (index + 1), e)
+                    sweep.processed.append(None)
+                    sweep.errors[index] = e
+        sweep.elapsed = time.perf_counter() - start
+        return sweep
+
+    def _measure(self, index, settings, cancel, sweep):
+        '''One point; returns its RunResult, or None if it failed'''
+        timings = PhaseTimer()
+        try:
+            with timings.phase("open"):
+                self.client.connect(timeout=self.reconnect_timeout)
+            try:
+                return self.client.acquire(settings, cancel=cancel, timings=timings)
+            finally:
+                self.client.close()
+        except Exception as e:
+            self.log("Point %d failed:" % (index + 1), e)
+            sweep.errors[index] = e
+            return None
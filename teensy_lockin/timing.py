@@ -0,0 +1,46 @@
+'''
+Per-phase timing of a run.
+
+LockInClient records how long each phase of an acquisition takes in a
+PhaseTimer kept with the RunResult (opening the port, writing the
+instruction, waiting for the first byte, the transfer, parsing), and the
+GUI and benchmarks add their own phases (DataFrame, averaging, plot,
+save). Timing costs two clock reads per phase.
+'''
+
+import time
+from contextlib import contextmanager
+
+
+class PhaseTimer(object):
+    '''
+    Durations of the phases of a run, in the order they first ran.
+    Properties:
+    phases - dict of phase name to seconds spent in it
+    '''
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.phases = {}
+
+    @contextmanager
+    def phase(self, name):
+        '''Times the enclosed block as phase name (adding to earlier time)'''
+        start = self.clock()
+        try:
+            yield
+        finally:
+            self.add(name, self.clock() - start)
+
+    def add(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def total(self):
+        return sum(self.phases.values())
+
+    def as_dict(self):
+        return dict(self.phases)
+
+    def summary(self):
+        '''One line listing the phases, e.g. "open 0.012 s, write 0.000 s"'''
+        return ", ".join("%s %.3f s" % item for item in self.phases.items())
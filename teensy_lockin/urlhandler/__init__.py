@@ -0,0 +1,4 @@
+'''
+pyserial URL handlers, found by serial.serial_for_url once this package is
+in serial.protocol_handler_packages (teensy_lockin.client adds it).
+'''
@@ -0,0 +1,218 @@
+'''
+pyserial handler for teensyreplay:// URLs, a serial port that plays back
+a recording made with recording.SerialRecorder:
+
+    teensyreplay://path/to/runs.tlrec[?speed=1&connection=0]
+
+Each time the URL is opened, the next connection in the recording is
+replayed (from connection, 0 by default), as the port of a board that
+resets after each run. The bytes read in the recording are released as
+long after the host's write that preceded them (or the opening) as they
+were recorded, divided by speed; speed 0 releases them as soon as that
+write has been made. The host is given the same reads as were recorded,
+so records are split across reads as they were. Read timeouts still take
+their time, so a recorded timeout replays in full.
+'''
+
+import os
+import time
+import urllib.parse
+
+from serial.serialutil import SerialBase, SerialException, PortNotOpenError, to_bytes
+
+from ..recording import READ, WRITE, read_connections
+
+OPTIONS = {'speed': float, 'connection': int}
+
+# next connection to replay, by recording
+_next_connection = {}
+# connections of each recording read, by path, with its size and modification time
+_recordings = {}
+
+
+def _connections(path):
+    '''The Connections of a recording, read again only when it has changed'''
+    stat = os.stat(path)
+    key = (stat.st_size, stat.st_mtime_ns)
+    cached = _recordings.get(path)
+    if cached is None or cached[0] != key:
+        cached = _recordings[path] = (key, read_connections(path))
+    return cached[1]
+
+
+class Serial(SerialBase):
+    '''
+    Serial port replaying a recorded connection.
+    Properties:
+    written - the bytes the host has written, one item per write
+    '''
+
+    def __init__(self, *args, **kwargs):
+        self._reads = None
+        self.written = []
+        super(Serial, self).__init__(*args, **kwargs)
+
+    def open(self):
+        if self.is_open:
+            raise SerialException("Port is already open.")
+        if self._port is None:
+            raise SerialException("Port must be configured before it can be used.")
+        path, options = self.from_url(self.port)
+        try:
+            connections = _connections(path)
+        except (OSError, ValueError) as e:
+            raise SerialException("could not open port {}: {}".format(self.port, e))
+        index = options.get('connection', _next_connection.get(self.port, 0))
+        if index >= len(connections):
+            raise SerialException("could not open port {}: only {} connections "
+                                  "were recorded".format(self.port, len(connections)))
+        _next_connection[self.port] = index + 1
+        self._speed = options.get('speed', 1.0)
+        connection = connections[index]
+        # each read is timed from the write before it, or the opening
+        self._reads = []
+        writes = 0
+        anchor = connection.opened
+        for event in connection.events:
+            if event.kind == WRITE:
+                writes += 1
+                anchor = event.time
+            elif event.kind == READ:
+                self._reads.append((writes, event.time - anchor, event.data))
+        self._next = 0 # first read not yet handed out
+        self._offset = 0 # bytes of it already handed out
+        self._write_times = [time.monotonic()] # of the opening, then of each write
+        self.written = []
+        self.is_open = True
+
+    def close(self):
+        self.is_open = False
+        self._reads = None
+
+    def from_url(self, url):
+        '''Returns the path of the recording and the options given in the URL'''
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme != "teensyreplay":
+            raise SerialException(
+                'expected a string in the form "teensyreplay://path[?option=value...]": '
+                'not starting with teensyreplay:// ({!r})'.format(parts.scheme))
+        path = parts.netloc + parts.path
+        if not path:
+            raise SerialException("no recording given in {!r}".format(url))
+        options = {}
+        for option, values in urllib.parse.parse_qs(parts.query, True).items():
+            if option not in OPTIONS:
+                raise SerialException('unknown option: {!r}'.format(option))
+            try:
+                options[option] = OPTIONS[option](values[0])
+            except ValueError as e:
+                raise SerialException('bad value for {}: {}'.format(option, e))
+        return path, options
+
+    def _due(self, index):
+        '''When read index is released, or None until its write has been made'''
+        writes, delay, data = self._reads[index]
+        if writes >= len(self._write_times):
+            return None
+        if self._speed <= 0:
+            return self._write_times[writes]
+        return self._write_times[writes] + delay / self._speed
+
+    def _waiting(self):
+        '''Bytes of the current read that have been released'''
+        if self._next >= len(self._reads):
+            return 0
+        due = self._due(self._next)
+        if due is None or due > time.monotonic():
+            return 0
+        return len(self._reads[self._next][2]) - self._offset
+
+    def _reconfigure_port(self):
+        '''Nothing to configure'''
+
+    @property
+    def in_waiting(self):
+        if not self.is_open:
+            raise PortNotOpenError()
+        return self._waiting()
+
+    def read(self, size=1):
+        '''
+        Reads size bytes, returning fewer if the timeout expires first
+        '''
+        if not self.is_open:
+            raise PortNotOpenError()
+        deadline = None if self._timeout is None else time.monotonic() + self._timeout
+        data = bytearray()
+        while len(data) < size:
+            n = min(self._waiting(), size - len(data))
+            if n > 0:
+                chunk = self._reads[self._next][2]
+                data += chunk[self._offset:self._offset + n]
+                self._offset += n
+                if self._offset == len(chunk):
+                    self._next += 1
+                    self._offset = 0
+                continue
+            now = time.monotonic()
+            if deadline is not None and now >= deadline:
+                break
+            # sleep until the next read is due, but notice writes promptly
+            wait = 0.01
+            if self._next < len(self._reads):
+                due = self._due(self._next)
+                if due is not None:
+                    wait = min(max(due - now, 0), wait)
+            if deadline is not None:
+                wait = min(wait, deadline - now)
+            time.sleep(wait)
+        return bytes(data)
+
+    def write(self, data):
+        if not self.is_open:
+            raise PortNotOpenError()
+        data = to_bytes(data)
+        self.written.append(data)
+        self._write_times.append(time.monotonic())
+        return len(data)
+
+    def reset_input_buffer(self):
+        '''
+        Nothing to discard: the recording holds what was read after the
+        host discarded its input
+        '''
+        if not self.is_open:
+            raise PortNotOpenError()
+
+    def reset_output_buffer(self):
+        if not self.is_open:
+            raise PortNotOpenError()
+
+    @property
+    def out_waiting(self):
+        return 0
+
+    def _update_break_state(self):
+        pass
+
+    def _update_rts_state(self):
+        pass
+
+    def _update_dtr_state(self):
+        pass
+
+    @property
+    def cts(self):
+        return True
+
+    @property
+    def dsr(self):
+        return True
+
+    @property
+    def ri(self):
+        return False
+
+    @property
+    def cd(self):
+        return True
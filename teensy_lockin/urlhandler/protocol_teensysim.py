@@ -0,0 +1,148 @@
+'''
+pyserial handler for teensysim:// URLs, a serial port connected to a
+SimulatedTeensy:
+
+    teensysim://[?ref_freq=1000&amplitude=1&noise=0.1&time_scale=1&...]
+
+Query parameters are the keyword arguments of SimulatedTeensy. As with a
+real board, whose USB port disappears while it restarts, a URL cannot be
+opened again until the board has reset after the last run on it.
+'''
+
+import time
+import urllib.parse
+
+from serial.serialutil import SerialBase, SerialException, PortNotOpenError, to_bytes
+
+from ..simulator import SimulatedTeensy
+
+OPTIONS = {'ref_freq': float, 'amplitude': float, 'phase': float,
+           'noise': float, 'offset': float, 'model': str,
+           'compute_time': float, 'usb_rate': float, 'time_scale': float,
+           'seed': int}
+
+# URL of each board still resetting after a run, and when it is back
+_resetting = {}
+
+
+class Serial(SerialBase):
+    '''Serial port connected to a simulated Teensy'''
+
+    def __init__(self, *args, **kwargs):
+        self.device = None
+        super(Serial, self).__init__(*args, **kwargs)
+
+    def open(self):
+        if self.is_open:
+            raise SerialException("Port is already open.")
+        if self._port is None:
+            raise SerialException("Port must be configured before it can be used.")
+        if time.monotonic() < _resetting.get(self.port, -float('inf')):
+            # like a real board, the port is gone while the board restarts
+            raise SerialException("could not open port {}: the board is "
+                                  "resetting".format(self.port))
+        self.device = SimulatedTeensy(**self.from_url(self.port))
+        self.is_open = True
+
+    def close(self):
+        if self.device is not None and self.device.ready_time() is not None:
+            _resetting[self.port] = self.device.ready_time()
+        self.is_open = False
+        self.device = None
+
+    def from_url(self, url):
+        '''Returns the SimulatedTeensy keyword arguments given in the URL'''
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme != "teensysim":
+            raise SerialException(
+                'expected a string in the form "teensysim://[?option=value...]": '
+                'not starting with teensysim:// ({!r})'.format(parts.scheme))
+        kwargs = {}
+        for option, values in urllib.parse.parse_qs(parts.query, True).items():
+            if option not in OPTIONS:
+                raise SerialException('unknown option: {!r}'.format(option))
+            try:
+                kwargs[option] = OPTIONS[option](values[0])
+            except ValueError as e:
+                raise SerialException('bad value for {}: {}'.format(option, e))
+        return kwargs
+
+    def _reconfigure_port(self):
+        '''Nothing to configure; USB serial ignores the baud rate'''
+
+    @property
+    def in_waiting(self):
+        if not self.is_open:
+            raise PortNotOpenError()
+        return self.device.available()
+
+    def read(self, size=1):
+        '''
+        Reads size bytes, returning fewer if the timeout expires first
+        '''
+        if not self.is_open:
+            raise PortNotOpenError()
+        deadline = None if self._timeout is None else time.monotonic() + self._timeout
+        data = bytearray()
+        while len(data) < size:
+            data += self.device.read(size - len(data))
+            if len(data) >= size:
+                break
+            now = time.monotonic()
+            if deadline is not None and now >= deadline:
+                break
+            # sleep until the board sends more, but notice new data promptly
+            wait = 0.01
+            later = self.device.next_time()
+            if later is not None:
+                wait = min(max(later - self.device.clock(), 0), wait)
+            if deadline is not None:
+                wait = min(wait, deadline - now)
+            time.sleep(wait)
+        return bytes(data)
+
+    def write(self, data):
+        if not self.is_open:
+            raise PortNotOpenError()
+        data = to_bytes(data)
+        self.device.receive(data)
+        return len(data)
+
+    def reset_input_buffer(self):
+        '''Discards the bytes the board has sent so far'''
+        if not self.is_open:
+            raise PortNotOpenError()
+        self.device.read(self.device.available())
+
+    def reset_output_buffer(self):
+        if not self.is_open:
+            raise PortNotOpenError()
+
+    @property
+    def out_waiting(self):
+        return 0
+
+    def _update_break_state(self):
+        pass
+
+    def _update_rts_state(self):
+        pass
+
+    def _update_dtr_state(self):
+        pass
+
+    @property
+    def cts(self):
+        return True
+
+    @property
+    def dsr(self):
+        return True
+
+    @property
+    def ri(self):
+        return False
+
+    @property
+    def cd(self):
+        return True
@@ -1,21 +1,211 @@
 import tkinter as tk
 from tkinter import filedialog
-import serial
 import serial.tools.list_ports
-import pandas as pd
-import matplotlib.pyplot as plt
-import sys
+import numpy as np
+# matplotlib is slow to import, so it is imported when the plot is created
+# (LivePlot); pandas is only imported by RunResult.to_dataframe
 import os
+import sys
+import queue
+import threading
 import time
 import warnings
+from teensy_lockin.client import LockInClient, RunSettings, MAX_POINTS
+from teensy_lockin.engine import get_lfilter
+from teensy_lockin.plotting import RingBuffer, minmax_decimate
+from teensy_lockin.timing import PhaseTimer
+from teensy_lockin.export import SegmentWriter, StreamWriter, run_metadata, save
+from teensy_lockin.instruction import FAST, RAW, CONTINUOUS, ASCII, BINARY, BINARY_IQ
+from teensy_lockin.reprocess import Capture, Reprocessor, reprocessed_result
+from teensy_lockin.history import RunHistory
+from teensy_lockin.refcache import ReferenceCache
+from teensy_lockin.recording import SerialRecorder
+
+POLL_INTERVAL_MS = 50 # how often the Tk main loop checks on the worker thread
+LIVE_POINTS = 100000 # most recent points plotted during a Continuous Mode run
+PLOT_SIZE = 6 # inches square, at the default 100 dpi
+REF_CHECK_MS = 200 # shortest count (ms) checking a reused frequency; longer below 10 kHz
+# every run is recorded here, with its data (see teensy_lockin/history.py)
+HISTORY_DIR = os.path.join(os.path.expanduser("~"), ".teensy_lockin")
+HISTORY_KEEP_DAYS = 30 # days the data of a run are kept in HISTORY_DIR
+HISTORY_MAX_BYTES = 2 * 1024 ** 3 # most the data of runs take in HISTORY_DIR
 
 class StdoutRedirector(object):
-    '''A class for redirecting stdout to this Text widget.'''
+    '''
+    A class for redirecting stdout to this Text widget.
+    Text may be written from any thread; it is queued and inserted by the Tk main loop.
+    '''
     def __init__(self,text_area):
         self.text_area = text_area
+        self.queue = queue.Queue()
+        self.poll()
 
     def write(self,str):
-        self.text_area.insert(tk.END,str)
+        self.queue.put(str)
+
+    def flush(self):
+        pass
+
+    def poll(self):
+        '''Moves queued text into the Text widget, then reschedules itself'''
+        try:
+            while True:
+                self.text_area.insert(tk.END, self.queue.get_nowait())
+        except queue.Empty:
+            pass
+        self.text_area.after(POLL_INTERVAL_MS, self.poll)
+
+class LivePlot(object):
+    '''
+    Plot of the measured signal, amplitude and phase embedded in the GUI.
+    The same figure is used for every run and its lines are updated in place
+    while data arrive: redraws use blitting, happen at most maxFps times a
+    second, and are decimated to the width of the axes, so they cost the
+    same however many points are measured. Once more points arrive than the
+    plot holds, it scrolls to show the most recent ones.
+    '''
+    maxOverlays = 5 # previous runs kept when overlaying
+    signalPoints = 200 # points of the measured signal shown
+
+    def __init__(self, parent, maxFps=10):
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        self.figure = Figure(figsize=(PLOT_SIZE, PLOT_SIZE))
+        self.signalAxis, self.ampAxis, self.phaseAxis = self.figure.subplots(3, 1)
+        self.phaseAxis.sharex(self.ampAxis)
+        self.signalAxis.set_title("Measured Signal")
+        self.signalAxis.set_ylabel("Voltage (V)")
+        self.ampAxis.set_title("Lock-in Detection Results")
+        self.ampAxis.set_ylabel("Amplitude (V)")
+        self.phaseAxis.set_ylabel("Phase (radians)")
+        self.figure.tight_layout()
+        self.canvas = FigureCanvasTkAgg(self.figure, master=parent)
+        self.signalLine, = self.signalAxis.plot([], [], animated=True)
+        self.ampLine, = self.ampAxis.plot([], [], animated=True)
+        self.phaseLine, = self.phaseAxis.plot([], [], animated=True)
+        self.overlays = []
+        self.fitted = set()
+        self.background = None
+        self.buffer = RingBuffer(1, 3) # columns: Signal, R, Phi
+        self.final = None # LockInData of the finished run, drawn instead of buffer
+        self.scale = 1.0
+        self.minInterval = 1.0 / maxFps
+        self.lastDraw = 0
+        self.drawPending = False
+        self.canvas.mpl_connect('draw_event', self.onDraw)
+
+    def widget(self):
+        return self.canvas.get_tk_widget()
+
+    def start(self, numPoints, scale, overlay=False):
+        '''
+        Gets ready for a new run of numPoints points; scale converts ADC
+        counts to volts. The previous run is kept as a faded line if overlay is
+        True, otherwise earlier runs are cleared.
+        '''
+        if overlay and len(self.buffer) > 0:
+            for line in (self.signalLine, self.ampLine, self.phaseLine):
+                old, = line.axes.plot(line.get_xdata(), line.get_ydata(),
+                                      color='gray', alpha=0.4, linewidth=0.8)
+                self.overlays.append(old)
+            while len(self.overlays) > 3 * self.maxOverlays:
+                self.overlays.pop(0).remove()
+        elif not overlay:
+            while self.overlays:
+                self.overlays.pop().remove()
+        self.buffer = RingBuffer(max(numPoints, 1), 3)
+        self.final = None
+        self.scale = scale
+        self.fitted = set() # lines whose y limits were set for this run
+        for line in (self.signalLine, self.ampLine, self.phaseLine):
+            line.set_data([], [])
+        self.signalAxis.set_xlim(0, self.signalPoints)
+        self.ampAxis.set_xlim(0, max(numPoints, 1))
+        self.canvas.draw()
+
+    def append(self, values):
+        '''Adds an (n, 5) array of Signal, I, Q, R, Phi rows and redraws'''
+        self.buffer.extend(values[:, [0, 3, 4]])
+        self.update()
+
+    def finish(self, data):
+        '''
+        Replaces what was plotted with the LockInData of the run, drawn
+        from its columns without copying them
+        '''
+        self.final = data
+        self.scale = data.volts_per_count
+        self.update(force=True)
+
+    def update(self, force=False):
+        '''Redraws the lines, unless the last redraw was too recent'''
+        now = time.time()
+        if not force and now - self.lastDraw < self.minInterval:
+            if not self.drawPending:
+                self.drawPending = True
+                delay = int(1000 * (self.minInterval - (now - self.lastDraw))) + 1
+                self.widget().after(delay, self.update)
+            return
+        self.lastDraw = now
+        self.drawPending = False
+
+        if self.final is not None:
+            x0 = 0
+            signal = self.final.signal[:self.signalPoints] * self.scale
+            amplitude = self.final.amplitude_volts
+            phase = self.final.phi
+        else:
+            data = self.buffer.values()
+            x0 = self.buffer.first_index()
+            signal = data[:self.signalPoints, 0] * self.scale
+            amplitude = 2 * data[:, 1] * self.scale
+            phase = data[:, 2]
+        if x0 == 0:
+            self.signalLine.set_data(np.arange(len(signal)), signal)
+        width = self.ampAxis.bbox.width
+        self.ampLine.set_data(*minmax_decimate(amplitude, width, x0))
+        self.phaseLine.set_data(*minmax_decimate(phase, width, x0))
+
+        rescaled = False
+        if x0 > 0 and self.ampAxis.get_xlim()[0] != x0:
+            self.ampAxis.set_xlim(x0, x0 + self.buffer.capacity)
+            rescaled = True
+        for line in (self.signalLine, self.ampLine, self.phaseLine):
+            rescaled = self.fitY(line) or rescaled
+        if rescaled or self.background is None:
+            self.canvas.draw() # onDraw blits the lines
+        else:
+            self.blit()
+
+    def fitY(self, line):
+        '''Widens the y limits if the line doesn't fit, returns True if changed'''
+        y = line.get_ydata()
+        if len(y) == 0:
+            return False
+        low, high = np.nanmin(y), np.nanmax(y)
+        bottom, top = line.axes.get_ylim()
+        if line in self.fitted:
+            if bottom <= low and high <= top:
+                return False
+            # only ever widen during a run, so redraws stay rare
+            low, high = min(low, bottom), max(high, top)
+        margin = 0.1 * (high - low) or 0.1 * abs(high) or 0.1
+        line.axes.set_ylim(low - margin, high + margin)
+        self.fitted.add(line)
+        return True
+
+    def onDraw(self, event):
+        '''Saves the newly drawn background for blitting'''
+        self.background = self.canvas.copy_from_bbox(self.figure.bbox)
+        self.blit(restore=False)
+
+    def blit(self, restore=True):
+        if restore:
+            self.canvas.restore_region(self.background)
+        for line in (self.signalLine, self.ampLine, self.phaseLine):
+            line.axes.draw_artist(line)
+        self.canvas.blit(self.figure.bbox)
+
 
 class LockInDetection(tk.Frame):
     '''
@@ -23,22 +213,44 @@ class LockInDetection(tk.Frame):
     Properties:
     parent - the frame object for gui organization
     refSelect - determines if using the internal or external reference frequency (0 for internal, 1 for external)
-    ser - the serial connection for communicating with the teensy (unsure if will need to reset it when wanting to run lock in again without closing gui)
+    client - the LockInClient that talks to the teensy over the serial port
+    settings - the RunSettings of the current or last run
+    reprocessor - mixes and filters the last run again with other filter settings
+    livePlot - the LivePlot, or None until it has been created after startup
+    portScan - the thread listing the serial ports, if a scan is running
+    history - the RunHistory every run is recorded in, or None if it could not be opened
+    refCache - the external reference frequencies measured so far, reused while reuseRef is checked
+    replayPort - teensyreplay:// URL of the recording chosen with Replay Recording, listed with the ports, or None
+    worker - the thread running the current acquisition, if any
+    results - queue of messages from the worker thread to the GUI
     '''
 
     def __init__(self, parent):
         '''Initialize Frame'''
         tk.Frame.__init__(self, parent)
         self.parent = parent
-        self.DataDf = pd.DataFrame()
+        self.worker = None
+        self.results = queue.Queue()
+        self.cancelEvent = threading.Event()
+        self.client = LockInClient()
+        self.settings = RunSettings()
+        self.lastResult = None
+        self.streamPath = None
+        self.reprocessor = Reprocessor()
+        self.livePlot = None
+        self.portScan = None
+        self.refCache = ReferenceCache(check_ms=REF_CHECK_MS)
+        self.replayPort = None
+        try:
+            self.history = RunHistory(os.path.join(HISTORY_DIR, "history.db"),
+                                      data_dir=os.path.join(HISTORY_DIR, "runs"),
+                                      keep_days=HISTORY_KEEP_DAYS,
+                                      max_bytes=HISTORY_MAX_BYTES)
+        except Exception as e:
+            print("Could not open the run history:", e)
+            self.history = None
         self.initialize()
 
-        # Store some info about the Teensy 3.5 here for internal reference signal
-        # generation.
-        # This is not relevant for 4.0 since internal reference is not implemented.
-        self.teensy_clock_freq = 120e6 # default 120 MHz
-        self.sine_lut_length = 300
-
     def initialize(self):
         '''Initialize the frame parameters and create their widgets'''
         self.parent.title("Lock in Detector")
@@ -60,12 +272,14 @@ class LockInDetection(tk.Frame):
         buttonFrame = self.createButtonWidgets(tk.Frame(self.parent,
                                                         name = 'buttonFrame')) #frame9
         outFrame = self.createOutWidgets(tk.Frame(self.parent, name = 'outFrame'))
+        plotFrame = self.createPlotWidgets(tk.Frame(self.parent, name = 'plotFrame'))
         serialFrame.grid(row=2, column = 1, padx = 10)
         aquisitionFrame.grid(row=2, column = 2, padx = 10)
         filterFrame.grid(row=2, column = 3, padx = 10)
         postFrame.grid(row=2, column = 4, padx = 10)
         buttonFrame.grid(row = 3, column = 1, columnspan = 2, padx = 10, pady=20)
         outFrame.grid(row=3, column = 3, columnspan = 2, padx = 10, pady=20)
+        plotFrame.grid(row=1, column = 5, rowspan = 3, padx = 10, pady=20)
         #print(self.parent.winfo_children())
 
     def createTitleWidgets(self):
@@ -87,25 +301,21 @@ class LockInDetection(tk.Frame):
 
     def createSerialPortWidgets(self, frame):
         #serial port
-        serPortLabel = tk.LabelFrame(frame, text="Teensy serial port:")
-        serPortLabel.grid(row=1, column=0)
-
-        ports_list = list(serial.tools.list_ports.comports())
-        port_name_lengths = [len(port[0]) for port in ports_list]
-        max_length = max(port_name_lengths)
-
-        # default to last port
+        self.serPortLabel = tk.LabelFrame(frame, text="Teensy serial port:")
+        self.serPortLabel.grid(row=1, column=0)
         self.serPort = tk.StringVar(value = 'null')
-
-        for port, ctr in zip(ports_list, range(len(ports_list))):
-            button = tk.Radiobutton(serPortLabel,
-                                    text = port[0].ljust(max_length),
-                                    var = self.serPort,
-                                    value = port[0])
-            button.grid(row = ctr, column = 1)
+        # listing the ports can be slow, so it is done in the background
+        self.refreshButton = tk.Button(frame, text="Refresh Ports",
+                                       command=lambda: self.scanPorts())
+        self.refreshButton.grid(row=2, column=0, pady = 5)
+        #play back a recording of the serial traffic instead of a board
+        replayButton = tk.Button(frame, text="Replay Recording",
+                                 command=lambda: self.chooseReplay())
+        replayButton.grid(row=2, column=1, pady = 5)
+        self.scanPorts()
 
         deviceLabel = tk.LabelFrame(frame, text = "Teensy device:")
-        deviceLabel.grid(row = 2, column=0, sticky = 'w', pady = 15)
+        deviceLabel.grid(row = 3, column=0, sticky = 'w', pady = 15)
         self.teensyModel = tk.StringVar(value = 'null')
         t35button = tk.Radiobutton(deviceLabel,
                                    text = 'Teensy 3.5', var = self.teensyModel,
@@ -118,6 +328,54 @@ class LockInDetection(tk.Frame):
 
         return frame
 
+    def scanPorts(self):
+        '''Lists the serial ports in a background thread; showPorts shows them'''
+        if self.portScan is not None and self.portScan.is_alive():
+            return
+        self.refreshButton.config(state=tk.DISABLED)
+        for widget in self.serPortLabel.winfo_children():
+            widget.destroy()
+        tk.Label(self.serPortLabel, text="Looking for ports...").grid(row=0, column=1)
+        found = []
+        def scan():
+            try:
+                found.extend(sorted(port[0] for port in serial.tools.list_ports.comports()))
+            except Exception as e:
+                print("Could not list serial ports:", e)
+        self.portScan = threading.Thread(target=scan, daemon=True)
+        self.portScan.start()
+        self.after(POLL_INTERVAL_MS, lambda: self.showPorts(found))
+
+    def showPorts(self, ports):
+        '''Shows a button for each port once the scan has finished'''
+        if self.portScan.is_alive():
+            self.after(POLL_INTERVAL_MS, lambda: self.showPorts(ports))
+            return
+        self.refreshButton.config(state=tk.NORMAL)
+        for widget in self.serPortLabel.winfo_children():
+            widget.destroy()
+        if self.replayPort is not None:
+            ports = ports + [self.replayPort]
+        if not ports:
+            tk.Label(self.serPortLabel, text="No ports found").grid(row=0, column=1)
+            return
+        max_length = max(len(port) for port in ports)
+        for ctr, port in enumerate(ports):
+            button = tk.Radiobutton(self.serPortLabel,
+                                    text = port.ljust(max_length),
+                                    var = self.serPort,
+                                    value = port)
+            button.grid(row = ctr, column = 1)
+
+    def chooseReplay(self):
+        '''Lists a recording made with Record serial traffic as a port, and selects it'''
+        path = filedialog.askopenfilename(filetypes = [('Serial Recording', '*.tlrec')])
+        if not path:
+            return
+        self.replayPort = "teensyreplay://" + path
+        self.serPort.set(self.replayPort)
+        self.scanPorts()
+
     def createAquisitionWidgets(self, frame):
         r=1
         self.freqDurVal = 1000
@@ -144,6 +402,11 @@ class LockInDetection(tk.Frame):
         externalButton.grid(row=1, column = 5, columnspan=4)
         radioFrame.grid(row = r, column=1, columnspan = 4)
         r+=1
+        #skip the count while the last external frequency is recent (see teensy_lockin/refcache.py)
+        self.reuseRef = tk.IntVar(value=0)
+        reuseButton = tk.Checkbutton(frame, text="Reuse reference frequency", variable=self.reuseRef)
+        reuseButton.grid(row=r, column=1, columnspan=4)
+        r+=1
         def updateRef(val):
             try:
                 val = int(val)
@@ -183,9 +446,10 @@ class LockInDetection(tk.Frame):
         def updateNumPoints(val):
             try:
                 val = int(val)
-                if val > 15000:
-                    val = 15000
-                if val > 0:
+                # Continuous Mode has no limit, and 0 runs until stopped
+                if val > MAX_POINTS and self.mode.get() != CONTINUOUS:
+                    val = MAX_POINTS
+                if val > 0 or (val == 0 and self.mode.get() == CONTINUOUS):
                     self.numPoints = val
                     numPointsLabel.config(text="Number of Points to Measure: " + str(self.numPoints))
             except:
@@ -226,6 +490,11 @@ class LockInDetection(tk.Frame):
         self.filterStageSelected.set(1)
         filterStageMenu = tk.OptionMenu(frame, self.filterStageSelected, *filterStageOptions)
         filterStageMenu.grid(row=r, column = 3, sticky=tk.W+tk.E)
+        r+=1
+        #filter the last run again on this computer with the settings above
+        reprocessButton = tk.Button(frame, text="Reprocess Last Run",
+                                    command=lambda: self.reprocessData())
+        reprocessButton.grid(row=r, column=1, columnspan=4, pady=5)
         return frame
 
     def createPostWidgets(self, frame):
@@ -238,6 +507,22 @@ class LockInDetection(tk.Frame):
                                     var=self.mode, value=1)
         #fastButton.deselect()
         fastButton.grid(row=2, column = 1)
+        rawButton = tk.Radiobutton(frame, text="Raw Mode       ",
+                                   var=self.mode, value=RAW)
+        rawButton.grid(row=3, column = 1)
+        continuousButton = tk.Radiobutton(frame, text="Continuous Mode",
+                                          var=self.mode, value=CONTINUOUS)
+        continuousButton.grid(row=4, column = 1)
+        #how Normal Mode data are sent back
+        formatLabel = tk.Label(frame, text="Transfer Format:")
+        formatLabel.grid(row = 5, column = 1, pady = 10)
+        formatOptions = {"ASCII": ASCII, "Binary": BINARY,
+                         "Binary (I/Q only)": BINARY_IQ}
+        self.wireFormat = tk.IntVar(value=ASCII)
+        self.wireFormatName = tk.StringVar(value="ASCII")
+        formatMenu = tk.OptionMenu(frame, self.wireFormatName, *formatOptions,
+                                   command=lambda name: self.wireFormat.set(formatOptions[name]))
+        formatMenu.grid(row = 5, column = 2, columnspan = 2, sticky=tk.W+tk.E)
         #scale bar for number of points to average
         percentLabel = tk.Label(frame, text="Percent of Points used to Average:")
         percentLabel.grid(row = 1, column=2, columnspan=2, padx = 20)
@@ -266,21 +551,84 @@ class LockInDetection(tk.Frame):
         self.percentEntry.insert(0, self.percent.get())
         self.percentEntry.bind("<Return>", lambda event: updatePercent())
         percentBar.bind("<ButtonRelease-1>", lambda event: updateEntry())
+        #average from where the filter has settled instead (see teensy_lockin/convergence.py)
+        self.settle = tk.IntVar(value=0)
+        settleButton = tk.Checkbutton(frame, text="Average from where the filter settles",
+                                      variable=self.settle)
+        settleButton.grid(row = 4, column = 2, columnspan = 2)
+        #stop Continuous Mode once the amplitude is known this well
+        precisionLabel = tk.Label(frame, text="Stop Continuous Mode at relative error:")
+        precisionLabel.grid(row = 6, column = 1, columnspan = 2, pady = 5)
+        self.precisionEntry = tk.Entry(frame, width = 10)
+        self.precisionEntry.grid(row = 6, column = 3)
+        #keep only as many points as the filter bandwidth needs (see teensy_lockin/decimate.py)
+        self.decimate = tk.IntVar(value=0)
+        decimateButton = tk.Checkbutton(frame, text="Decimate output (binary, Raw and Continuous)",
+                                        variable=self.decimate)
+        decimateButton.grid(row = 7, column = 1, columnspan = 3)
         return frame
 
     def createButtonWidgets(self, frame):
         #start button
         # Note: Tkinter button bg color doesn't work on Mac (known issue)
-        startButton = tk.Button(frame, text="Run", font=('Arial', 15),
-                                width = 10, height = 4,
-                                bg = '#00C800',
-                                command=lambda: self.startTeensy())
-        startButton.grid(row=1, column=1, columnspan = 4, padx = 5)
+        self.startButton = tk.Button(frame, text="Run", font=('Arial', 15),
+                                     width = 10, height = 4,
+                                     bg = '#00C800',
+                                     command=lambda: self.startTeensy())
+        self.startButton.grid(row=1, column=1, columnspan = 4, padx = 5)
         #save button
         saveButton = tk.Button(frame, text="Save Data", font=('Arial', 15), width = 10, height = 4, command=lambda: self.saveData())
         saveButton.grid(row=1, column = 5, columnspan = 4, padx = 5)
+        #cancel button, only active during a run
+        self.cancelButton = tk.Button(frame, text="Cancel", font=('Arial', 15),
+                                      width = 10, state = tk.DISABLED,
+                                      command=lambda: self.cancelRun())
+        self.cancelButton.grid(row=2, column=1, columnspan = 4, padx = 5, pady = 10)
+        self.statusLabel = tk.Label(frame, text="Idle")
+        self.statusLabel.grid(row=2, column=5, columnspan = 4, padx = 5, pady = 10)
+        #write the data to disk while they arrive
+        self.streamToFile = tk.IntVar(value=0)
+        streamButton = tk.Checkbutton(frame, text="Stream data to file",
+                                      variable=self.streamToFile)
+        streamButton.grid(row=3, column=1, columnspan = 8)
+        #record everything sent and received over the port (see teensy_lockin/recording.py)
+        self.recordSerial = tk.IntVar(value=0)
+        recordButton = tk.Checkbutton(frame, text="Record serial traffic",
+                                      variable=self.recordSerial,
+                                      command=lambda: self.toggleRecording())
+        recordButton.grid(row=4, column=1, columnspan = 8)
+        #save the data of every run with the run history, or only its row
+        self.keepRunData = tk.IntVar(value=1)
+        keepDataButton = tk.Checkbutton(frame, text="Keep the data of every run in the history",
+                                        variable=self.keepRunData,
+                                        command=lambda: self.toggleRunData())
+        keepDataButton.grid(row=5, column=1, columnspan = 8)
         return frame
 
+    def toggleRunData(self):
+        '''Saves the data of the runs that follow with the run history, or not'''
+        if self.history is not None:
+            self.history.save_data = self.keepRunData.get() == 1
+
+    def toggleRecording(self):
+        '''Starts recording the serial traffic to a file chosen now, or stops'''
+        if self.worker is not None and self.worker.is_alive():
+            # the run in progress keeps what it started with
+            self.recordSerial.set(1 - self.recordSerial.get())
+            return
+        if self.recordSerial.get() == 1:
+            path = filedialog.asksaveasfilename(
+                filetypes = [('Serial Recording', '*.tlrec')], defaultextension = '.tlrec')
+            if not path:
+                self.recordSerial.set(0)
+                return
+            self.client.recorder = SerialRecorder(path)
+            print("Recording serial traffic to", path)
+        elif self.client.recorder is not None:
+            self.client.recorder.close()
+            self.client.recorder = None
+            print("Recording stopped")
+
     def createOutWidgets(self, frame):
         #output
         outputLabel = tk.Label(frame, text="Output:")
@@ -290,6 +638,34 @@ class LockInDetection(tk.Frame):
         sys.stdout = StdoutRedirector(output)
         return frame
 
+    def createPlotWidgets(self, frame):
+        #plot, updated while data arrive; matplotlib is loaded once the window
+        #is up, with an empty frame of the same size holding its place
+        self.plotFrame = frame
+        self.plotHolder = tk.Frame(frame, width=PLOT_SIZE * 100, height=PLOT_SIZE * 100)
+        self.plotHolder.grid(row = 1, column = 1)
+        self.plotHolder.bind('<Map>', lambda event: self.after_idle(self.startLoading))
+        self.overlayRuns = tk.IntVar(value=0)
+        overlayButton = tk.Checkbutton(frame, text="Overlay previous runs",
+                                       variable=self.overlayRuns)
+        overlayButton.grid(row = 2, column = 1)
+        return frame
+
+    def startLoading(self):
+        '''Creates the plot, then loads SciPy in the background, after startup'''
+        if self.livePlot is not None:
+            return
+        self.getLivePlot()
+        threading.Thread(target=get_lfilter, daemon=True).start()
+
+    def getLivePlot(self):
+        '''Returns the LivePlot, creating it if startup has not yet'''
+        if self.livePlot is None:
+            self.livePlot = LivePlot(self.plotFrame)
+            self.plotHolder.destroy()
+            self.livePlot.widget().grid(row = 1, column = 1)
+        return self.livePlot
+
     def checkVals(self):
         try:
             val = int(self.frequencyEntry.get())
@@ -307,9 +683,9 @@ class LockInDetection(tk.Frame):
             pass
         try:
             val = int(self.numPointsEntry.get())
-            if val > 0:
-                if val > 15000:
-                    val = 15000
+            if val > 0 or (val == 0 and self.mode.get() == CONTINUOUS):
+                if val > MAX_POINTS and self.mode.get() != CONTINUOUS:
+                    val = MAX_POINTS
                 if val != self.numPoints:
                     self.numPoints = val
         except:
@@ -332,252 +708,286 @@ class LockInDetection(tk.Frame):
         except:
             pass
 
-    def startSerial(self):
-        '''Opens serial port'''
+    def getPrecision(self):
+        '''Relative error to stop Continuous Mode at, or 0 if none is given'''
         try:
-            port = self.serPort.get()
+            val = float(self.precisionEntry.get())
+            if val > 0:
+                return val
         except:
-            print("Serial Port Not Specified")
-        #port = "COM" + port
-        try:
-            self.ser = serial.Serial(port, 115200, timeout=None, write_timeout=10)
-            if os.name == 'nt':
-                # Implemented in Windows only
-                self.ser.set_buffer_size(rx_size= 100000, tx_size=4096)
+            pass
+        return 0
 
+    def startSerial(self):
+        '''Opens serial port'''
+        port = self.client.port
+        try:
+            # Reads block for at most READ_TIMEOUT so the worker can notice a cancel
+            self.client.connect()
             print("Successful")
+            return True
         except Exception as e:
             print("Could not connect to serial port, " + port)
             print(e)
+            return False
 
     def endSerial(self):
         '''Closes serial port'''
-        try:
-            self.ser.close()
-        except:
-            print("No serial port open")
+        self.client.close()
 
     def startTeensy(self):
         '''
-        Uploads command string to arduino and processes the data recieved
-        Returns True if successful and false if not
+        Starts a run: sends the command string to the arduino and processes
+        the data recieved in a background thread, so the GUI stays responsive
+        Returns True if the run was started and false if not
         '''
+        if self.worker is not None and self.worker.is_alive():
+            return False
         try:
             print("------------------------")
-            self.startSerial() #start the serial port
-            self.ser.reset_output_buffer()
-            self.ser.reset_input_buffer()
             self.checkVals()
+            # Snapshot the settings; the worker thread must not touch Tk variables
+            self.settings = RunSettings(ref_select=self.refSelect.get(),
+                                        freq_dur=self.freqDurVal,
+                                        sampling_rate=self.sampleVal,
+                                        num_points=self.numPoints,
+                                        cutoff=self.cutoff,
+                                        stages=self.filterStageSelected.get(),
+                                        mode=self.mode.get(),
+                                        wire_format=self.wireFormat.get(),
+                                        teensy_model=self.teensyModel.get(),
+                                        percent=self.percent.get(),
+                                        settle=self.settle.get() == 1,
+                                        precision=self.getPrecision(),
+                                        decimation=0 if self.decimate.get() == 1 else 1)
+            self.client.port = self.serPort.get()
+            self.client.ref_cache = self.refCache if self.reuseRef.get() == 1 else None
+            self.streamPath = None
+            if self.streamToFile.get() == 1 and self.mode.get() == CONTINUOUS:
+                # a directory of segment files, however long the run
+                self.streamPath = filedialog.askdirectory()
+                if not self.streamPath:
+                    return False
+            elif self.streamToFile.get() == 1 and self.mode.get() != FAST:
+                self.streamPath = filedialog.asksaveasfilename(
+                    filetypes = [('NumPy Array', '*.npy')], defaultextension = '.npy')
+                if not self.streamPath:
+                    return False
             if self.refSelect.get() == 0:  # internal reference selected
                 # make sure T4.0 is not being used
-                if self.teensyModel.get == 'T40':
+                if self.teensyModel.get() == 'T40':
                     warnings.warn("Warning: internal reference not implemented for Teensy 4.0.",
                                   RuntimeWarning)
-                # if internal ref, calculate and display actual frequency
-                teensy_clk_periods = int(self.teensy_clock_freq / (self.freqDurVal * self.sine_lut_length)) # corresponds to mod in Teensy code
-                actual_freq = self.teensy_clock_freq / (teensy_clk_periods
-                                                            * self.sine_lut_length)
-                print('Actual frequency: ', actual_freq, ' Hz')
-            stringToSend = str(self.refSelect.get()) + ":" + str(self.freqDurVal) + ":" + str(self.sampleVal) + ":" + str(self.numPoints) + ":" + str(self.cutoff) + ":" + str(self.filterStageSelected.get()) + ":" + str(self.mode.get()) + "F"
-            print("Instuction Sent:")
-            print("Reference Mode: ", end="")
-            if self.refSelect.get() == 0:
-                print("Internal Reference")
-                print("Reference Frequency: ", end="")
-            else:
-                print("External Reference")
-                print("Frequency Count Duration: ", end="")
-            print(self.freqDurVal)
-            print("Sampling Rate:", self.sampleVal)
-            print("Num Points:", self.numPoints)
-            print("Filter Cutoff Frequency:", self.cutoff)
-            print("Filter Order:", self.filterStageSelected.get())
-            print("Mode: ", end="")
-            if self.mode.get() == 0:
-                print("Normal Mode")
-            else:
-                print("Fast Mode")
-
-            #send data
-            try:
-                self.ser.write(str(stringToSend).encode('utf-8'))
-            except:
-                print("writing timed out")
-
-            if self.mode.get() == 0:
-                self.processData()
-            else:
-                self.processFastData()
+                # if internal ref, pick the sine table and PDB modulus giving the
+                # nearest frequency, and display it
+                print('Actual frequency: ', self.settings.plan_internal_freq(), ' Hz')
+            for line in self.settings.describe():
+                print(line)
+
+            plotPoints = self.settings.num_points // self.settings.decimation_factor()
+            if self.mode.get() == CONTINUOUS and not 0 < plotPoints < LIVE_POINTS:
+                plotPoints = LIVE_POINTS
+            if self.mode.get() != FAST:
+                self.getLivePlot().start(plotPoints, self.settings.volts_per_count(),
+                                    overlay=self.overlayRuns.get() == 1)
+
+            self.cancelEvent.clear()
+            self.startButton.config(state=tk.DISABLED)
+            self.cancelButton.config(state=tk.NORMAL,
+                                     text="Stop" if self.mode.get() == CONTINUOUS else "Cancel")
+            self.statusLabel.config(text="Running")
+            self.worker = threading.Thread(target=self.acquire, daemon=True)
+            self.worker.start()
+            self.after(POLL_INTERVAL_MS, self.pollWorker)
             return True
         except:
             print("Failed in startTeensy")
             return False
 
-    def processFastData(self):
-        try:
-            waitctr = 0
-            while self.ser.in_waiting == 0:
-                waitctr += 1
-
-            #print(waitctr)
-
-            #again this needs to be tested
-            if self.refSelect.get() == 1:
-                externalRefFreq = str(self.ser.readline().strip())
-                externalRefFreq = externalRefFreq.strip("b'")
-                print("Measured External Reference Frequency [Hz]:", externalRefFreq)
-
-            d = ''
-            start = time.time()
-            while True:
-                temp = self.ser.read()
-                temp = str(temp)[2:-1]
-                if (temp != 'E'):
-                    d = d + temp
-                else:
-                    break
-                if (time.time()-start > 30): #prevent infinite loop
-                    break
-            d = d.split(',')
-
-            # Tell Teensy to reset itself
-            self.ser.write(str("DRX").encode('utf-8'))
+    def cancelRun(self):
+        '''
+        Asks the worker thread to stop; it resets the Teensy and closes the port.
+        A Continuous Mode run stops normally and its results are shown.
+        '''
+        if self.worker is not None and self.worker.is_alive():
+            self.cancelEvent.set()
+            self.cancelButton.config(state=tk.DISABLED)
+            self.statusLabel.config(text="Stopping" if self.settings.mode == CONTINUOUS
+                                    else "Cancelling")
 
-            if self.teensyModel.get() == 'T40':
-                print("Average Amplitude:", str(float(d[0]) * 2 * 3.3/1023))
+    def acquire(self):
+        '''
+        Runs in the worker thread: talks to the Teensy through self.client and
+        puts the results on self.results for pollWorker
+        '''
+        sink = None
+        result = None
+        error = None
+        try:
+            timings = PhaseTimer()
+            with timings.phase("open"):
+                connected = self.startSerial() #start the serial port
+            if not connected:
+                error = "Could not connect to serial port, " + str(self.client.port)
+                return
+            if self.streamPath and self.settings.mode == CONTINUOUS:
+                sink = SegmentWriter(self.streamPath)
+            elif self.streamPath:
+                sink = StreamWriter(self.streamPath)
+            result = self.client.acquire(
+                self.settings, cancel=self.cancelEvent,
+                progress=lambda count: self.results.put(("progress", count)),
+                partial=lambda values: self.results.put(("partial", values)),
+                timings=timings, sink=sink)
+            if result.cancelled:
+                return
+            if self.settings.mode == FAST:
+                self.processFastData(result)
+            elif self.settings.mode == CONTINUOUS:
+                self.results.put(("continuous", result))
             else:
-                print("Average Amplitude:", str(float(d[0]) * 2 * 3.3/4095))
-            print("Average Phase:", d[1])
-            self.endSerial()
+                self.processData(result)
         except Exception as e:
-            print(waitctr)
+            print("Failed in startTeensy")
+            print(e)
+            error = e
+        finally:
+            self.endSerial()
+            if sink is not None:
+                sink.close(run_metadata(result) if result is not None else None)
+                print("Data streamed to", self.streamPath)
+            if self.history is not None:
+                # only queued here; written in the history's own thread
+                self.history.record(result, self.settings, self.client.port,
+                                    error, self.streamPath)
+            self.results.put(("done", None))
+
+    def pollWorker(self):
+        '''Handles messages from the worker thread; runs in the Tk main loop'''
+        while True:
+            try:
+                kind, value = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "progress" and self.settings.mode == CONTINUOUS:
+                self.statusLabel.config(text="Points: %d" % value)
+            elif kind == "progress":
+                self.statusLabel.config(text="Lines read: %d of %d"
+                                        % (value, self.settings.num_points))
+            elif kind == "partial":
+                self.livePlot.append(value)
+            elif kind == "data":
+                with value.timings.phase("plot"):
+                    self.plotData(value)
+                self.lastResult = value
+                print(value.data.head())
+                with value.timings.phase("averaging"):
+                    self.displayAverages(value)
+                print("Timings:", value.timings.summary())
+            elif kind == "continuous":
+                self.lastResult = value
+                print("Points received:", value.points)
+                self.displayAverages(value)
+                print("Timings:", value.timings.summary())
+            elif kind == "done":
+                self.startButton.config(state=tk.NORMAL)
+                self.cancelButton.config(state=tk.DISABLED, text="Cancel")
+                if self.settings.mode == CONTINUOUS:
+                    self.statusLabel.config(text="Idle")
+                else:
+                    self.statusLabel.config(text="Cancelled" if self.cancelEvent.is_set()
+                                            else "Idle")
+                return
+        self.after(POLL_INTERVAL_MS, self.pollWorker)
+
+    def processFastData(self, result):
+        '''Prints the averages sent by the Teensy in Fast Mode'''
+        if result.fast_r is None:
             print("Fast Mode Failed")
-            exc_type, exc_obj, exc_tb = sys.exc_info()
-            print(e, exc_type, exc_tb.tb_lineno)
+            return
+        amplitude, phase = result.averages()
+        print("Average Amplitude:", str(amplitude))
+        print("Average Phase:", phase)
+        print("Timings:", result.timings.summary())
 
-    def processData(self):
+    def processData(self, result):
         '''
-        Processes the data, returns true if successful, false if otherwise
+        Passes the data to the GUI, returns true if successful, false if otherwise
         '''
-        try:
-            data = []
-            count = 0
-            start = time.time()
-            while self.ser.in_waiting == 0: #while nothing in serial do nothing
-                if (time.time() - start > 60): #if taking longer than 1 min
-                    print("Nothing sent from Teensy")
-                    raise Exception("Nothing connected to serial port")
-
-            #unsure if this will work for getting external ref freq - needs to be tested
-            if self.refSelect.get() == 1:
-                externalRefFreq = str(self.ser.readline().strip())
-                externalRefFreq = externalRefFreq.strip("b'")
-                print("Measured External Reference Frequency [Hz]:", externalRefFreq)
-
-            d = ''
-            if self.numPoints > 100:
-                cutoff = self.numPoints - 100
-            else:
-                cutoff = self.numPoints
-
-            #use a timer to prevent infinite loops
-            start = time.time()
-            while count < cutoff: #expecting 10000 lines of data right now
-                temp = self.ser.read()
-                temp = str(temp)[2:-1]
-                if (temp != 'E'):
-                    d = d + temp
-                else:
-                    data.append(d)
-                    d = ''
-                    count += 1
-                    if count % 1000 == 0:
-                        print(count, "lines read of " + str(self.numPoints))
-                if (time.time() - start > 30): #if taking longer than 30 seconds
-                    print("Could not read all lines")
-                    break
-            data = data[:-1] #cutout last data point since is not actual data
-            print("lines read:", len(data))
-
-            # Send a string "data recieved" to tell Teensy to reset
-            self.ser.write(str("DRX").encode('utf-8'))
-
-            data2D = []
-            for i in range(len(data)): #convert from bytes to floats for each data point
-                try:
-                    temp = data[i]
-                    temp = temp.split(', ')
-                    for j in range(len(temp)):
-                        temp[j] = float(temp[j])
-                    data2D.append(temp)
-                except:
-                    pass
-            dataDf = pd.DataFrame(data2D[2:]) #put data into dataframe - get rid of first line since left over from previous run
-            dataDf.columns = ["Signal", "I", "Q", "R", "Phi"] #set dataframe column names
-            #plt.tick_params(axis= "x", which = "both", bottom = False, top = False)
-            #plt.xticks(dataDf.index, " ")
-            plt.figure()
-            if self.teensyModel.get() == 'T40':
-                plt.plot(dataDf.index[:200], dataDf["Signal"][:200]*3.3/1023)
-            else:
-                plt.plot(dataDf.index[:200], dataDf["Signal"][:200]*3.3/4096)
-            plt.ylabel("Voltage (V)", fontsize=20)
-            plt.title("Measured Signal", fontsize = 25)
-            plt.show(block=False)
-            fig, (ax1, ax2) = plt.subplots(2, 1, sharex=True) #plot the data
-            if self.teensyModel.get() == 'T40':
-                ax1.plot(dataDf.index, 2*dataDf["R"]*3.3/1023)
-            else:
-                ax1.plot(dataDf.index, 2*dataDf["R"]*3.3/4096)
-            ax1.set_ylabel("Amplitude (V)", fontsize=20)
-            ax1.set_title("Lock-in Detection Results", fontsize= 25)
-            ax2.plot(dataDf.index, dataDf["Phi"])
-            ax2.set_ylabel("Phase (radians)", fontsize=20)
-            plt.show(block=False)
-            print(dataDf.head())
-            self.DataDf = dataDf
-            self.endSerial()
-            self.displayAverages()
-            return True
-        except Exception as e:
+        if result.data is None:
             print("Failed in processData")
-            exc_type, exc_obj, exc_tb = sys.exc_info()
-            print(e, exc_type, exc_tb.tb_lineno)
-            print(dataDf.head())
             return False
+        self.results.put(("data", result))
+        return True
 
-    def displayAverages(self):
+    def plotData(self, result):
+        '''Plots the measured signal and the lock-in results'''
+        self.getLivePlot().finish(result.data)
+
+    def displayAverages(self, result):
+        '''Prints the statistics of the last percent of the points, or from where the filter settled'''
+        if result.ref_drifted:
+            print("The reference drifted: this run was demodulated at the old frequency")
         try:
-            amplitudeAverage = 0
-            phaseAverage = 0
-            startIdx = int(((100 - int(self.percent.get()))
-                            / 100) * len(self.DataDf["R"]))
-            #print(startIdx)
-            for amp in self.DataDf["R"][startIdx:]:
-                if self.teensyModel.get() == 'T40':
-                    amplitudeAverage += (2*amp*3.3/1023)
-                else:
-                    amplitudeAverage += (2*amp*3.3/4096)
-            print("Average Measured Amplitude:", amplitudeAverage/len(self.DataDf["R"][startIdx:]))
-            for phase in self.DataDf["Phi"][startIdx:]:
-                phaseAverage += phase
-            print("Average Measured Phase:", phaseAverage/len(self.DataDf["Phi"][startIdx:]))
+            stats = result.statistics(None if self.settle.get() == 1
+                                      else self.percent.get()).summary()
+            print("Average Measured Amplitude:", stats["amplitude"],
+                  "+/-", stats["amplitude_sem"])
+            print("Amplitude Std. Dev.:", stats["amplitude_std"],
+                  " Min:", stats["amplitude_min"], " Max:", stats["amplitude_max"])
+            print("Average Measured Phase:", stats["phase"],
+                  "+/-", stats["phase_sem"])
+            print("Phase Std. Dev.:", stats["phase_std"])
         except:
             print("Error in calculating Averages")
 
+    def reprocessData(self):
+        '''
+        Mixes and filters the signal of the last run again with the current
+        cutoff and number of stages, and shows the results. Settings tried
+        before are remembered, so going back to them is immediate.
+        '''
+        if self.worker is not None and self.worker.is_alive():
+            return
+        if self.lastResult is None or self.lastResult.data is None:
+            print("No data to reprocess")
+            return
+        self.checkVals()
+        try:
+            cutoff = self.cutoff
+            stages = self.filterStageSelected.get()
+            capture = Capture.from_result(self.lastResult)
+            values = self.reprocessor.process(capture, cutoff, stages)
+            result = reprocessed_result(self.lastResult, values, cutoff, stages)
+            print("------------------------")
+            print("Reprocessed with cutoff", cutoff, "Hz and", stages, "stage(s)")
+            self.plotData(result)
+            self.lastResult = result
+            self.displayAverages(result)
+        except Exception as e:
+            print("Could not reprocess:", e)
+
     def saveData(self):
+        '''Saves the last run, in the format chosen by the file extension'''
         files = [('CSV (Comma Delimited)', '*.csv'),
-             ('All Files', '*.*'),
-             ('Python Files', '*.py'),
-             ('Text Document', '*.txt')]
-        f = filedialog.asksaveasfile(mode = 'w', filetypes = files, defaultextension = files)
+                 ('NumPy Arrays', '*.npz'),
+                 ('Parquet', '*.parquet'),
+                 ('HDF5', '*.h5'),
+                 ('All Files', '*.*')]
+        path = filedialog.asksaveasfilename(filetypes = files, defaultextension = '.csv')
+        if not path:
+            return
+        if self.lastResult is not None and self.lastResult.settings.mode == CONTINUOUS:
+            print("Continuous Mode data are only kept by streaming them to file")
+            return
+        if self.lastResult is None or self.lastResult.data is None:
+            print("No data to save")
+            return
         try:
-            out_df = self.DataDf.copy()
-            out_df['R'] = 2*out_df['R']
-            f.write(out_df.to_csv())
+            save(path, self.lastResult)
             print("file saved")
-        except:
-            pass
+        except Exception as e:
+            print("Could not save file:", e)
 
 
 def main():
@@ -589,6 +999,8 @@ def main():
     frame = LockInDetection(root)
     frame.grid()
     root.mainloop()
+    if frame.history is not None:
+        frame.history.close()
     sys.stdout = sys.__stdout__
 
 